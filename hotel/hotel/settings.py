@@ -41,15 +41,19 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'room.apps.RoomConfig',
     'rest_framework',
     'django_filters',
 ]
 
 MIDDLEWARE = [
+    'room.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'room.db_routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -97,6 +101,111 @@ DATABASES = {
    }
 }
 
+# Read replicas: DB_REPLICA_HOSTS=host1,host2:5433 adds aliases replica_1, replica_2
+# with the primary's credentials. GET/HEAD/OPTIONS reads go to a healthy replica;
+# after a write the client is pinned to the primary for REPLICA_PIN_SECONDS.
+DATABASE_REPLICAS = []
+for number, address in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    replica_host, _, replica_port = address.strip().partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': replica_port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+# Sharding by hotel: DB_SHARDS=db1:5432/hotels,db2/hotels,hotels_3 adds aliases shard_1..N
+# ([host[:port]/]name, missing parts are taken from the primary). A hotel with its room
+# types, rooms, prices and bookings lives on one shard; guests and the Hotel_shards
+# directory stay in 'default'. Move hotels with `manage.py rebalance_shards`.
+DATABASE_SHARDS = []
+for number, address in enumerate(filter(None, os.getenv('DB_SHARDS', '').split(',')), 1):
+    shard_location, _, shard_name = address.strip().rpartition('/')
+    shard_host, _, shard_port = shard_location.partition(':')
+    DATABASES[f'shard_{number}'] = {
+        **DATABASES['default'],
+        'NAME': shard_name or DATABASES['default']['NAME'],
+        'HOST': shard_host or DATABASES['default']['HOST'],
+        'PORT': shard_port or DATABASES['default']['PORT'],
+    }
+    DATABASE_SHARDS.append(f'shard_{number}')
+
+DATABASE_ROUTERS = ['room.db_routers.ShardRouter', 'room.db_routers.ReplicaRouter']
+REPLICA_MAX_LAG = 5
+REPLICA_CHECK_INTERVAL = 5
+REPLICA_PIN_SECONDS = 10
+
+
+# Cache
+# Rendered catalog responses live in per-process memory; tag versions used for
+# invalidation live in the shared 'default' cache (Redis when REDIS_URL is set).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+if os.getenv('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_CACHE_TAGS_ALIAS = 'default'
+
+# Share of requests timed by room.timing.ServerTimingMiddleware: SQL count and
+# time, filter, serializer and render time go to the Server-Timing header and
+# the room.timing log.
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv('SERVER_TIMING_SAMPLE_RATE', '0.05'))
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', '1') == '1'
+# Prometheus metrics per route at /metrics (room.metrics). With several worker
+# processes set PROMETHEUS_MULTIPROC_DIR to an empty directory before start.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'room.timing': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# List endpoints render rows straight from .values() instead of ModelSerializer.
+FAST_READ_SERIALIZERS = True
+
+# rooms/search/ answers from a per-process bitmap index instead of Postgres.
+# The index is rebuilt after MAX_AGE seconds or when the catalog or availability
+# tag moves past this process's own writes; when only the bookings tag moved,
+# bookings saved since the last check, minus DELTA_WINDOW seconds for late
+# commits, are re-read. VERIFY_RATE of searches are cross-checked against the
+# database.
+AVAILABILITY_INDEX = os.getenv('AVAILABILITY_INDEX', '') == '1'
+AVAILABILITY_INDEX_MAX_AGE = 600
+AVAILABILITY_INDEX_DELTA_WINDOW = 300
+AVAILABILITY_INDEX_VERIFY_RATE = 0.0
+
+# hotels/suggest/ answers from a per-process prefix index; other processes'
+# changes are picked up when the hotels cache tag moves, checked this often.
+# Hotels saved since the last check, minus DELTA_WINDOW seconds for late
+# commits, are re-read; a full rebuild happens when the hotel count or id sum
+# no longer matches, and every MAX_AGE seconds for edits that skip created_at.
+SUGGEST_INDEX_CHECK_INTERVAL = 5
+SUGGEST_INDEX_DELTA_WINDOW = 300
+SUGGEST_INDEX_MAX_AGE = 3600
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -134,5 +243,16 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 REST_FRAMEWORK = {
-    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
+    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    'DEFAULT_PAGINATION_CLASS': 'room.pagination.KeysetPagination',
+    'PAGE_SIZE': 100,
+    'DEFAULT_RENDERER_CLASSES': [
+        'room.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'room.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
\ No newline at end of file
@@ -16,8 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from room.views import HotelsViewSet, RoomTypesViewSet, RoomsViewSet, GuestsViewSet, BookingsViewSet
+from room.views import HotelsViewSet, RoomTypesViewSet, RoomsViewSet, GuestsViewSet, BookingsViewSet, QuotesViewSet
 from rest_framework import routers
+from room.routers import BulkRouter
+from room import async_views
+from room.metrics import metrics_view
 
 router = routers.DefaultRouter()
 router.register(r'hotels', HotelsViewSet, basename='hotel')
@@ -25,22 +28,32 @@ router.register(r'hotels', HotelsViewSet, basename='hotel')
 router_room_type = routers.DefaultRouter()
 router_room_type.register(r'room_types', RoomTypesViewSet, basename='room_types')
 
-router_rooms = routers.DefaultRouter()
+router_rooms = BulkRouter()
 router_rooms.register(r'rooms', RoomsViewSet, basename='rooms')
 
-router_guests = routers.DefaultRouter()
+router_guests = BulkRouter()
 router_guests.register(r'guests', GuestsViewSet, basename='guests')
 
 
-router_bookings = routers.DefaultRouter()
+router_bookings = BulkRouter()
 router_bookings.register(r'bookings', BookingsViewSet, basename='bookings')
 
+router_quotes = routers.DefaultRouter()
+router_quotes.register(r'quotes', QuotesViewSet, basename='quotes')
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('api/v1/', include(router.urls)),
     path('api/v1/', include(router_room_type.urls)),
     path('api/v1/', include(router_rooms.urls)),
     path('api/v1/', include(router_guests.urls)),
-    path('api/v1/', include(router_bookings.urls))
+    path('api/v1/', include(router_bookings.urls)),
+    path('api/v1/', include(router_quotes.urls)),
+    path('api/v1/async/hotels/', async_views.hotel_list, name='async-hotel-list'),
+    path('api/v1/async/hotels/<int:pk>/', async_views.hotel_detail, name='async-hotel-detail'),
+    path('api/v1/async/hotels/<int:pk>/room_types/', async_views.hotel_room_types, name='async-hotel-room-types'),
+    path('api/v1/async/room_types/<int:pk>/rooms/', async_views.room_type_rooms, name='async-room-types-rooms'),
+    path('api/v1/async/rooms/search/', async_views.rooms_search, name='async-rooms-search'),
 ]
 
@@ -1,4 +1,6 @@
 from django.contrib import admin
-from room.models import Hotels
+from room.models import Hotels, Rate_overrides, Stay_discounts
 
 admin.site.register(Hotels)
+admin.site.register(Rate_overrides)
+admin.site.register(Stay_discounts)
@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class RoomConfig(AppConfig):
     name = 'room'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+        from . import signals  # noqa: F401
+        from .sharding import reserve_id_range
+        from .timing import install_query_recorder
+        post_migrate.connect(reserve_id_range, sender=self)
+        connection_created.connect(install_query_recorder)
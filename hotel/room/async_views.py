@@ -0,0 +1,103 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from django_filters.filterset import filterset_factory
+from rest_framework.utils.urls import replace_query_param
+from . import availability
+from .cache import acache_response
+from .converter import fast_reader
+from .models import Hotels, Room_types, Rooms
+from .pagination import KeysetPagination, keyset_page
+from .renderers import ORJSONRenderer
+from .serializers import HotelsSerializer, SearchSerializer
+from .sharding import scatter
+from .views import HotelsViewSet
+
+
+renderer = ORJSONRenderer()
+HotelsFilter = filterset_factory(Hotels, fields=HotelsViewSet.filterset_fields)
+
+
+def json_response(data, status=200):
+    return HttpResponse(renderer.render(data), status=status, content_type='application/json')
+
+
+def not_found(model):
+    return json_response({'detail': f'No {model._meta.object_name} matches the given query.'}, status=404)
+
+
+def parse_int(value, default=None):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+async def fetch(queryset):
+    return [row async for row in queryset]
+
+
+@require_GET
+@acache_response('hotels')
+async def hotel_list(request):
+    filterset = HotelsFilter(request.GET, queryset=Hotels.objects.all())
+    if not filterset.is_valid():
+        return json_response(filterset.errors, status=400)
+    page_size = min(
+        max(1, parse_int(request.GET.get('page_size'), settings.REST_FRAMEWORK['PAGE_SIZE'])),
+        KeysetPagination.max_page_size,
+    )
+    queryset = scatter(filterset.qs).order_by('id')
+    after = parse_int(request.GET.get('after'))
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+
+    reader = fast_reader(HotelsSerializer)
+    rows = await fetch(reader.values(queryset)[:page_size + 1])
+    results = reader.convert(rows[:page_size])
+    next_url = None
+    if len(rows) > page_size:
+        next_url = replace_query_param(request.build_absolute_uri(), 'after', results[-1]['id'])
+    return json_response({'next': next_url, 'results': results})
+
+
+@require_GET
+@acache_response('hotel:{pk}')
+async def hotel_detail(request, pk):
+    reader = fast_reader(HotelsSerializer)
+    rows = await fetch(reader.values(scatter(Hotels.objects.filter(pk=pk))))
+    if not rows:
+        return not_found(Hotels)
+    return json_response(reader.convert(rows)[0])
+
+
+@require_GET
+@acache_response('hotel:{pk}', 'hotel:{pk}:room_types')
+async def hotel_room_types(request, pk):
+    if not await scatter(Hotels.objects.filter(pk=pk)).aexists():
+        return json_response({'ОШИБКА': 'Такого отеля не существует!'})
+    return json_response({'types': await fetch(scatter(Room_types.objects.filter(hotel_id=pk)).values())})
+
+
+@require_GET
+@acache_response('room_type:{pk}', 'room_type:{pk}:rooms')
+async def room_type_rooms(request, pk):
+    if not await scatter(Room_types.objects.filter(pk=pk)).aexists():
+        return json_response({'ОШИБКА': 'Такой комнаты не существует!'})
+    return json_response({'rooms': await fetch(scatter(Rooms.objects.filter(type_id=pk)).values())})
+
+
+@require_GET
+async def rooms_search(request):
+    params = SearchSerializer(data=request.GET)
+    if not params.is_valid():
+        return json_response(params.errors, status=400)
+    query = dict(params.validated_data)
+    query['room_type'] = query.pop('type', None)
+    limit = query.pop('limit')
+    if settings.AVAILABILITY_INDEX:
+        rooms = await sync_to_async(availability.index.search)(**query, limit=limit + 1)
+    else:
+        rooms = await fetch(availability.search_queryset(**query)[:limit + 1])
+    return json_response(keyset_page(request, rooms, limit))
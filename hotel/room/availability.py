@@ -0,0 +1,339 @@
+import heapq
+import logging
+import random
+import threading
+import time
+from datetime import date, timedelta
+from operator import itemgetter
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .cache import GLOBAL_TAG, adopt_version, tag_versions
+from .models import Bookings, Room_nights, Room_types, Rooms, CANCELLED_STATUS
+from .sharding import scatter
+
+
+logger = logging.getLogger(__name__)
+
+# По версиям тегов индексы других процессов узнают об изменениях, которых не
+# видели их сигналы. Сохраненные бронирования дочитываются по created_at
+# (auto_now), а удаления бронирований и записи комнат и типов комнат
+# перестраивают индекс целиком.
+AVAILABILITY_TAG = 'availability'
+BOOKINGS_TAG = 'availability:bookings'
+TAGS = [GLOBAL_TAG, AVAILABILITY_TAG, BOOKINGS_TAG]
+
+
+def search_queryset(check_in, check_out, hotel=None, room_type=None, guests=None, after=None):
+    """Тот же поиск, что и у индекса, но запросом к календарю Room_nights."""
+    busy = Room_nights.objects.filter(room=OuterRef('pk'), date__gte=check_in, date__lt=check_out)
+    rooms = Rooms.objects.filter(is_available=True).exclude(Exists(busy))
+    if after is not None:
+        rooms = rooms.filter(pk__gt=after)
+    if hotel is not None:
+        rooms = rooms.filter(hotel=hotel)
+    if room_type is not None:
+        rooms = rooms.filter(type=room_type)
+    if guests is not None:
+        rooms = rooms.filter(type__max_guests__gte=guests)
+    return scatter(rooms).order_by('id').values('id', 'hotel', 'type')
+
+
+def positions(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class HotelIndex:
+    """Комнаты отеля x ночи: на каждую ночь одна битовая строка по комнатам."""
+
+    def __init__(self):
+        self.rooms = []
+        self.positions = {}
+        self.types = {}
+        self.available = 0
+        self.nights = {}
+
+    def add_room(self, room_id, type_id, is_available):
+        position = self.positions.get(room_id)
+        if position is None:
+            position = self.positions[room_id] = len(self.rooms)
+            self.rooms.append(None)
+        else:
+            self.discard_masks(position)
+        bit = 1 << position
+        self.rooms[position] = (room_id, type_id)
+        self.types[type_id] = self.types.get(type_id, 0) | bit
+        if is_available:
+            self.available |= bit
+
+    def remove_room(self, room_id):
+        position = self.positions.pop(room_id, None)
+        if position is None:
+            return
+        self.discard_masks(position)
+        self.rooms[position] = None
+        bit = ~(1 << position)
+        for night in list(self.nights):
+            self.nights[night] &= bit
+
+    def discard_masks(self, position):
+        bit = ~(1 << position)
+        _, type_id = self.rooms[position]
+        self.types[type_id] &= bit
+        self.available &= bit
+
+    def mark(self, room_id, check_in, check_out, busy):
+        bit = 1 << self.positions[room_id]
+        for night in range(check_in, check_out):
+            if busy:
+                self.nights[night] = self.nights.get(night, 0) | bit
+            elif night in self.nights:
+                self.nights[night] &= ~bit
+
+    def free(self, check_in, check_out, type_ids=None):
+        candidates = self.available
+        if type_ids is not None:
+            candidates &= sum(self.types.get(type_id, 0) for type_id in type_ids)
+        busy = 0
+        for night in range(check_in, check_out):
+            busy |= self.nights.get(night, 0)
+        return [self.rooms[position] for position in positions(candidates & ~busy)]
+
+    def snapshot(self, since):
+        rooms = sorted(
+            (room[0], room[1], bool(self.available >> position & 1))
+            for position, room in enumerate(self.rooms) if room
+        )
+        nights = {
+            night: sorted(self.rooms[p][0] for p in positions(mask))
+            for night, mask in self.nights.items() if night >= since and mask
+        }
+        return rooms, nights
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()
+        self.pending = None
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.hotels = None
+            self.room_hotels = {}
+            self.type_guests = {}
+            self.bookings = {}
+            self.room_bookings = {}
+            self.built_at = 0
+            self.synced_at = None
+            self.version = None
+
+    @property
+    def ready(self):
+        return self.hotels is not None
+
+    def build(self):
+        """
+        Читает индекс заново, не держа lock: поиск тем временем отвечает по
+        старому. Изменения, которые сигналы этого процесса применили за время
+        чтения, запоминаются в pending и повторяются уже на новом индексе.
+        """
+        with self.build_lock:
+            with self.lock:
+                self.pending = []
+            try:
+                self.swap(*self.read())
+            finally:
+                self.pending = None
+
+    def read(self):
+        since = date.today().toordinal()
+        version, synced_at = tag_versions(TAGS), timezone.now()
+        hotels, room_hotels = {}, {}
+        type_guests = dict(scatter(Room_types.objects.all()).values_list('id', 'max_guests'))
+        for room_id, hotel_id, type_id, is_available in scatter(Rooms.objects.all()).values_list(
+            'id', 'hotel_id', 'type_id', 'is_available'
+        ).order_by('hotel_id', 'id'):
+            hotels.setdefault(hotel_id, HotelIndex()).add_room(room_id, type_id, is_available)
+            room_hotels[room_id] = hotel_id
+
+        bookings, room_bookings = {}, {}
+        active = scatter(Bookings.objects.active().filter(check_out_date__gt=date.fromordinal(since)))
+        for booking_id, room_id, check_in, check_out in active.values_list(
+            'id', 'room_id', 'check_in_date', 'check_out_date'
+        ).iterator(chunk_size=10000):
+            if room_id not in room_hotels:
+                # Комната создана уже после чтения комнат; ее запись подняла
+                # AVAILABILITY_TAG, и следующая сверка перестроит индекс.
+                continue
+            stay = (room_id, check_in.toordinal(), check_out.toordinal())
+            bookings[booking_id] = stay
+            room_bookings.setdefault(room_id, set()).add(booking_id)
+            hotels[room_hotels[room_id]].mark(*stay, busy=True)
+        return (hotels, room_hotels, type_guests, bookings, room_bookings), synced_at, version
+
+    def swap(self, state, synced_at, version):
+        with self.lock:
+            self.hotels, self.room_hotels, self.type_guests, self.bookings, self.room_bookings = state
+            self.built_at, self.synced_at, self.version = time.monotonic(), synced_at, version
+            bumped = []
+            for tag, method, args in self.pending:
+                method(*args)
+                bumped.append(TAGS.index(tag))
+            if self.ready:
+                self.version = adopt_version(version, TAGS, *bumped)
+
+    def refresh(self, version):
+        """
+        Дочитывает бронирования, сохраненные с прошлой сверки. Окно берется с
+        запасом AVAILABILITY_INDEX_DELTA_WINDOW: транзакция, начатая до сверки,
+        коммитится позже.
+        """
+        synced_at, today = timezone.now(), date.today()
+        since = self.synced_at - timedelta(seconds=settings.AVAILABILITY_INDEX_DELTA_WINDOW)
+        changed = list(scatter(Bookings.objects.filter(created_at__gte=since)).values_list(
+            'id', 'room_id', 'check_in_date', 'check_out_date', 'status'
+        ))
+        with self.lock:
+            for booking_id, room_id, check_in, check_out, status in changed:
+                active = status != CANCELLED_STATUS and check_out > today
+                self.save_booking(booking_id, room_id, check_in, check_out, active)
+            if self.ready:
+                self.synced_at, self.version = synced_at, version
+
+    def ensure(self):
+        """
+        Полная перестройка - после AVAILABILITY_INDEX_MAX_AGE или когда сдвинулись
+        теги каталога и структуры; если сдвинулся только тег бронирований,
+        дочитываются измененные бронирования.
+        """
+        if not self.ready or time.monotonic() - self.built_at > settings.AVAILABILITY_INDEX_MAX_AGE:
+            self.build()
+            return
+        version = tag_versions(TAGS)
+        if version == self.version:
+            return
+        if version[:2] != self.version[:2]:
+            self.build()
+            return
+        self.refresh(version)
+        if not self.ready:
+            self.build()
+
+    def apply(self, tag, method, *args):
+        """Изменение из сигнала этого процесса, после того как оно подняло версию tag."""
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((tag, method, args))
+            if not self.ready:
+                return
+            method(*args)
+            if self.ready:
+                self.version = adopt_version(self.version, TAGS, TAGS.index(tag))
+
+    def search(self, check_in, check_out, hotel=None, room_type=None, guests=None, after=None, limit=None):
+        """Свободные комнаты по возрастанию id: после after и не больше limit."""
+        self.ensure()
+        query = (check_in, check_out, hotel, room_type, guests, after, limit)
+        rooms = self.lookup(*query)
+        if random.random() < settings.AVAILABILITY_INDEX_VERIFY_RATE and not self.verify():
+            logger.warning('Индекс доступности разошелся с базой, перестраиваем')
+            self.build()
+            rooms = self.lookup(*query)
+        return rooms
+
+    def lookup(self, check_in, check_out, hotel, room_type, guests, after, limit):
+        with self.lock:
+            type_ids = None
+            if room_type is not None:
+                type_ids = [room_type]
+            if guests is not None:
+                fitting = [pk for pk, max_guests in self.type_guests.items() if max_guests >= guests]
+                type_ids = fitting if type_ids is None else [pk for pk in type_ids if pk in fitting]
+            hotels = self.hotels.items() if hotel is None else [(hotel, self.hotels.get(hotel))]
+            rooms = (
+                {'id': room_id, 'hotel': hotel_id, 'type': type_id}
+                for hotel_id, index in hotels if index is not None
+                for room_id, type_id in index.free(check_in.toordinal(), check_out.toordinal(), type_ids)
+                if after is None or room_id > after
+            )
+            if limit is not None:
+                return heapq.nsmallest(limit, rooms, key=itemgetter('id'))
+            return sorted(rooms, key=itemgetter('id'))
+
+    def save_booking(self, booking_id, room_id, check_in, check_out, active):
+        with self.lock:
+            if not self.ready:
+                return
+            if room_id not in self.room_hotels:
+                self.reset()
+                return
+            self.release(booking_id)
+            if active:
+                stay = (room_id, check_in.toordinal(), check_out.toordinal())
+                self.bookings[booking_id] = stay
+                self.room_bookings.setdefault(room_id, set()).add(booking_id)
+                self.hotels[self.room_hotels[room_id]].mark(*stay, busy=True)
+
+    def release(self, booking_id):
+        with self.lock:
+            if not self.ready or booking_id not in self.bookings:
+                return
+            room_id, check_in, check_out = self.bookings.pop(booking_id)
+            others = self.room_bookings.get(room_id, set())
+            others.discard(booking_id)
+            hotel = self.hotels[self.room_hotels[room_id]]
+            hotel.mark(room_id, check_in, check_out, busy=False)
+            for other in others:
+                _, other_in, other_out = self.bookings[other]
+                if other_in < check_out and check_in < other_out:
+                    hotel.mark(room_id, max(check_in, other_in), min(check_out, other_out), busy=True)
+
+    def save_room(self, room_id, hotel_id, type_id, is_available):
+        with self.lock:
+            if not self.ready:
+                return
+            if self.room_hotels.get(room_id, hotel_id) != hotel_id:
+                self.reset()
+                return
+            self.room_hotels[room_id] = hotel_id
+            self.hotels.setdefault(hotel_id, HotelIndex()).add_room(room_id, type_id, is_available)
+
+    def delete_room(self, room_id):
+        with self.lock:
+            if not self.ready or room_id not in self.room_hotels:
+                return
+            for booking_id in self.room_bookings.pop(room_id, set()):
+                del self.bookings[booking_id]
+            self.hotels[self.room_hotels.pop(room_id)].remove_room(room_id)
+
+    def save_room_type(self, type_id, max_guests):
+        with self.lock:
+            if self.ready:
+                self.type_guests[type_id] = max_guests
+
+    def delete_room_type(self, type_id):
+        with self.lock:
+            if self.ready:
+                self.type_guests.pop(type_id, None)
+
+    def snapshot(self):
+        since = date.today().toordinal()
+        with self.lock:
+            hotels = {
+                hotel_id: index.snapshot(since)
+                for hotel_id, index in self.hotels.items() if index.positions
+            }
+            return hotels, dict(self.type_guests)
+
+    def verify(self):
+        fresh = AvailabilityIndex()
+        fresh.build()
+        return fresh.snapshot() == self.snapshot()
+
+
+index = AvailabilityIndex()
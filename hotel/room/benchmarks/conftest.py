@@ -0,0 +1,221 @@
+"""
+Бенчмарк эндпоинтов API на сгенерированных данных (generate_data) нескольких
+размеров. Запуск: pytest hotel/room/benchmarks --ds=... (нужен Postgres,
+тестовая база создается и удаляется pytest-django).
+
+Переменные окружения:
+    BENCH_SIZES            размеры наборов через запятую (по умолчанию small,medium)
+    BENCH_ITERATIONS       замеров времени на эндпоинт (по умолчанию 20)
+    BENCH_TOLERANCE        допустимый рост времени и памяти, доля (по умолчанию 0.5)
+    BENCH_UPDATE_BASELINE  1 - записать результаты в baseline.json вместо сравнения
+
+Время зависит от машины, поэтому в начале прогона замеряется эталонная
+нагрузка (SQL и Python, не зависящие от кода проекта), и время из baseline.json
+масштабируется отношением эталона этого прогона к записанному. Это убирает
+разницу в скорости машин, но не в их устройстве (диск, число ядер, версия
+Postgres): для точных порогов перезапишите базовую линию на машине, где идет
+сравнение (CI), c BENCH_UPDATE_BASELINE=1. Число запросов и память от машины
+не зависят.
+"""
+import json
+import os
+import statistics
+import time
+import tracemalloc
+from datetime import date
+from pathlib import Path
+import pytest
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from room.availability import index
+from room.cache import local_cache
+from room.models import Bookings, Guests, Hotels, Room_types, Rooms
+
+
+BASELINE = Path(__file__).with_name('baseline.json')
+TODAY = date(2026, 6, 1)
+SIZES = {
+    'small': {'hotels': 20, 'rooms_per_hotel': 20, 'bookings': 4000},
+    'medium': {'hotels': 100, 'rooms_per_hotel': 40, 'bookings': 40000},
+    'large': {'hotels': 1000, 'rooms_per_hotel': 100, 'bookings': 1000000},
+}
+# Порог срабатывания в абсолютных величинах: на быстрых эндпоинтах шум
+# измерения больше допуска в процентах.
+MIN_DELTA = {'p95_ms': 10.0, 'peak_kb': 256}
+
+REFERENCE_SQL = 'SELECT sum(g) FROM generate_series(1, 200000) g'
+REFERENCE_ITERATIONS = 30
+
+RESULTS = {}
+REFERENCE = {}
+
+
+def env_sizes():
+    names = [name.strip() for name in os.environ.get('BENCH_SIZES', 'small,medium').split(',') if name.strip()]
+    unknown = set(names) - set(SIZES)
+    if unknown:
+        raise pytest.UsageError(f'Неизвестные размеры BENCH_SIZES: {", ".join(sorted(unknown))}')
+    return names
+
+
+def updating():
+    return os.environ.get('BENCH_UPDATE_BASELINE') == '1'
+
+
+def load_baseline():
+    if not BASELINE.exists():
+        return {'reference_ms': None, 'endpoints': {}}
+    return json.loads(BASELINE.read_text())
+
+
+def reference_workload():
+    with connection.cursor() as cursor:
+        cursor.execute(REFERENCE_SQL)
+        cursor.fetchone()
+    json.dumps(sorted((str(i), i) for i in range(20000)))
+
+
+@pytest.fixture(scope='session')
+def reference_ms(django_db_setup, django_db_blocker):
+    """Медиана времени эталонной нагрузки на этой машине в этом прогоне."""
+    with django_db_blocker.unblock():
+        reference_workload()
+        timings = []
+        for _ in range(REFERENCE_ITERATIONS):
+            started = time.perf_counter()
+            reference_workload()
+            timings.append((time.perf_counter() - started) * 1000)
+    REFERENCE['ms'] = round(statistics.median(timings), 3)
+    return REFERENCE['ms']
+
+
+class Dataset:
+    """Сгенерированный набор данных и id объектов, по которым ходят эндпоинты."""
+
+    def __init__(self, name):
+        self.name = name
+        self.today = TODAY
+        self.hotel = Hotels.objects.order_by('pk').values_list('pk', flat=True).first()
+        self.room_type = Room_types.objects.filter(hotel_id=self.hotel).order_by('pk').values_list(
+            'pk', flat=True
+        ).first()
+        self.room = Rooms.objects.filter(hotel_id=self.hotel).order_by('pk').values_list('pk', flat=True).first()
+        self.guest = Guests.objects.order_by('pk').values_list('pk', flat=True).first()
+        self.booking = Bookings.objects.filter(room_id=self.room).order_by('pk').values_list(
+            'pk', flat=True
+        ).first()
+        self.room_types = list(Room_types.objects.order_by('pk').values_list('pk', flat=True)[:50])
+
+
+@pytest.fixture(scope='module', params=env_sizes())
+def dataset(request, django_db_setup, django_db_blocker):
+    """Набор данных размера request.param; пересоздается при смене размера."""
+    with django_db_blocker.unblock():
+        tables = ', '.join(model._meta.db_table for model in apps.get_app_config('room').get_models())
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {tables} RESTART IDENTITY CASCADE')
+        call_command(
+            'generate_data', seed=42, today=TODAY, verbosity=0,
+            workers=int(os.environ.get('BENCH_WORKERS', 4)), **SIZES[request.param],
+        )
+        return Dataset(request.param)
+
+
+def percentile(timings, q):
+    return round(statistics.quantiles(timings, n=100, method='inclusive')[q - 1], 2)
+
+
+def measure(call, iterations):
+    """
+    Прогрев, затем отдельные прогоны для числа запросов, пиковой памяти
+    (tracemalloc замедляет код) и времени. Кэши сбрасываются перед каждым
+    вызовом: меряется путь без кэша.
+    """
+    def run():
+        local_cache().clear()
+        index.reset()
+        call()
+
+    run()
+    with CaptureQueriesContext(connection) as queries:
+        run()
+    # queries_log очищается следующим запросом: считаем сразу.
+    query_count = len(queries)
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'p50_ms': percentile(timings, 50),
+        'p95_ms': percentile(timings, 95),
+        'p99_ms': percentile(timings, 99),
+        'queries': query_count,
+        'peak_kb': peak // 1024,
+    }
+
+
+def regressions(result, expected, tolerance, scale=1.0):
+    """scale - во сколько раз эта машина медленнее той, где записана базовая линия."""
+    problems = []
+    if result['queries'] > expected['queries']:
+        problems.append(f'запросов {result["queries"]}, в базовой линии {expected["queries"]}')
+    for metric, floor in MIN_DELTA.items():
+        base = expected[metric] * scale if metric.endswith('_ms') else expected[metric]
+        limit = max(base * (1 + tolerance), base + floor)
+        if result[metric] > limit:
+            problems.append(f'{metric} {result[metric]}, допустимо до {round(limit, 2)}')
+    return problems
+
+
+@pytest.fixture
+def benchmark(reference_ms):
+    """Замер и сравнение с baseline.json; при BENCH_UPDATE_BASELINE=1 только запись."""
+    baseline = load_baseline()
+    iterations = int(os.environ.get('BENCH_ITERATIONS', 20))
+    tolerance = float(os.environ.get('BENCH_TOLERANCE', 0.5))
+    scale = reference_ms / baseline['reference_ms'] if baseline['reference_ms'] else 1.0
+
+    def run(key, call):
+        result = measure(call, iterations)
+        RESULTS[key] = result
+        expected = baseline['endpoints'].get(key)
+        if expected is None or updating():
+            return result
+        problems = regressions(result, expected, tolerance, scale)
+        if problems:
+            pytest.fail(f'Регрессия {key}: ' + '; '.join(problems), pytrace=False)
+        return result
+    return run
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if updating() and RESULTS:
+        baseline = load_baseline()
+        baseline['reference_ms'] = REFERENCE['ms']
+        baseline['endpoints'] = dict(sorted({**baseline['endpoints'], **RESULTS}.items()))
+        BASELINE.write_text(json.dumps(baseline, indent=2, ensure_ascii=False) + '\n')
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not RESULTS:
+        return
+    terminalreporter.section('benchmarks')
+    terminalreporter.write_line(f'эталонная нагрузка: {REFERENCE["ms"]:.2f}ms')
+    terminalreporter.write_line(f'{"эндпоинт":<40} {"p50":>9} {"p95":>9} {"p99":>9} {"запросы":>8} {"память":>9}')
+    for key, result in sorted(RESULTS.items()):
+        terminalreporter.write_line(
+            f'{key:<40} {result["p50_ms"]:>7.2f}ms {result["p95_ms"]:>7.2f}ms {result["p99_ms"]:>7.2f}ms '
+            f'{result["queries"]:>8} {result["peak_kb"]:>7}KB'
+        )
+    if updating():
+        terminalreporter.write_line(f'Базовая линия записана в {BASELINE}')
+
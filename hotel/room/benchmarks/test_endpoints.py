@@ -0,0 +1,88 @@
+import itertools
+from datetime import timedelta
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+
+def stay(dataset, start, nights):
+    check_in = dataset.today + timedelta(days=start)
+    return check_in.isoformat(), (check_in + timedelta(days=nights)).isoformat()
+
+
+def calendar_params(dataset):
+    start, end = stay(dataset, 0, 30)
+    return {'start': start, 'end': end}
+
+
+def stats_params(dataset):
+    start, end = stay(dataset, -90, 90)
+    return {'from': start, 'to': end}
+
+
+def availability_params(dataset):
+    check_in, check_out = stay(dataset, 14, 3)
+    return {'check_in': check_in, 'check_out': check_out, 'guests': 2}
+
+
+def quotes_body(dataset):
+    return [
+        dict(zip(('check_in', 'check_out'), stay(dataset, offset % 60, 1 + offset % 7)), room_type=room_type)
+        for offset, room_type in enumerate(dataset.room_types)
+    ]
+
+
+def booking_body(dataset):
+    """Каждый вызов - новое бронирование за пределами сгенерированных дат."""
+    offsets = itertools.count()
+
+    def body():
+        check_in, check_out = stay(dataset, 400 + 3 * next(offsets), 2)
+        return {'guest': dataset.guest, 'room': dataset.room, 'check_in_date': check_in, 'check_out_date': check_out,
+                'status': 'confirmed'}
+    return body
+
+
+# (имя, метод, маршрут, атрибут Dataset с pk для detail-маршрута, параметры)
+ENDPOINTS = [
+    ('hotels-list', 'get', 'hotel-list', None, None),
+    ('hotels-list-filtered', 'get', 'hotel-list', None, lambda dataset: {'star_rating': 4, 'ordering': '-created_at'}),
+    ('hotels-retrieve', 'get', 'hotel-detail', 'hotel', None),
+    ('hotels-room-types', 'get', 'hotel-room-types', 'hotel', None),
+    ('hotels-calendar', 'get', 'hotel-calendar', 'hotel', calendar_params),
+    ('hotels-stats', 'get', 'hotel-stats', 'hotel', stats_params),
+    ('room-types-list', 'get', 'room_types-list', None, lambda dataset: {'hotel': dataset.hotel}),
+    ('room-types-rooms', 'get', 'room_types-rooms', 'room_type', None),
+    ('rooms-list', 'get', 'rooms-list', None, None),
+    ('rooms-available', 'get', 'rooms-available', None, availability_params),
+    ('rooms-search', 'get', 'rooms-search', None, availability_params),
+    ('guests-list', 'get', 'guests-list', None, None),
+    ('bookings-list', 'get', 'bookings-list', None, None),
+    ('bookings-list-expand', 'get', 'bookings-list', None, lambda dataset: {'expand': 'guest,room'}),
+    ('bookings-retrieve', 'get', 'bookings-detail', 'booking', None),
+    ('bookings-export', 'get', 'bookings-export', None, lambda dataset: {'room': dataset.room}),
+    ('bookings-create', 'post', 'bookings-list', None, booking_body),
+    ('quotes', 'post', 'quotes-list', None, quotes_body),
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name, method, route, detail, params', ENDPOINTS, ids=[row[0] for row in ENDPOINTS])
+def test_endpoint(dataset, benchmark, name, method, route, detail, params):
+    """Время, число запросов и память эндпоинта не хуже базовой линии"""
+    client = APIClient()
+    url = reverse(route, kwargs={'pk': getattr(dataset, detail)} if detail else None)
+    data = params(dataset) if params else None
+    if method == 'post' and not callable(data):
+        data = (lambda body: lambda: body)(data)
+
+    def call():
+        if method == 'get':
+            response = client.get(url, data)
+        else:
+            response = client.post(url, data(), format='json')
+        assert response.status_code < 400, response.content
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+    benchmark(f'{dataset.name}/{name}', call)
@@ -0,0 +1,110 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import router, transaction
+from django.db.models.signals import post_save
+from rest_framework import serializers, status
+from rest_framework.response import Response
+
+
+class BulkModelMixin:
+    def create(self, request, *args, **kwargs):
+        if isinstance(request.data, list):
+            return self.bulk_create(request)
+        return super().create(request, *args, **kwargs)
+
+    def bulk_create(self, request):
+        model = self.get_queryset().model
+        context = self.get_bulk_context(request.data)
+        valid, errors = {}, {}
+        for index, row in enumerate(request.data):
+            serializer = self.get_serializer_class()(data=row, context=context)
+            if serializer.is_valid():
+                valid[index] = model(**serializer.validated_data)
+            else:
+                errors[index] = serializer.errors
+
+        self.validate_bulk(valid, errors)
+        saved = []
+        if valid:
+            with self.bulk_write():
+                saved = model.objects.bulk_create(list(valid.values()))
+                self.send_saved(saved, created=True)
+        return self.get_bulk_response(saved, errors, status.HTTP_201_CREATED)
+
+    def bulk_partial_update(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            raise serializers.ValidationError({'non_field_errors': ['Ожидается список объектов.']})
+        model = self.get_queryset().model
+        ids = [row.get('id') if isinstance(row, dict) else None for row in request.data]
+        instances = self.get_queryset().in_bulk([pk for pk in ids if isinstance(pk, int)])
+        context = self.get_bulk_context(request.data)
+        valid, errors, fields = {}, {}, set()
+        for index, (pk, row) in enumerate(zip(ids, request.data)):
+            instance = instances.get(pk) if isinstance(pk, int) else None
+            if instance is None:
+                errors[index] = {'id': ['Объект не найден.']}
+                continue
+            serializer = self.get_serializer_class()(instance, data=row, partial=True, context=context)
+            if not serializer.is_valid():
+                errors[index] = serializer.errors
+                continue
+            for attr, value in serializer.validated_data.items():
+                setattr(instance, attr, value)
+            fields.update(serializer.validated_data)
+            valid[index] = instance
+
+        self.validate_bulk(valid, errors)
+        saved = list(valid.values())
+        if saved:
+            for field in model._meta.concrete_fields:
+                if getattr(field, 'auto_now', False):
+                    for instance in saved:
+                        field.pre_save(instance, add=False)
+                    fields.add(field.name)
+            with self.bulk_write():
+                model.objects.bulk_update(saved, list(fields))
+                self.send_saved(saved, created=False)
+        return self.get_bulk_response(saved, errors, status.HTTP_200_OK)
+
+    def get_bulk_context(self, rows):
+        context = self.get_serializer_context()
+        prefetched = {}
+        for name, field in self.get_serializer().fields.items():
+            if field.read_only or not isinstance(field, serializers.PrimaryKeyRelatedField):
+                continue
+            queryset = field.get_queryset()
+            pks = set()
+            for row in rows:
+                if not isinstance(row, dict) or name not in row:
+                    continue
+                try:
+                    pks.add(queryset.model._meta.pk.to_python(row[name]))
+                except (TypeError, ValueError, DjangoValidationError):
+                    pass
+            pks.discard(None)
+            prefetched[name] = queryset.in_bulk(pks)
+        context['prefetched'] = prefetched
+        return context
+
+    def send_saved(self, instances, created):
+        for instance in instances:
+            post_save.send(
+                sender=type(instance), instance=instance, created=created,
+                update_fields=None, raw=False, using=instance._state.db,
+            )
+
+    def validate_bulk(self, valid, errors):
+        pass
+
+    def bulk_write(self):
+        return transaction.atomic(using=router.db_for_write(self.queryset.model))
+
+    def get_bulk_response(self, saved, errors, success_status):
+        data = {
+            'results': self.get_serializer(saved, many=True).data,
+            'errors': [{'index': index, 'errors': errors[index]} for index in sorted(errors)],
+        }
+        if not errors:
+            return Response(data, status=success_status)
+        if saved:
+            return Response(data, status=status.HTTP_207_MULTI_STATUS)
+        return Response(data, status=status.HTTP_400_BAD_REQUEST)
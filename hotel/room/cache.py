@@ -0,0 +1,110 @@
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework.response import Response
+
+
+GLOBAL_TAG = 'catalog'
+CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+
+def local_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def shared_cache():
+    return caches[settings.CATALOG_CACHE_TAGS_ALIAS]
+
+
+def tag_versions(tags):
+    keys = [f'tag:{tag}' for tag in tags]
+    versions = shared_cache().get_many(keys)
+    for key in keys:
+        if key not in versions:
+            shared_cache().add(key, time.time_ns(), timeout=None)
+            versions[key] = shared_cache().get(key)
+    return [versions[key] for key in keys]
+
+
+async def atag_versions(tags):
+    keys = [f'tag:{tag}' for tag in tags]
+    versions = await shared_cache().aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await shared_cache().aadd(key, time.time_ns(), timeout=None)
+            versions[key] = await shared_cache().aget(key)
+    return [versions[key] for key in keys]
+
+
+def adopt_version(version, tags, *bumped):
+    """
+    Версия тегов для индекса процесса, который сам только что поднял теги с
+    позициями bumped. Если они выросли ровно на его записи, индекс актуален и
+    получает новую версию; иначе писали и другие процессы, и версия остается
+    прежней - их изменения индекс дочитает при следующей сверке.
+    """
+    expected = list(version)
+    for position in bumped:
+        expected[position] += 1
+    return expected if tag_versions(tags) == expected else version
+
+
+def invalidate(*tags):
+    for tag in tags:
+        key = f'tag:{tag}'
+        try:
+            shared_cache().incr(key)
+        except ValueError:
+            shared_cache().set(key, time.time_ns(), timeout=None)
+
+
+def invalidate_on_commit(*tags, using=None):
+    transaction.on_commit(lambda: invalidate(*tags), using=using)
+
+
+def response_key(request, versions):
+    params = sorted((name, sorted(values)) for name, values in request.GET.lists())
+    raw = f'{request.path}?{urlencode(params, doseq=True)}|{versions}'
+    return 'response:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def cache_response(*tags):
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            versions = tag_versions([GLOBAL_TAG, *[tag.format(**kwargs) for tag in tags]])
+            key = response_key(request, versions)
+            cached = local_cache().get(key)
+            if cached is not None:
+                data, headers = cached
+                return Response(data, headers=headers)
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+                local_cache().set(key, (response.data, headers))
+            return response
+        return wrapper
+    return decorator
+
+
+def acache_response(*tags):
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            versions = await atag_versions([GLOBAL_TAG, *[tag.format(**kwargs) for tag in tags]])
+            key = response_key(request, versions)
+            cached = await local_cache().aget(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+            response = await view(request, *args, **kwargs)
+            if response.status_code == 200:
+                await local_cache().aset(key, (response.content, response['Content-Type']))
+            return response
+        return wrapper
+    return decorator
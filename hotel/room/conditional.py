@@ -0,0 +1,54 @@
+import hashlib
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(request, *parts):
+    raw = '|'.join([request.get_full_path(), request.accepted_media_type or '', *map(str, parts)])
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+class ConditionalGetMixin:
+    last_modified_field = None
+
+    def list(self, request, *args, **kwargs):
+        if 'expand' in request.query_params:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        fingerprint = queryset.order_by().aggregate(
+            last_modified=Max(self.last_modified_field), count=Count('pk'), max_pk=Max('pk'),
+        )
+        return self.conditional(
+            request, fingerprint['last_modified'], fingerprint.values(),
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if 'expand' in request.query_params:
+            return super().retrieve(request, *args, **kwargs)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            last_modified = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            ).values_list(self.last_modified_field, flat=True).first()
+        except (TypeError, ValueError, ValidationError):
+            last_modified = None
+        if last_modified is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional(
+            request, last_modified, [kwargs[lookup_url_kwarg], last_modified.isoformat()],
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+        )
+
+    def conditional(self, request, last_modified, parts, get_response):
+        etag = make_etag(request, *parts)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = get_response()
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
@@ -0,0 +1,131 @@
+from functools import lru_cache
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models.functions import Cast
+from django.utils import timezone
+from phonenumber_field.modelfields import PhoneNumberField
+from rest_framework.response import Response
+from .timing import span
+
+
+def to_datetime(value):
+    value = timezone.localtime(value).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def to_date(value):
+    return value.isoformat()
+
+
+def field_converter(field):
+    if isinstance(field, models.DateTimeField):
+        return to_datetime
+    if isinstance(field, models.DateField):
+        return to_date
+    if isinstance(field, models.DecimalField):
+        return lambda value: f'{value:.{field.decimal_places}f}'
+    if isinstance(field, PhoneNumberField):
+        return str
+    return None
+
+
+def row_converter(fields):
+    converters = [field_converter(field) for field in fields]
+
+    def convert(row):
+        return [
+            value if to_value is None or value is None else to_value(value)
+            for to_value, value in zip(converters, row)
+        ]
+    return convert
+
+
+def phone_stored_as_rendered():
+    """
+    Строка телефона в базе (PHONENUMBER_DB_FORMAT) совпадает с выводом
+    PhoneNumberField (PHONENUMBER_DEFAULT_FORMAT), только если форматы одинаковы.
+    """
+    stored = getattr(settings, 'PHONENUMBER_DB_FORMAT', 'E164')
+    return stored == getattr(settings, 'PHONENUMBER_DEFAULT_FORMAT', 'E164')
+
+
+class FastReader:
+    def __init__(self, model, names):
+        self.names = names
+        self.fields = []
+        self.expressions = {}
+        self.keys = []
+        converters = []
+        for name in names:
+            field = model._meta.get_field(name)
+            key = name
+            converter = field_converter(field)
+            if isinstance(field, PhoneNumberField) and phone_stored_as_rendered():
+                key = f'raw_{name}'
+                self.expressions[key] = Cast(name, models.TextField())
+                converter = None
+            else:
+                self.fields.append(name)
+            self.keys.append(key)
+            converters.append(converter)
+        self.plan = list(zip(names, self.keys, converters))
+
+    def values(self, queryset):
+        # Аннотации (rank поиска) остаются в строках: по ним ведется курсор пагинации.
+        annotations = [name for name in queryset.query.annotation_select if name not in self.expressions]
+        return queryset.values(*self.fields, *annotations, **self.expressions)
+
+    def convert(self, rows):
+        plan = self.plan
+        result = []
+        for row in rows:
+            item = {}
+            for name, key, converter in plan:
+                value = row[key]
+                item[name] = value if converter is None or value is None else converter(value)
+            result.append(item)
+        return result
+
+
+@lru_cache
+def fast_reader(serializer_class):
+    model = serializer_class.Meta.model
+    names = []
+    for name, field in serializer_class().fields.items():
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if field.source != name or not model_field.concrete:
+            return None
+        names.append(name)
+    return FastReader(model, names)
+
+
+class FastReadMixin:
+    def list(self, request, *args, **kwargs):
+        if self.get_fast_reader() is None:
+            return super().list(request, *args, **kwargs)
+        return self.list_response(self.filter_queryset(self.get_queryset()))
+
+    def get_fast_reader(self):
+        if not getattr(settings, 'FAST_READ_SERIALIZERS', False) or 'expand' in self.request.query_params:
+            return None
+        return fast_reader(self.get_serializer_class())
+
+    def list_response(self, queryset):
+        reader = self.get_fast_reader()
+        if reader is None:
+            page = self.paginate_queryset(queryset)
+            data = self.get_serializer(queryset if page is None else page, many=True).data
+        else:
+            rows = reader.values(queryset)
+            page = self.paginate_queryset(rows)
+            with span('serialize'):
+                data = reader.convert(rows if page is None else page)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
@@ -0,0 +1,220 @@
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from . import sharding
+
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'db_primary'
+
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+class Routing:
+    def __init__(self, use_replica=False):
+        self.use_replica = use_replica
+        self.pinned = False
+        self.replica = None
+        self.failed = False
+
+
+routing = ContextVar('db_routing', default=None)
+
+
+class ReplicaHealth:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked = {}
+        self.down = set()
+        self.turn = itertools.count()
+
+    def lag(self, alias):
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            cursor.execute(LAG_SQL if connection.vendor == 'postgresql' else 'SELECT 0')
+            return float(cursor.fetchone()[0])
+
+    def healthy(self, alias):
+        with self.lock:
+            checked = self.checked.get(alias)
+            if checked is not None and time.monotonic() - checked < settings.REPLICA_CHECK_INTERVAL:
+                return alias not in self.down
+            self.checked[alias] = time.monotonic()
+        try:
+            lag = self.lag(alias)
+        except DatabaseError as exc:
+            logger.warning('Реплика %s недоступна: %s', alias, exc)
+            lag = None
+        with self.lock:
+            if lag is None or lag > settings.REPLICA_MAX_LAG:
+                if lag is not None:
+                    logger.warning('Реплика %s отстает на %.1f с', alias, lag)
+                self.down.add(alias)
+                return False
+            self.down.discard(alias)
+            return True
+
+    def mark_down(self, alias):
+        with self.lock:
+            self.down.add(alias)
+            self.checked[alias] = time.monotonic()
+
+    def choose(self):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            return None
+        start = next(self.turn)
+        for offset in range(len(replicas)):
+            alias = replicas[(start + offset) % len(replicas)]
+            if self.healthy(alias):
+                return alias
+        return None
+
+    def reset(self):
+        with self.lock:
+            self.checked.clear()
+            self.down.clear()
+
+
+health = ReplicaHealth()
+
+
+class ShardRouter:
+    """
+    Модели отеля идут на шард: тот же, что у связанного объекта, или шард
+    текущего запроса (sharding.use_shard). Гости и служебные таблицы остаются
+    следующему роутеру. Без DATABASE_SHARDS роутер ничего не решает.
+    """
+
+    def route(self, model, hints):
+        if not sharding.enabled() or not sharding.is_sharded(model):
+            return None
+        instance = hints.get('instance')
+        if instance is not None and sharding.is_sharded(type(instance)) and instance._state.db:
+            return instance._state.db
+        alias = sharding.shard.get()
+        if alias is None:
+            raise sharding.ShardNotSelected(
+                f'Запрос к {model._meta.object_name} без выбранного шарда: '
+                f'используйте sharding.use_shard() или sharding.scatter()'
+            )
+        return alias
+
+    def db_for_read(self, model, **hints):
+        return self.route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self.route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if sharding.enabled() and sharding.is_sharded(type(obj1)) and sharding.is_sharded(type(obj2)):
+            return obj1._state.db == obj2._state.db
+        return None
+
+
+class ReplicaRouter:
+    """Чтения безопасных запросов уходят на реплики, все остальное на основную базу."""
+
+    def db_for_read(self, model, **hints):
+        state = routing.get()
+        if state is None or not state.use_replica or state.pinned:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            state.replica = health.choose() or DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = routing.get()
+        if state is not None:
+            state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Включает реплики для GET/HEAD/OPTIONS. После записи клиент получает cookie,
+    и его чтения идут на основную базу REPLICA_PIN_SECONDS секунд.
+    Если реплика упала посреди запроса, запрос повторяется на основной базе.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def start(self, request):
+        use_replica = request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES
+        state = Routing(use_replica=use_replica and bool(settings.DATABASE_REPLICAS))
+        return state, routing.set(state)
+
+    def finish(self, request, state, response):
+        if (state.pinned or request.method not in SAFE_METHODS) and response.status_code < 400:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def retry_state(self, state):
+        retry = Routing()
+        retry.pinned = state.pinned
+        return retry
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state, token = self.start(request)
+        try:
+            response = self.get_response(request)
+            if state.failed:
+                state = self.retry_state(state)
+                routing.set(state)
+                response = self.get_response(request)
+        finally:
+            routing.reset(token)
+        return self.finish(request, state, response)
+
+    async def __acall__(self, request):
+        state, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+            if state.failed:
+                state = self.retry_state(state)
+                routing.set(state)
+                response = await self.get_response(request)
+        finally:
+            routing.reset(token)
+        return self.finish(request, state, response)
+
+    def process_exception(self, request, exception):
+        state = routing.get()
+        if state is None or state.replica in (None, DEFAULT_DB_ALIAS):
+            return None
+        if isinstance(exception, DatabaseError) and not state.failed:
+            logger.warning('Запрос на реплике %s упал, повторяем на основной базе', state.replica)
+            health.mark_down(state.replica)
+            state.failed = True
+        return None
@@ -0,0 +1,27 @@
+from contextlib import contextmanager
+from django.db import IntegrityError, router, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from .models import Bookings, BOOKING_OVERLAP_CONSTRAINT, ROOM_NIGHT_CONSTRAINT
+
+
+class BookingConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Комната уже забронирована на эти даты.'
+    default_code = 'booking_conflict'
+
+
+def violated_constraint(exc):
+    diag = getattr(exc.__cause__, 'diag', None)
+    return getattr(diag, 'constraint_name', None)
+
+
+@contextmanager
+def booking_conflict():
+    try:
+        with transaction.atomic(using=router.db_for_write(Bookings)):
+            yield
+    except IntegrityError as exc:
+        if violated_constraint(exc) in (BOOKING_OVERLAP_CONSTRAINT, ROOM_NIGHT_CONSTRAINT):
+            raise BookingConflict() from exc
+        raise
@@ -0,0 +1,37 @@
+from rest_framework.exceptions import ValidationError
+from .sharding import joinable
+
+
+class ExpandMixin:
+    expand_query_param = 'expand'
+
+    def get_expand(self):
+        if not hasattr(self, '_expand'):
+            raw = self.request.query_params.get(self.expand_query_param, '') if self.request else ''
+            paths = {path.strip() for path in raw.split(',') if path.strip()}
+            allowed = set(self.get_serializer_class().expandable_paths())
+            unknown = sorted(paths - allowed)
+            if unknown:
+                raise ValidationError({self.expand_query_param: f'Недопустимое значение: {", ".join(unknown)}'})
+            for path in list(paths):
+                parts = path.split('.')
+                paths.update('.'.join(parts[:i]) for i in range(1, len(parts)))
+            self._expand = sorted(paths)
+        return self._expand
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        expand = self.get_expand()
+        if expand:
+            paths = [path.replace('.', '__') for path in expand]
+            # Гостей с шарда не присоединить JOIN-ом: они подгружаются отдельным запросом из общей базы
+            separate = [path for path in paths if not joinable(queryset.model, path)]
+            queryset = queryset.select_related(*[path for path in paths if path not in separate])
+            if separate:
+                queryset = queryset.prefetch_related(*separate)
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import action
+from rest_framework.renderers import BaseRenderer
+from .converter import row_converter
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (json.dumps(data, ensure_ascii=False) + '\n').encode(self.charset)
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if isinstance(data, dict):
+            writer.writerows(data.items())
+        else:
+            writer.writerow([data])
+        return buffer.getvalue().encode(self.charset)
+
+
+class ExportMixin:
+    export_chunk_size = 2000
+
+    @action(methods=['get'], detail=False, renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        fields = queryset.model._meta.concrete_fields
+        names = [field.name for field in fields]
+        rows = queryset.values_list(*[field.attname for field in fields]).iterator(
+            chunk_size=self.export_chunk_size
+        )
+        renderer = request.accepted_renderer
+        if renderer.format == 'csv':
+            content = self.stream_csv(names, rows, row_converter(fields))
+        else:
+            content = self.stream_ndjson(names, rows, row_converter(fields))
+        response = StreamingHttpResponse(content, content_type=f'{renderer.media_type}; charset=utf-8')
+        filename = f'{queryset.model._meta.model_name}.{renderer.format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def stream_csv(self, names, rows, convert):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        for count, row in enumerate(rows, 1):
+            writer.writerow(convert(row))
+            if count % self.export_chunk_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def stream_ndjson(self, names, rows, convert):
+        lines = []
+        for row in rows:
+            lines.append(json.dumps(dict(zip(names, convert(row))), ensure_ascii=False))
+            if len(lines) == self.export_chunk_size:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
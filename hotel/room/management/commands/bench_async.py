@@ -0,0 +1,68 @@
+import asyncio
+import statistics
+import time
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+from room.models import Room_types
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает sync и async версии read-эндпоинтов под конкурентной нагрузкой'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=500)
+
+    def handle(self, *args, **options):
+        room_type = Room_types.objects.order_by('id').first()
+        if room_type is None:
+            raise CommandError('В базе нет типов комнат, сначала загрузите данные')
+        hotel = {'pk': room_type.hotel_id}
+        check_in = date.today() + timedelta(days=30)
+        search = {'check_in': check_in.isoformat(), 'check_out': (check_in + timedelta(days=3)).isoformat()}
+        endpoints = [
+            ('hotels', reverse('hotel-list'), reverse('async-hotel-list'), {}),
+            ('hotel', reverse('hotel-detail', kwargs=hotel), reverse('async-hotel-detail', kwargs=hotel), {}),
+            ('room_types', reverse('hotel-room-types', kwargs=hotel),
+             reverse('async-hotel-room-types', kwargs=hotel), {}),
+            ('rooms', reverse('room_types-rooms', kwargs={'pk': room_type.id}),
+             reverse('async-room-types-rooms', kwargs={'pk': room_type.id}), {}),
+            ('search', reverse('rooms-search'), reverse('async-rooms-search'), search),
+        ]
+
+        self.stdout.write(
+            f'{options["requests"]} запросов, {options["concurrency"]} одновременно\n'
+            f'{"эндпоинт":<12}{"режим":<7}{"req/s":>10}{"p50, мс":>10}{"p95, мс":>10}'
+        )
+        for name, sync_url, async_url, params in endpoints:
+            rates = {}
+            for mode, url in (('sync', sync_url), ('async', async_url)):
+                with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                    rate, p50, p95 = asyncio.run(self.measure(url, params, options))
+                rates[mode] = rate
+                self.stdout.write(f'{name:<12}{mode:<7}{rate:>10.0f}{p50:>10.1f}{p95:>10.1f}')
+            self.stdout.write(self.style.SUCCESS(f'{name:<12}async/sync: {rates["async"] / rates["sync"]:.2f}x'))
+
+    async def measure(self, url, params, options):
+        client = AsyncClient()
+        warmup = await client.get(url, params)
+        if warmup.status_code != 200:
+            raise CommandError(f'{url} ответил {warmup.status_code}')
+
+        latencies = []
+        pending = iter(range(options['requests']))
+
+        async def worker():
+            for _ in pending:
+                started = time.perf_counter()
+                await client.get(url, params)
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(options['concurrency'])))
+        elapsed = time.perf_counter() - started
+        percentiles = statistics.quantiles(latencies, n=20)
+        return len(latencies) / elapsed, statistics.median(latencies), percentiles[18]
@@ -0,0 +1,293 @@
+import csv
+import io
+import math
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, time as day_time, timedelta, timezone
+from decimal import Decimal
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from room.cache import GLOBAL_TAG, invalidate
+from room.models import Bookings, Guests, Hotel_shards, Hotels, Room_types, Rooms, CANCELLED_STATUS
+from .import_inventory import copy_into
+
+
+CENT = Decimal('0.01')
+CITIES = [
+    ('Russia', 'Moscow'), ('Russia', 'Saint Petersburg'), ('Russia', 'Kazan'), ('Russia', 'Sochi'),
+    ('USA', 'New York'), ('USA', 'Chicago'), ('USA', 'Los Angeles'), ('France', 'Paris'), ('France', 'Nice'),
+    ('Italy', 'Rome'), ('Italy', 'Milan'), ('Spain', 'Barcelona'), ('Germany', 'Berlin'), ('Turkey', 'Istanbul'),
+    ('UAE', 'Dubai'), ('Japan', 'Tokyo'), ('Thailand', 'Bangkok'), ('Georgia', 'Tbilisi'),
+]
+NAME_PARTS = (
+    ['Grand', 'Royal', 'Park', 'City', 'Central', 'Golden', 'Riverside', 'Sea View', 'Old Town', 'Garden'],
+    ['Hotel', 'Plaza', 'Inn', 'Resort', 'Suites', 'Palace', 'Residence', 'Lodge'],
+)
+STREETS = ['Main Street', 'Park Avenue', 'Lenina', 'Tverskaya', 'Market Square', 'Harbour Road', 'Station Road']
+STAR_WEIGHTS = [2, 8, 35, 35, 18, 1, 1]
+# (название, вместимость, цена за ночь для 3 звезд, доля комнат)
+ROOM_TYPES = [
+    ('Standard', 2, 80, 45), ('Superior', 2, 110, 25), ('Deluxe', 3, 160, 15),
+    ('Family', 4, 190, 10), ('Suite', 4, 320, 5),
+]
+FIRST_NAMES = ['Ivan', 'Anna', 'John', 'Maria', 'Alexey', 'Elena', 'David', 'Olga', 'Michael', 'Sofia',
+               'Dmitry', 'Laura', 'Sergey', 'Emma', 'Pavel', 'Julia']
+LAST_NAMES = ['Ivanov', 'Smith', 'Petrova', 'Garcia', 'Sokolov', 'Muller', 'Kuznetsova', 'Rossi',
+              'Popov', 'Dubois', 'Volkova', 'Tanaka', 'Novikov', 'Brown']
+
+
+def stay_nights(rng):
+    """Лог-нормальное число ночей: медиана около 2-3, редкие длинные проживания до 28."""
+    return min(max(1, round(rng.lognormvariate(0.9, 0.6))), 28)
+
+
+def lead_days(rng):
+    """Сколько дней до заезда оформлено бронирование: медиана около 3 недель."""
+    return min(int(rng.lognormvariate(3.0, 1.0)), 365)
+
+
+def booking_status(rng, check_out, today):
+    if rng.random() < 0.08:
+        return CANCELLED_STATUS
+    if check_out <= today:
+        return 'completed'
+    return 'pending' if rng.random() < 0.15 else 'confirmed'
+
+
+def phone(rng):
+    return f'+7916{rng.randrange(10 ** 7):07d}'
+
+
+def reserve_ids(cursor, model, count):
+    """Резервирует блок id из последовательности таблицы: воркеры пишут id явно."""
+    if not count:
+        return 0
+    table = model._meta.db_table
+    cursor.execute(
+        "SELECT setval(pg_get_serial_sequence(%s, 'id'), nextval(pg_get_serial_sequence(%s, 'id')) + %s - 1)",
+        [table, table, count],
+    )
+    return cursor.fetchone()[0] - count + 1
+
+
+def copy_rows(cursor, model, columns, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    copy_into(cursor, f'COPY {model._meta.db_table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+    return len(rows)
+
+
+def generate_guests(task):
+    rng = random.Random(f'{task["seed"]}:guests:{task["chunk"]}')
+    now = datetime.combine(task['today'], day_time(), timezone.utc)
+    rows = []
+    for number in range(task['first'], task['first'] + task['count']):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        rows.append((
+            task['guest_ids'] + number, first, last, f'{first}.{last}{number}@example.com'.lower(),
+            phone(rng), f'{rng.choice("ABCEHKMOPTX")}{rng.choice("ABCEHKMOPTX")}{rng.randrange(10 ** 7):07d}',
+            (now - timedelta(days=rng.randrange(3 * 365), seconds=rng.randrange(86400))).isoformat(),
+        ))
+    connection = connections[DEFAULT_DB_ALIAS]
+    with transaction.atomic(using=DEFAULT_DB_ALIAS), connection.cursor() as cursor:
+        copy_rows(cursor, Guests, [
+            'id', 'first_name', 'last_name', 'email', 'phone', 'passport', 'registration_date',
+        ], rows)
+    return 'guests', len(rows)
+
+
+def generate_hotels(task):
+    """Отели чанка c типами комнат, комнатами и бронированиями в одной транзакции."""
+    rng = random.Random(f'{task["seed"]}:hotels:{task["chunk"]}')
+    today, per_hotel, types_per_hotel = task['today'], task['rooms_per_hotel'], len(ROOM_TYPES)
+    now = datetime.combine(today, day_time(), timezone.utc)
+    hotels, room_types, rooms, prices = [], [], [], {}
+    for number in range(task['first'], task['first'] + task['count']):
+        hotel_id = task['hotel_ids'] + number
+        country, city = rng.choice(CITIES)
+        stars = rng.choices(range(1, 8), STAR_WEIGHTS)[0]
+        hotels.append((
+            hotel_id, f'{rng.choice(NAME_PARTS[0])} {rng.choice(NAME_PARTS[1])} {city}',
+            f'{rng.randrange(1, 200)} {rng.choice(STREETS)}', city, country, phone(rng), stars,
+            (now - timedelta(days=rng.randrange(1000))).isoformat(),
+        ))
+        for offset, (name, guests, price, _) in enumerate(ROOM_TYPES):
+            type_id = task['type_ids'] + number * types_per_hotel + offset
+            prices[type_id] = Decimal(price * (0.6 + 0.15 * stars) * rng.uniform(0.85, 1.15)).quantize(CENT)
+            room_types.append((type_id, hotel_id, name, f'{name} room, up to {guests} guests', prices[type_id], guests))
+        floors = max(1, math.ceil(per_hotel / 30))
+        for index in range(per_hotel):
+            type_id = task['type_ids'] + number * types_per_hotel + rng.choices(
+                range(types_per_hotel), [share for *_, share in ROOM_TYPES]
+            )[0]
+            floor = index % floors + 1
+            rooms.append((
+                task['room_ids'] + number * per_hotel + index, hotel_id, type_id,
+                f'{floor}{index // floors + 1:02d}', floor, rng.random() > 0.02,
+            ))
+
+    booked = 0
+    connection = connections[task['database']]
+    with transaction.atomic(using=task['database']), connection.cursor() as cursor:
+        copy_rows(cursor, Hotels, ['id', 'name', 'address', 'city', 'country', 'phone', 'star_rating', 'created_at'],
+                  hotels)
+        copy_rows(cursor, Room_types, ['id', 'hotel_id', 'name', 'description', 'base_price', 'max_guests'],
+                  room_types)
+        copy_rows(cursor, Rooms, ['id', 'hotel_id', 'type_id', 'room_number', 'floor', 'is_available'], rooms)
+        bookings = []
+        for room_id, _, type_id, *_ in rooms:
+            bookings.extend(room_bookings(rng, task, room_id, prices[type_id], now))
+            if len(bookings) >= task['batch_size']:
+                booked += flush_bookings(cursor, bookings)
+        booked += flush_bookings(cursor, bookings)
+    return 'hotels', len(hotels), len(rooms), booked
+
+
+def room_bookings(rng, task, room_id, base_price, now):
+    """Проживания комнаты идут друг за другом c промежутками, поэтому не пересекаются."""
+    today = task['today']
+    count = task['bookings_per_room'] + (room_id - task['room_ids'] < task['extra_bookings'])
+    window = task['history_days'] + task['future_days']
+    mean_gap = max(window / count - 3.0, 0.1) if count else 0
+    check_in = today - timedelta(days=task['history_days'])
+    for _ in range(count):
+        check_in += timedelta(days=int(rng.expovariate(1 / mean_gap)))
+        nights = stay_nights(rng)
+        check_out = check_in + timedelta(days=nights)
+        created = min(datetime.combine(check_in, day_time(), timezone.utc) - timedelta(days=lead_days(rng)), now)
+        price = (base_price * nights * Decimal(rng.uniform(0.85, 1.15))).quantize(CENT)
+        yield (
+            task['guest_ids'] + rng.randrange(task['guests']), room_id, check_in.isoformat(), check_out.isoformat(),
+            price, booking_status(rng, check_out, today), (created - timedelta(seconds=rng.randrange(86400))).isoformat(),
+        )
+        check_in = check_out
+
+
+def flush_bookings(cursor, bookings):
+    count = copy_rows(cursor, Bookings, [
+        'guest_id', 'room_id', 'check_in_date', 'check_out_date', 'total_price', 'status', 'created_at',
+    ], bookings)
+    bookings.clear()
+    return count
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует воспроизводимый набор данных для нагрузочных тестов, например '
+        '--hotels 5000 --rooms-per-hotel 300 --bookings 20000000'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hotels', type=int, default=100)
+        parser.add_argument('--rooms-per-hotel', type=int, default=50)
+        parser.add_argument('--bookings', type=int, default=10000)
+        parser.add_argument('--guests', type=int, help='По умолчанию четверть от числа бронирований')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--today', type=date.fromisoformat,
+                            help='Дата, относительно которой строятся прошлые и будущие проживания')
+        parser.add_argument('--history-days', type=int, default=365)
+        parser.add_argument('--future-days', type=int, default=180)
+        parser.add_argument('--workers', type=int, default=min(multiprocessing.cpu_count(), 8))
+        parser.add_argument('--hotels-per-task', type=int, default=50)
+        parser.add_argument('--batch-size', type=int, default=50000)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='База для отелей и их данных; гости всегда пишутся в default')
+
+    def handle(self, *args, **options):
+        hotels, per_hotel, total_bookings = options['hotels'], options['rooms_per_hotel'], options['bookings']
+        database = options['database']
+        if min(hotels, per_hotel, total_bookings, options['guests'] or 0) < 0:
+            raise CommandError('Количества не могут быть отрицательными')
+        if min(options['workers'], options['hotels_per_task'], options['batch_size']) < 1:
+            raise CommandError('--workers, --hotels-per-task и --batch-size должны быть не меньше 1')
+        if database not in connections:
+            raise CommandError(f'Неизвестная база {database}')
+        total_rooms = hotels * per_hotel
+        if total_bookings and not total_rooms:
+            raise CommandError('Бронированиям нужны комнаты: задайте --hotels и --rooms-per-hotel')
+        guests = options['guests'] if options['guests'] is not None else total_bookings // 4
+        guests = max(guests, 1 if total_bookings else 0)
+
+        with connections[database].cursor() as cursor:
+            ids = {
+                'hotel_ids': reserve_ids(cursor, Hotels, hotels),
+                'type_ids': reserve_ids(cursor, Room_types, hotels * len(ROOM_TYPES)),
+                'room_ids': reserve_ids(cursor, Rooms, total_rooms),
+            }
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            ids['guest_ids'] = reserve_ids(cursor, Guests, guests)
+
+        common = {
+            **ids, 'seed': options['seed'], 'today': options['today'] or date.today(), 'guests': guests,
+            'database': database,
+        }
+        # Бронирования ссылаются на гостей, поэтому задачи отелей стартуют только
+        # после того, как все гости записаны.
+        guest_tasks, hotel_tasks = [], []
+        guest_chunk = options['batch_size']
+        for chunk, first in enumerate(range(0, guests, guest_chunk)):
+            guest_tasks.append((generate_guests, {
+                **common, 'chunk': chunk, 'first': first, 'count': min(guest_chunk, guests - first),
+            }))
+        step = options['hotels_per_task']
+        for chunk, first in enumerate(range(0, hotels, step)):
+            hotel_tasks.append((generate_hotels, {
+                **common, 'chunk': chunk, 'first': first, 'count': min(step, hotels - first),
+                'rooms_per_hotel': per_hotel, 'history_days': options['history_days'],
+                'future_days': options['future_days'], 'batch_size': options['batch_size'],
+                'bookings_per_room': total_bookings // total_rooms if total_rooms else 0,
+                'extra_bookings': total_bookings % total_rooms if total_rooms else 0,
+            }))
+
+        started = time.monotonic()
+        totals = {'guests': 0, 'hotels': 0, 'rooms': 0, 'bookings': 0}
+        for result in self.run([guest_tasks, hotel_tasks], options['workers']):
+            if result[0] == 'guests':
+                totals['guests'] += result[1]
+            else:
+                for name, count in zip(('hotels', 'rooms', 'bookings'), result[1:]):
+                    totals[name] += count
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'Отелей {totals["hotels"]}/{hotels}, гостей {totals["guests"]}/{guests}, '
+                f'бронирований {totals["bookings"]}: {elapsed:.1f} с'
+            )
+
+        if database in settings.DATABASE_SHARDS:
+            Hotel_shards.objects.bulk_create(
+                [Hotel_shards(hotel_id=ids['hotel_ids'] + number, shard=database) for number in range(hotels)],
+                batch_size=options['batch_size'],
+            )
+        for alias, models in ((database, [Hotels, Room_types, Rooms, Bookings]), (DEFAULT_DB_ALIAS, [Guests])):
+            with connections[alias].cursor() as cursor:
+                for model in models:
+                    cursor.execute(f'ANALYZE {model._meta.db_table}')
+        invalidate(GLOBAL_TAG)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {totals["hotels"]} отелей, {totals["rooms"]} комнат, {totals["guests"]} гостей, '
+            f'{totals["bookings"]} бронирований за {elapsed:.1f} с '
+            f'({(totals["bookings"] + totals["rooms"] + totals["guests"]) / max(elapsed, 1e-9):.0f} строк/с)'
+        ))
+
+    def run(self, phases, workers):
+        """
+        Задачи выполняются параллельно в процессах; у каждого свое соединение с
+        базой. Фазы идут по очереди: следующая начинается, когда закончены все
+        задачи предыдущей.
+        """
+        if workers == 1:
+            for tasks in phases:
+                for function, task in tasks:
+                    yield function(task)
+            return
+        connections.close_all()
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            for tasks in phases:
+                futures = [pool.submit(function, task) for function, task in tasks]
+                for future in as_completed(futures):
+                    yield future.result()
@@ -0,0 +1,284 @@
+import csv
+import io
+import json
+import time
+from itertools import chain, islice
+from pathlib import Path
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import DataError, IntegrityError, connection, models, transaction
+from room.cache import GLOBAL_TAG, invalidate
+from room.models import Hotels, Room_types, Rooms, Guests, Bookings, Import_progress, CANCELLED_STATUS
+
+
+MODELS = {
+    'hotels': Hotels,
+    'room_types': Room_types,
+    'rooms': Rooms,
+    'guests': Guests,
+    'bookings': Bookings,
+}
+
+STAGING_TABLE = 'import_staging'
+
+OVERLAP = 'daterange({0}.check_in_date, {0}.check_out_date) && daterange(s.check_in_date, s.check_out_date)'
+
+EXTRA_RULES = {
+    'bookings': [
+        ('check_out_date: дата выезда должна быть позже даты заезда', 's.check_out_date > s.check_in_date', []),
+        (
+            'room: комната уже забронирована на эти даты',
+            f"s.status = %s OR NOT EXISTS (SELECT 1 FROM {Bookings._meta.db_table} b WHERE b.room_id = s.room_id "
+            f"AND b.status <> %s AND {OVERLAP.format('b')})",
+            [CANCELLED_STATUS, CANCELLED_STATUS],
+        ),
+        (
+            'room: пересечение с другой строкой файла',
+            f"s.status = %s OR NOT EXISTS (SELECT 1 FROM {STAGING_TABLE} o WHERE o._line < s._line "
+            f"AND o.room_id = s.room_id AND o.status <> %s AND {OVERLAP.format('o')})",
+            [CANCELLED_STATUS, CANCELLED_STATUS],
+        ),
+    ],
+}
+
+
+def has_default(field):
+    return field.has_default() or getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+
+
+def staging_type(field):
+    if isinstance(field, models.CharField):
+        return 'text'
+    return field.db_type(connection)
+
+
+def field_rules(field):
+    qn = connection.ops.quote_name
+    column = f's.{qn(field.column)}'
+    rules = []
+    if isinstance(field, models.CharField) and field.max_length:
+        rules.append((
+            f'{field.name}: длина больше {field.max_length}',
+            f'char_length({column}) <= %s', [field.max_length],
+        ))
+    if isinstance(field, models.EmailField):
+        rules.append((f'{field.name}: некорректный email', f"{column} ~ '^[^@\\s]+@[^@\\s]+\\.[^@\\s]+$'", []))
+    for validator in field.validators:
+        if isinstance(validator, MinValueValidator):
+            rules.append((f'{field.name}: меньше {validator.limit_value}', f'{column} >= %s', [validator.limit_value]))
+        elif isinstance(validator, MaxValueValidator):
+            rules.append((f'{field.name}: больше {validator.limit_value}', f'{column} <= %s', [validator.limit_value]))
+    if field.is_relation:
+        target = field.target_field
+        rules.append((
+            f'{field.name}: связанный объект не существует',
+            f'EXISTS (SELECT 1 FROM {qn(target.model._meta.db_table)} r WHERE r.{qn(target.column)} = {column})',
+            [],
+        ))
+    rules = [(reason, f'{column} IS NULL OR {sql}', params) for reason, sql, params in rules]
+    if not field.null and not has_default(field):
+        rules.insert(0, (f'{field.name}: обязательное поле', f'{column} IS NOT NULL', []))
+    return rules
+
+
+def constraint_reason(exc):
+    diag = getattr(exc.__cause__, 'diag', None)
+    name = getattr(diag, 'constraint_name', None)
+    if name:
+        return f'нарушено ограничение {name}'
+    return str(exc).splitlines()[0]
+
+
+def copy_into(cursor, sql, buffer):
+    if hasattr(cursor, 'copy_expert'):
+        cursor.copy_expert(sql, buffer)
+    else:
+        with cursor.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+class Command(BaseCommand):
+    help = 'Загружает CSV/NDJSON файл в таблицу через COPY в staging-таблицу'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(MODELS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'])
+        parser.add_argument('--batch-size', type=int, default=50000)
+        parser.add_argument('--resume', action='store_true')
+        parser.add_argument('--rejects', help='CSV файл для отклоненных строк')
+
+    def handle(self, *args, **options):
+        model = MODELS[options['model']]
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден')
+        fmt = options['format'] or ('csv' if path.suffix == '.csv' else 'ndjson')
+        batch_size = options['batch_size']
+        progress_key = f'{options["model"]}:{path.resolve()}'
+        start = 0
+        if options['resume']:
+            progress = Import_progress.objects.filter(source=progress_key).first()
+            start = progress.rows if progress else 0
+
+        with path.open(encoding='utf-8', newline='') as source:
+            columns, rows = self.read(model, source, fmt)
+            self.check_columns(model, columns)
+            rules = [rule for field in columns if not field.primary_key for rule in field_rules(field)]
+            rules += EXTRA_RULES.get(options['model'], [])
+            insert_sql = self.insert_sql(model, columns)
+
+            rejects_file = open(options['rejects'], 'a', newline='', encoding='utf-8') if options['rejects'] else None
+            rejects = csv.writer(rejects_file) if rejects_file else None
+            rows = enumerate(rows, 1)
+            for _ in islice(rows, start):
+                pass
+            processed, imported, rejected = start, 0, 0
+            started = time.monotonic()
+            try:
+                while True:
+                    batch = list(islice(rows, batch_size))
+                    if not batch:
+                        break
+                    batch_started = time.monotonic()
+                    try:
+                        batch_imported, batch_rejected = self.load_batch(
+                            columns, batch, rules, insert_sql, (progress_key, processed + len(batch)),
+                        )
+                    except IntegrityError:
+                        batch_imported, batch_rejected = self.load_rows(columns, batch, rules, insert_sql,
+                                                                        progress_key, processed)
+                    except DataError as exc:
+                        raise CommandError(f'Строки {batch[0][0]}-{batch[-1][0]}: {exc}') from exc
+                    processed += len(batch)
+                    imported += batch_imported
+                    rejected += len(batch_rejected)
+                    if rejects:
+                        rejects.writerows(batch_rejected)
+                    elapsed = time.monotonic() - batch_started
+                    self.stdout.write(
+                        f'Строки {processed - len(batch) + 1}-{processed}: загружено {batch_imported}, '
+                        f'отклонено {len(batch_rejected)}, {len(batch) / max(elapsed, 1e-9):.0f} строк/с'
+                    )
+            finally:
+                if rejects_file:
+                    rejects_file.close()
+
+        if any(field.primary_key for field in columns):
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+                    cursor.execute(sql)
+        invalidate(GLOBAL_TAG)
+        Import_progress.objects.filter(source=progress_key).delete()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: загружено {imported}, отклонено {rejected} за {elapsed:.2f} с '
+            f'({(processed - start) / max(elapsed, 1e-9):.0f} строк/с)'
+        ))
+
+    def read(self, model, source, fmt):
+        if fmt == 'csv':
+            reader = csv.reader(source)
+            header = next(reader, [])
+            return self.resolve(model, header), reader
+        lines = (line for line in source if line.strip())
+        first = next(lines, None)
+        if first is None:
+            return [], iter(())
+        header = list(json.loads(first))
+        rows = (json.loads(line) for line in chain([first], lines))
+        return self.resolve(model, header), ([data.get(name) for name in header] for data in rows)
+
+    def resolve(self, model, header):
+        columns = []
+        for name in header:
+            try:
+                field = model._meta.get_field(name.removesuffix('_id') if name != 'id' else name)
+            except FieldDoesNotExist:
+                raise CommandError(f'Неизвестная колонка {name} для {model.__name__}')
+            columns.append(field)
+        return columns
+
+    def check_columns(self, model, columns):
+        missing = [
+            field.name for field in model._meta.concrete_fields
+            if not field.primary_key and not has_default(field) and field not in columns
+        ]
+        if missing:
+            raise CommandError(f'В файле нет обязательных колонок: {", ".join(missing)}')
+
+    def insert_sql(self, model, columns):
+        qn = connection.ops.quote_name
+        targets, values, params = [], [], []
+        for field in model._meta.concrete_fields:
+            auto = getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+            if field in columns:
+                value = f's.{qn(field.column)}'
+                if auto:
+                    value = f'COALESCE({value}, now())'
+                elif field.has_default():
+                    value = f'COALESCE({value}, %s)'
+                    params.append(field.get_default())
+            elif field.primary_key:
+                continue
+            elif auto:
+                value = 'now()'
+            else:
+                value = '%s'
+                params.append(field.get_default())
+            targets.append(qn(field.column))
+            values.append(value)
+        sql = (
+            f'INSERT INTO {qn(model._meta.db_table)} ({", ".join(targets)}) '
+            f'SELECT {", ".join(values)} FROM {STAGING_TABLE} s ORDER BY s._line'
+        )
+        return sql, params
+
+    def load_rows(self, columns, batch, rules, insert_sql, source, processed):
+        """
+        Партия нарушила ограничение базы, которого нет в rules (уникальность id,
+        строка, удаленная или занятая другой транзакцией после проверок): строки
+        загружаются по одной, нарушившие отклоняются с именем ограничения.
+        """
+        imported, rejected = 0, []
+        for offset, (line, row) in enumerate(batch, 1):
+            try:
+                row_imported, row_rejected = self.load_batch(
+                    columns, [(line, row)], rules, insert_sql, (source, processed + offset),
+                )
+            except IntegrityError as exc:
+                with transaction.atomic():
+                    self.save_progress(source, processed + offset)
+                row_imported, row_rejected = 0, [(line, constraint_reason(exc))]
+            imported += row_imported
+            rejected.extend(row_rejected)
+        return imported, rejected
+
+    def save_progress(self, source, rows):
+        Import_progress.objects.update_or_create(source=source, defaults={'rows': rows})
+
+    def load_batch(self, columns, batch, rules, insert_sql, progress):
+        """progress - (source, rows): отметка продолжения пишется в той же транзакции, что и партия."""
+        qn = connection.ops.quote_name
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for line, row in batch:
+            writer.writerow([line, *row])
+        buffer.seek(0)
+
+        definition = ', '.join(['_line bigint', *[f'{qn(f.column)} {staging_type(f)}' for f in columns]])
+        names = ', '.join(['_line', *[qn(f.column) for f in columns]])
+        rejected = []
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'CREATE TEMPORARY TABLE {STAGING_TABLE} ({definition})')
+            copy_into(cursor, f'COPY {STAGING_TABLE} ({names}) FROM STDIN WITH (FORMAT csv)', buffer)
+            for reason, sql, params in rules:
+                cursor.execute(f'DELETE FROM {STAGING_TABLE} s WHERE ({sql}) IS NOT TRUE RETURNING s._line', params)
+                rejected.extend((line, reason) for line, in cursor.fetchall())
+            cursor.execute(*insert_sql)
+            imported = cursor.rowcount
+            cursor.execute(f'DROP TABLE {STAGING_TABLE}')
+            self.save_progress(*progress)
+        return imported, sorted(rejected)
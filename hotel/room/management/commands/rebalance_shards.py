@@ -0,0 +1,111 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count
+from room.models import Bookings, Hotel_shards, Hotels, Rate_overrides, Room_types, Rooms, Stay_discounts
+
+
+# Порядок копирования по внешним ключам; Room_nights и Daily_stats на новом
+# шарде заполнят триггеры при вставке бронирований.
+COPY_ORDER = [
+    (Hotels, 'pk'),
+    (Room_types, 'hotel_id'),
+    (Rooms, 'hotel_id'),
+    (Rate_overrides, 'room_type__hotel_id'),
+    (Stay_discounts, 'room_type__hotel_id'),
+    (Bookings, 'room__hotel_id'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Переносит отели между шардами: указанные отели или до равного числа отелей на шардах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hotel', type=int, action='append', help='Перенести указанные отели')
+        parser.add_argument('--to', help='Шард назначения для --hotel')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Только показать план переноса')
+
+    def handle(self, *args, **options):
+        shards = settings.DATABASE_SHARDS
+        if not shards:
+            raise CommandError('Шарды не настроены: задайте DB_SHARDS')
+        if options['hotel']:
+            if options['to'] not in shards:
+                raise CommandError(f'--to должен быть одним из шардов: {", ".join(shards)}')
+            plan = [(hotel_id, self.source(hotel_id), options['to']) for hotel_id in options['hotel']]
+        else:
+            plan = self.balance_plan(shards)
+
+        for hotel_id, source, target in plan:
+            if source == target:
+                continue
+            self.stdout.write(f'Отель {hotel_id}: {source} -> {target}')
+            if not options['dry_run']:
+                started = time.monotonic()
+                copied = self.move(hotel_id, source, target, options['batch_size'])
+                self.stdout.write(f'  перенесено {copied} строк за {time.monotonic() - started:.2f} с')
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def source(self, hotel_id):
+        shard = Hotel_shards.objects.filter(hotel_id=hotel_id).values_list('shard', flat=True).first()
+        if shard is None and Hotels.objects.using(DEFAULT_DB_ALIAS).filter(pk=hotel_id).exists():
+            shard = DEFAULT_DB_ALIAS
+        if shard is None:
+            raise CommandError(f'Отель {hotel_id} не найден')
+        return shard
+
+    def balance_plan(self, shards):
+        """Отели из default (до включения шардов) раскладываются первыми, затем выравниваются шарды."""
+        located = dict(Hotel_shards.objects.filter(shard__in=shards).values_list('shard').annotate(
+            hotels=Count('pk')
+        ).order_by())
+        counts = {alias: located.get(alias, 0) for alias in shards}
+        plan = []
+        directory = set(Hotel_shards.objects.values_list('hotel_id', flat=True))
+        for hotel_id in Hotels.objects.using(DEFAULT_DB_ALIAS).order_by('pk').values_list('pk', flat=True):
+            if hotel_id not in directory:
+                target = min(shards, key=counts.get)
+                counts[target] += 1
+                plan.append((hotel_id, DEFAULT_DB_ALIAS, target))
+
+        taken = {hotel_id for hotel_id, _, _ in plan}
+        while True:
+            busiest, idlest = max(shards, key=counts.get), min(shards, key=counts.get)
+            if counts[busiest] - counts[idlest] <= 1:
+                return plan
+            hotel_id = Hotel_shards.objects.filter(shard=busiest).exclude(hotel_id__in=taken).order_by(
+                '-hotel_id'
+            ).values_list('hotel_id', flat=True).first()
+            taken.add(hotel_id)
+            plan.append((hotel_id, busiest, idlest))
+            counts[busiest] -= 1
+            counts[idlest] += 1
+
+    def move(self, hotel_id, source, target, batch_size):
+        """
+        Пока отель помечен moving, API отклоняет записи в него (503), чтения идут
+        на старый шард. Копия пишется одной транзакцией, затем каталог
+        переключается на новый шард и старые строки удаляются.
+        """
+        Hotel_shards.objects.update_or_create(hotel_id=hotel_id, defaults={'shard': source, 'moving': True})
+        try:
+            copied = 0
+            with transaction.atomic(using=target):
+                for model, path in COPY_ORDER:
+                    rows = list(model._base_manager.using(source).filter(**{path: hotel_id}).order_by('pk'))
+                    model._base_manager.using(target).bulk_create(rows, batch_size=batch_size)
+                    copied += len(rows)
+            Hotel_shards.objects.filter(hotel_id=hotel_id).update(shard=target)
+        except BaseException:
+            entry = Hotel_shards.objects.filter(hotel_id=hotel_id)
+            if source in settings.DATABASE_SHARDS:
+                entry.update(moving=False)
+            else:
+                entry.delete()
+            raise
+        with transaction.atomic(using=source):
+            Hotels.objects.using(source).filter(pk=hotel_id).delete()
+        Hotel_shards.objects.filter(hotel_id=hotel_id).update(moving=False)
+        return copied
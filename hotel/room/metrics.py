@@ -0,0 +1,51 @@
+"""
+Метрики Prometheus по эндпоинтам: число запросов, ошибки, время ответа, число
+и время SQL. Метка view - имя маршрута (hotel-list, hotel-room-types,
+bookings-detail, ...). При нескольких воркерах задайте PROMETHEUS_MULTIPROC_DIR
+до запуска сервера: значения пишутся в mmap-файлы каталога, и /metrics
+суммирует их по всем процессам.
+"""
+import os
+from django.http import HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+
+UNMATCHED = 'unmatched'
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, float('inf'))
+
+requests_total = Counter('http_requests_total', 'Запросы по эндпоинтам', ['view', 'method', 'status'])
+errors_total = Counter('http_request_errors_total', 'Ответы 5xx по эндпоинтам', ['view', 'method'])
+latency = Histogram('http_request_duration_seconds', 'Время ответа', ['view', 'method'])
+db_queries = Histogram('http_request_db_queries', 'SQL-запросов на HTTP-запрос', ['view', 'method'], buckets=QUERY_BUCKETS)
+db_time = Histogram('http_request_db_seconds', 'Время SQL на HTTP-запрос', ['view', 'method'])
+
+
+def view_name(request):
+    """Имя маршрута, а не путь: число меток не растет с числом объектов."""
+    match = request.resolver_match
+    if match is None or not match.url_name:
+        return UNMATCHED
+    return match.url_name
+
+
+def observe(request, response, current):
+    view, method = view_name(request), request.method
+    requests_total.labels(view, method, response.status_code).inc()
+    if response.status_code >= 500:
+        errors_total.labels(view, method).inc()
+    latency.labels(view, method).observe(current.total())
+    db_queries.labels(view, method).observe(current.queries)
+    db_time.labels(view, method).observe(current.db)
+
+
+def registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    collected = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collected)
+    return collected
+
+
+def metrics_view(request):
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
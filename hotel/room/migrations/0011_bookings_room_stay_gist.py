@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 09:12
+
+import room.models
+from django.contrib.postgres.indexes import GistIndex
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0010_bookings_check_out_date_bookings_created_at_and_more'),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.AddIndex(
+            model_name='bookings',
+            index=GistIndex(models.F('room'), room.models.DateRange('check_in_date', 'check_out_date'), condition=models.Q(('status', 'cancelled'), _negated=True), name='bookings_room_stay_gist'),
+        ),
+    ]
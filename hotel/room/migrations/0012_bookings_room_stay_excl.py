@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 11:40
+
+import django.contrib.postgres.constraints
+import room.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0011_bookings_room_stay_gist'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bookings',
+            name='bookings_room_stay_gist',
+        ),
+        migrations.AddConstraint(
+            model_name='bookings',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status', 'cancelled'), _negated=True), expressions=[('room', '='), (room.models.DateRange('check_in_date', 'check_out_date'), '&&')], name='bookings_room_stay_excl'),
+        ),
+    ]
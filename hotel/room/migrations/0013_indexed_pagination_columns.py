@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0012_bookings_room_stay_excl'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookings',
+            name='check_in_date',
+            field=models.DateField(db_index=True, verbose_name='arrival'),
+        ),
+        migrations.AlterField(
+            model_name='bookings',
+            name='created_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='guests',
+            name='registration_date',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='hotels',
+            name='created_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
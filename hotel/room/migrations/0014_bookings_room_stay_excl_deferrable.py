@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-18 13:20
+
+import django.contrib.postgres.constraints
+import django.db.models.constraints
+import room.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0013_indexed_pagination_columns'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='bookings',
+            name='bookings_room_stay_excl',
+        ),
+        migrations.AddConstraint(
+            model_name='bookings',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status', 'cancelled'), _negated=True), deferrable=django.db.models.constraints.Deferrable['IMMEDIATE'], expressions=[('room', '='), (room.models.DateRange('check_in_date', 'check_out_date'), '&&')], name='bookings_room_stay_excl'),
+        ),
+    ]
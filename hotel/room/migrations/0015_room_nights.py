@@ -0,0 +1,91 @@
+# Generated by Django 6.0 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Календарь ведется триггерами уровня statement: bulk_update, bulk_create и
+# INSERT ... SELECT из import_inventory обновляют его одним запросом, а
+# перенос дат между бронями в одном UPDATE не упирается в уникальность.
+SYNC_NIGHTS = """
+CREATE FUNCTION room_sync_room_nights() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM room_room_nights n USING old_rows o WHERE n.booking_id = o.id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO room_room_nights (room_id, hotel_id, booking_id, date)
+        SELECT b.room_id, r.hotel_id, b.id, d::date
+        FROM new_rows b
+        JOIN room_rooms r ON r.id = b.room_id
+        CROSS JOIN generate_series(b.check_in_date, b.check_out_date - 1, interval '1 day') d
+        WHERE b.status <> 'cancelled';
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER room_nights_on_insert AFTER INSERT ON room_bookings
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION room_sync_room_nights();
+CREATE TRIGGER room_nights_on_update AFTER UPDATE ON room_bookings
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION room_sync_room_nights();
+CREATE TRIGGER room_nights_on_delete AFTER DELETE ON room_bookings
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION room_sync_room_nights();
+
+CREATE FUNCTION room_move_room_nights() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE room_room_nights n SET hotel_id = r.hotel_id
+    FROM new_rows r JOIN old_rows o ON o.id = r.id
+    WHERE n.room_id = r.id AND r.hotel_id <> o.hotel_id;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER room_nights_on_room_update AFTER UPDATE ON room_rooms
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION room_move_room_nights();
+
+INSERT INTO room_room_nights (room_id, hotel_id, booking_id, date)
+SELECT b.room_id, r.hotel_id, b.id, d::date
+FROM room_bookings b
+JOIN room_rooms r ON r.id = b.room_id
+CROSS JOIN generate_series(b.check_in_date, b.check_out_date - 1, interval '1 day') d
+WHERE b.status <> 'cancelled';
+"""
+
+DROP_SYNC_NIGHTS = """
+DROP TRIGGER room_nights_on_room_update ON room_rooms;
+DROP FUNCTION room_move_room_nights();
+DROP TRIGGER room_nights_on_delete ON room_bookings;
+DROP TRIGGER room_nights_on_update ON room_bookings;
+DROP TRIGGER room_nights_on_insert ON room_bookings;
+DROP FUNCTION room_sync_room_nights();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0014_bookings_room_stay_excl_deferrable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Room_nights',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='room.bookings')),
+                ('hotel', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='room.hotels')),
+                ('room', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='room.rooms')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hotel', 'date'], include=('room',), name='room_nights_hotel_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('room', 'date'), name='room_nights_room_date_uniq')],
+            },
+        ),
+        migrations.RunSQL(SYNC_NIGHTS, DROP_SYNC_NIGHTS),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-18 14:40
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0015_room_nights'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Rate_overrides',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('weekdays', models.PositiveSmallIntegerField(default=127, help_text='Битовая маска дней недели: бит 0 - понедельник, бит 6 - воскресенье', validators=[django.core.validators.MaxValueValidator(127)])),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('room_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='room.room_types')),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(('end_date__gte', models.F('start_date'))), name='rate_overrides_dates_ordered')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Stay_discounts',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_nights', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(2)])),
+                ('percent', models.DecimalField(decimal_places=2, max_digits=5, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('room_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='room.room_types')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('room_type', 'min_nights'), name='stay_discounts_room_type_nights_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,147 @@
+# Generated by Django 6.0 on 2026-10-18 15:10
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def stays(source, sign):
+    return f"""
+        SELECT b.room_id, b.check_in_date, b.check_out_date, {sign} AS sign,
+               round(b.total_price / (b.check_out_date - b.check_in_date), 4) AS nightly
+        FROM {source} b
+        WHERE b.status <> 'cancelled' AND b.check_out_date > b.check_in_date"""
+
+
+def add_nights(rows):
+    """rows: hotel_id, type_id, check_in_date, check_out_date, sign, nightly."""
+    return f"""
+        INSERT INTO room_daily_stats AS s (hotel_id, room_type_id, date, rooms_sold, revenue)
+        SELECT c.hotel_id, c.type_id, d::date, sum(c.sign), sum(c.sign * c.nightly)
+        FROM ({rows}) c
+        CROSS JOIN generate_series(c.check_in_date, c.check_out_date - 1, interval '1 day') d
+        GROUP BY 1, 2, 3
+        ON CONFLICT (hotel_id, date, room_type_id) DO UPDATE
+        SET rooms_sold = s.rooms_sold + EXCLUDED.rooms_sold, revenue = s.revenue + EXCLUDED.revenue;"""
+
+
+def apply_deltas(*sources):
+    return add_nights(f"""
+        SELECT r.hotel_id, r.type_id, c.check_in_date, c.check_out_date, c.sign, c.nightly
+        FROM ({' UNION ALL '.join(sources)}) c
+        JOIN room_rooms r ON r.id = c.room_id""")
+
+
+# Строки, где rooms_sold дошел до нуля, удаляются, как их и не пишет
+# rebuild_daily_stats. Без этого каскадное удаление отеля оставляло строки с
+# отрицательным счетчиком на удаляемый отель, и внешний ключ падал на коммите.
+def prune(keys):
+    """keys: hotel_id, type_id, check_in_date, check_out_date затронутых ночей."""
+    return f"""
+        DELETE FROM room_daily_stats s
+        USING (SELECT hotel_id, type_id, min(check_in_date) AS first, max(check_out_date) AS last
+               FROM ({keys}) k GROUP BY 1, 2) k
+        WHERE s.hotel_id = k.hotel_id AND s.room_type_id = k.type_id
+          AND s.date >= k.first AND s.date < k.last AND s.rooms_sold <= 0;"""
+
+
+OLD_KEYS = """
+        SELECT r.hotel_id, r.type_id, b.check_in_date, b.check_out_date
+        FROM old_rows b JOIN room_rooms r ON r.id = b.room_id"""
+
+MOVED = """
+        SELECT o.id, o.hotel_id AS old_hotel_id, o.type_id AS old_type_id, r.hotel_id, r.type_id
+        FROM new_rows r JOIN old_rows o ON o.id = r.id
+        WHERE (r.hotel_id, r.type_id) IS DISTINCT FROM (o.hotel_id, o.type_id)"""
+
+
+def moved_nights(hotel, room_type, sign):
+    return f"""
+        SELECT m.{hotel} AS hotel_id, m.{room_type} AS type_id, b.check_in_date, b.check_out_date,
+               {sign} AS sign, round(b.total_price / (b.check_out_date - b.check_in_date), 4) AS nightly
+        FROM room_bookings b JOIN moved m ON m.id = b.room_id
+        WHERE b.status <> 'cancelled' AND b.check_out_date > b.check_in_date"""
+
+
+# Дельты по ночам вычитаются для старых версий броней и прибавляются для новых
+# одним INSERT ... ON CONFLICT на statement, как и календарь Room_nights.
+# Перенос комнаты в другой тип или отель переносит ее ночи так же, как
+# room_nights_on_room_update. Список столбцов (UPDATE OF type_id, hotel_id) с
+# таблицами переходов PostgreSQL не разрешает, поэтому остальные изменения
+# комнат отсекаются сравнением old_rows и new_rows.
+ROLLUP = f"""
+CREATE FUNCTION room_rollup_daily_stats() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {apply_deltas(stays('new_rows', 1))}
+    ELSIF TG_OP = 'UPDATE' THEN
+        {apply_deltas(stays('old_rows', -1), stays('new_rows', 1))}
+        {prune(OLD_KEYS)}
+    ELSE
+        {apply_deltas(stays('old_rows', -1))}
+        {prune(OLD_KEYS)}
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER daily_stats_on_insert AFTER INSERT ON room_bookings
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION room_rollup_daily_stats();
+CREATE TRIGGER daily_stats_on_update AFTER UPDATE ON room_bookings
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION room_rollup_daily_stats();
+CREATE TRIGGER daily_stats_on_delete AFTER DELETE ON room_bookings
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION room_rollup_daily_stats();
+
+CREATE FUNCTION room_move_daily_stats() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    WITH moved AS ({MOVED})
+    {add_nights(moved_nights('old_hotel_id', 'old_type_id', -1) + ' UNION ALL' + moved_nights('hotel_id', 'type_id', 1))}
+    WITH moved AS ({MOVED})
+    {prune(moved_nights('old_hotel_id', 'old_type_id', -1))}
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER daily_stats_on_room_update AFTER UPDATE ON room_rooms
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION room_move_daily_stats();
+
+{apply_deltas(stays('room_bookings', 1))}
+"""
+
+DROP_ROLLUP = """
+DROP TRIGGER daily_stats_on_room_update ON room_rooms;
+DROP FUNCTION room_move_daily_stats();
+DROP TRIGGER daily_stats_on_delete ON room_bookings;
+DROP TRIGGER daily_stats_on_update ON room_bookings;
+DROP TRIGGER daily_stats_on_insert ON room_bookings;
+DROP FUNCTION room_rollup_daily_stats();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0016_rate_overrides_stay_discounts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Daily_stats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('rooms_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=4, default=Decimal('0'), max_digits=14)),
+                ('hotel', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='room.hotels')),
+                ('room_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='room.room_types')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('hotel', 'date', 'room_type'), name='daily_stats_hotel_date_type_uniq')],
+            },
+        ),
+        migrations.RunSQL(ROLLUP, DROP_ROLLUP),
+    ]
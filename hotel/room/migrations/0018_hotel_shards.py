@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-18 16:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def drop_guest_constraint(apps, schema_editor):
+    """
+    Гости живут в общей базе, бронирования - на шарде отеля: на шарде таблица
+    гостей пустая, и внешний ключ guest_id снимается только там. Ссылку на
+    гостя проверяет сериализатор бронирования запросом к общей базе, удаление
+    гостя удаляет его бронирования на всех шардах (signals.delete_guest_bookings).
+    """
+    connection = schema_editor.connection
+    if connection.alias not in settings.DATABASE_SHARDS:
+        return
+    table = apps.get_model('room', 'Bookings')._meta.db_table
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    for name, constraint in constraints.items():
+        if constraint['foreign_key'] and constraint['columns'] == ['guest_id']:
+            schema_editor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {schema_editor.quote_name(name)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0017_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hotel_shards',
+            fields=[
+                ('hotel_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('shard', models.CharField(db_index=True, max_length=100)),
+                ('moving', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.RunPython(drop_guest_constraint, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 17:10
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0018_hotel_shards'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='guests',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['first_name'], name='guests_first_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='guests',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['last_name'], name='guests_last_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='guests',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['email'], name='guests_email_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='guests',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['passport'], name='guests_passport_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='hotels',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='hotels_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='hotels',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['city'], name='hotels_city_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
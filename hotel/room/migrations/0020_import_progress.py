@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0019_trigram_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Import_progress',
+            fields=[
+                ('source', models.CharField(max_length=1000, primary_key=True, serialize=False)),
+                ('rows', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
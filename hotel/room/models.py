@@ -2,9 +2,22 @@ from datetime import date
 from django.db import models
 from decimal import Decimal
 from django.core.validators import MaxValueValidator, MinValueValidator
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateRangeField, RangeOperators
+from django.contrib.postgres.indexes import GinIndex
 from django.forms import ValidationError
 from phonenumber_field.modelfields import PhoneNumberField
-    
+
+
+CANCELLED_STATUS = 'cancelled'
+BOOKING_OVERLAP_CONSTRAINT = 'bookings_room_stay_excl'
+ROOM_NIGHT_CONSTRAINT = 'room_nights_room_date_uniq'
+
+
+class DateRange(models.Func):
+    function = 'daterange'
+    output_field = DateRangeField()
+
     
 class Hotels(models.Model):
     name = models.CharField(max_length=255, db_index=True)
@@ -14,7 +27,14 @@ class Hotels(models.Model):
     phone = PhoneNumberField(verbose_name='phone')
     star_rating = models.IntegerField(db_index=True, validators=[MaxValueValidator(7), 
                                                                  MinValueValidator(1)])
-    created_at = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    class Meta:
+        indexes = [
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='hotels_name_trgm'),
+            GinIndex(fields=['city'], opclasses=['gin_trgm_ops'], name='hotels_city_trgm'),
+        ]
+    
     def __str__(self):
         return str(self.name)
 
@@ -53,17 +73,93 @@ class Guests(models.Model):
     email = models.EmailField(("email"), max_length=254)
     phone = PhoneNumberField(verbose_name='phone')
     passport = models.CharField(max_length=100)
-    registration_date = models.DateTimeField(auto_now=True)
+    registration_date = models.DateTimeField(auto_now=True, db_index=True)
     
+    class Meta:
+        indexes = [
+            GinIndex(fields=['first_name'], opclasses=['gin_trgm_ops'], name='guests_first_name_trgm'),
+            GinIndex(fields=['last_name'], opclasses=['gin_trgm_ops'], name='guests_last_name_trgm'),
+            GinIndex(fields=['email'], opclasses=['gin_trgm_ops'], name='guests_email_trgm'),
+            GinIndex(fields=['passport'], opclasses=['gin_trgm_ops'], name='guests_passport_trgm'),
+        ]
     
     def __str__(self):
         return self.first_name + ' ' + self.last_name
 
 
+class Hotel_shards(models.Model):
+    hotel_id = models.BigIntegerField(primary_key=True)
+    shard = models.CharField(max_length=100, db_index=True)
+    moving = models.BooleanField(default=False)
+    
+    def __str__(self):
+        return f"{self.hotel_id} -> {self.shard}"
+
+
+class Import_progress(models.Model):
+    """Сколько строк файла import_inventory уже зафиксировано; пишется в транзакции партии."""
+    source = models.CharField(max_length=1000, primary_key=True)
+    rows = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.source}: {self.rows}"
+
+
+class Rate_overrides(models.Model):
+    room_type = models.ForeignKey('Room_types', on_delete=models.CASCADE)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    weekdays = models.PositiveSmallIntegerField(
+        default=0b1111111,
+        validators=[MaxValueValidator(0b1111111)],
+        help_text='Битовая маска дней недели: бит 0 - понедельник, бит 6 - воскресенье',
+    )
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    class Meta:
+        constraints = [
+            models.CheckConstraint(condition=models.Q(end_date__gte=models.F('start_date')),
+                                   name='rate_overrides_dates_ordered'),
+        ]
+    
+    def __str__(self):
+        return f"{self.room_type} {self.start_date} - {self.end_date}: {self.price}"
+
+
+class Stay_discounts(models.Model):
+    room_type = models.ForeignKey('Room_types', on_delete=models.CASCADE)
+    min_nights = models.PositiveIntegerField(validators=[MinValueValidator(2)])
+    percent = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        validators=[MinValueValidator(0), MaxValueValidator(100)]
+    )
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room_type', 'min_nights'], name='stay_discounts_room_type_nights_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.room_type} {self.min_nights}+: -{self.percent}%"
+
+
+class BookingsQuerySet(models.QuerySet):
+    def active(self):
+        return self.exclude(status=CANCELLED_STATUS)
+
+    def overlapping(self, check_in, check_out):
+        return self.active().annotate(
+            stay=DateRange('check_in_date', 'check_out_date')
+        ).filter(stay__overlap=(check_in, check_out))
+
+
 class Bookings(models.Model):
+    # С шардами гости живут в общей базе, а бронирования - на шарде отеля: там
+    # миграция 0018 снимает ограничение внешнего ключа (drop_guest_constraint).
     guest = models.ForeignKey('Guests', on_delete=models.CASCADE)
     room = models.ForeignKey('Rooms', on_delete=models.CASCADE)
-    check_in_date = models.DateField(verbose_name='arrival')
+    check_in_date = models.DateField(verbose_name='arrival', db_index=True)
     check_out_date = models.DateField(verbose_name='departure')
     total_price = models.DecimalField(
         max_digits=10,
@@ -71,8 +167,22 @@ class Bookings(models.Model):
         default=Decimal('0.00')
     )
     status = models.CharField(max_length=100, db_index=True)
-    created_at = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    objects = BookingsQuerySet.as_manager()
     
+    class Meta:
+        constraints = [
+            ExclusionConstraint(
+                name=BOOKING_OVERLAP_CONSTRAINT,
+                expressions=[
+                    ('room', RangeOperators.EQUAL),
+                    (DateRange('check_in_date', 'check_out_date'), RangeOperators.OVERLAPS),
+                ],
+                condition=~models.Q(status=CANCELLED_STATUS),
+                deferrable=models.Deferrable.IMMEDIATE,
+            ),
+        ]
     
     def clean(self):
         if self.check_out_date <= self.check_in_date:
@@ -91,4 +201,37 @@ class Bookings(models.Model):
     
     def __str__(self):
         return f"Booking {self.guest}"
-    
\ No newline at end of file
+    
+
+class Room_nights(models.Model):
+    room = models.ForeignKey('Rooms', on_delete=models.CASCADE, db_index=False)
+    hotel = models.ForeignKey('Hotels', on_delete=models.CASCADE, db_index=False)
+    booking = models.ForeignKey('Bookings', on_delete=models.CASCADE)
+    date = models.DateField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'date'], name=ROOM_NIGHT_CONSTRAINT),
+        ]
+        indexes = [
+            models.Index(fields=['hotel', 'date'], include=['room'], name='room_nights_hotel_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.room_id} {self.date}"
+
+
+class Daily_stats(models.Model):
+    hotel = models.ForeignKey('Hotels', on_delete=models.CASCADE, db_index=False)
+    room_type = models.ForeignKey('Room_types', on_delete=models.CASCADE)
+    date = models.DateField()
+    rooms_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=4, default=Decimal('0'))
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hotel', 'date', 'room_type'], name='daily_stats_hotel_date_type_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.hotel_id} {self.room_type_id} {self.date}"
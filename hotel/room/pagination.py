@@ -0,0 +1,56 @@
+from django.db import connections
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def estimated_count(queryset):
+    """Оценка числа строк по плану PostgreSQL; на других СУБД - None."""
+    if hasattr(queryset, 'querysets'):
+        estimates = [estimated_count(shard) for shard in queryset.querysets]
+        return None if None in estimates else sum(estimates)
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def keyset_page(request, rows, limit):
+    """Страница из первых limit строк; rows читаются с запасом в одну строку, чтобы знать, есть ли следующая."""
+    next_url = None
+    if len(rows) > limit:
+        next_url = replace_query_param(request.build_absolute_uri(), 'after', rows[limit - 1]['id'])
+    return {'next': next_url, 'results': rows[:limit]}
+
+
+class KeysetPagination(CursorPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = 'id'
+    estimate_query_param = 'estimate'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.estimate = None
+        if request.query_params.get(self.estimate_query_param) in ('1', 'true'):
+            self.estimate = estimated_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        payload = {'next': self.get_next_link(), 'previous': self.get_previous_link()}
+        if self.estimate is not None:
+            payload['estimated_count'] = self.estimate
+        payload['results'] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['estimated_count'] = {
+            'type': 'integer',
+            'example': 1000,
+        }
+        return response_schema
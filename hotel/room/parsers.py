@@ -0,0 +1,16 @@
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+
+class ORJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        try:
+            content = stream.read()
+            if encoding.lower().replace('-', '') != 'utf8':
+                content = content.decode(encoding).encode()
+            return orjson.loads(content)
+        except (orjson.JSONDecodeError, UnicodeError, LookupError) as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
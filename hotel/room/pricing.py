@@ -0,0 +1,94 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import accumulate
+from .models import Rate_overrides, Room_types, Stay_discounts
+from .sharding import scatter
+
+
+CENT = Decimal('0.01')
+# Самая длинная строка цен за ночь на одну группу проживаний: два самых длинных проживания.
+MAX_SPAN = timedelta(days=2 * 366)
+
+
+class Pricer:
+    """Считает стоимость проживаний пачкой: по одной строке цен за ночь на тип комнаты."""
+
+    def __init__(self):
+        self.base_prices = {}
+        self.overrides = defaultdict(list)
+        self.discounts = defaultdict(list)
+
+    def load(self, type_ids):
+        missing = set(type_ids) - set(self.base_prices)
+        if not missing:
+            return
+        self.base_prices.update(scatter(Room_types.objects.filter(pk__in=missing)).values_list('id', 'base_price'))
+        for room_type, *override in scatter(Rate_overrides.objects.filter(room_type__in=missing)).order_by('pk').values_list(
+            'room_type', 'start_date', 'end_date', 'weekdays', 'price'
+        ):
+            self.overrides[room_type].append(override)
+        for room_type, min_nights, percent in scatter(Stay_discounts.objects.filter(room_type__in=missing)).order_by(
+            '-min_nights'
+        ).values_list('room_type', 'min_nights', 'percent'):
+            self.discounts[room_type].append((min_nights, percent))
+
+    def nightly(self, room_type, start, end):
+        prices = [self.base_prices[room_type]] * (end - start).days
+        first_weekday = start.weekday()
+        for override_start, override_end, weekdays, price in self.overrides[room_type]:
+            first = max((override_start - start).days, 0)
+            last = min((override_end - start).days + 1, len(prices))
+            for offset in range(first, last):
+                if weekdays >> (first_weekday + offset) % 7 & 1:
+                    prices[offset] = price
+        return prices
+
+    def spans(self, stays):
+        """
+        Группы близких проживаний одного типа: (тип, начало, конец, номера
+        проживаний). Группа не длиннее MAX_SPAN, поэтому строка цен за ночь
+        ограничена, как бы далеко друг от друга ни были даты в пачке.
+        """
+        positions = defaultdict(list)
+        for position, (room_type, check_in, _) in enumerate(stays):
+            if room_type in self.base_prices:
+                positions[room_type].append(position)
+        for room_type, members in positions.items():
+            members.sort(key=lambda position: stays[position][1])
+            _, start, end = stays[members[0]]
+            group = []
+            for position in members:
+                _, check_in, check_out = stays[position]
+                if group and max(end, check_out) - start > MAX_SPAN:
+                    yield room_type, start, end, group
+                    start, end, group = check_in, check_out, []
+                group.append(position)
+                end = max(end, check_out)
+            yield room_type, start, end, group
+
+    def quote(self, stays):
+        """Возвращает цену для каждого (room_type, check_in, check_out); None для неизвестного типа."""
+        stays = list(stays)
+        self.load(room_type for room_type, _, _ in stays)
+
+        sums = {}
+        for room_type, start, end, group in self.spans(stays):
+            prefix = [Decimal(0), *accumulate(self.nightly(room_type, start, end))]
+            for position in group:
+                sums[position] = (start, prefix)
+
+        prices = []
+        for position, (room_type, check_in, check_out) in enumerate(stays):
+            if position not in sums:
+                prices.append(None)
+                continue
+            start, prefix = sums[position]
+            nights = (check_out - check_in).days
+            total = prefix[(check_out - start).days] - prefix[(check_in - start).days]
+            percent = next((percent for min_nights, percent in self.discounts[room_type] if nights >= min_nights), 0)
+            prices.append((total * (100 - percent) / 100).quantize(CENT, rounding=ROUND_HALF_UP))
+        return prices
+
+def quote(stays):
+    return Pricer().quote(stays)
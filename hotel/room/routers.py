@@ -0,0 +1,9 @@
+from rest_framework import routers
+
+
+class BulkRouter(routers.DefaultRouter):
+    routes = [
+        route._replace(mapping={**route.mapping, 'patch': 'bulk_partial_update'})
+        if isinstance(route, routers.Route) and route.name == '{basename}-list' else route
+        for route in routers.DefaultRouter.routes
+    ]
@@ -0,0 +1,95 @@
+from functools import reduce
+from operator import add, and_, or_
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.functions import Greatest
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+
+
+class TrigramSearchFilter(OrderingFilter):
+    """
+    ?q= по полям view.trigram_fields через pg_trgm (индексы gin_trgm_ops):
+    каждое слово запроса должно быть похоже на начало или часть слова в одном
+    из полей. Результаты идут по убыванию похожести, без q - обычный ?ordering=.
+    Сортировку отдает и пагинации, поэтому курсор ведется по rank.
+    """
+
+    search_param = 'q'
+    min_term_length = 2
+    rank_ordering = ('-rank', 'id')
+
+    def get_terms(self, request):
+        raw = request.query_params.get(self.search_param, '')
+        if not raw.strip():
+            return []
+        terms = [term for term in raw.split() if len(term) >= self.min_term_length]
+        if not terms:
+            raise ValidationError({
+                self.search_param: f'Слова поиска должны быть не короче {self.min_term_length} символов.'
+            })
+        return terms
+
+    def get_ordering(self, request, queryset, view):
+        if self.get_terms(request):
+            return self.rank_ordering
+        return super().get_ordering(request, queryset, view)
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_terms(request)
+        if not terms:
+            return super().filter_queryset(request, queryset, view)
+        fields = view.trigram_fields
+        matches = [
+            reduce(or_, (Q(**{f'{field}__trigram_word_similar': term}) for field in fields)) for term in terms
+        ]
+        scores = [self.score(term, fields) for term in terms]
+        return queryset.filter(reduce(and_, matches)).annotate(
+            rank=reduce(add, scores) if len(scores) > 1 else scores[0]
+        ).order_by(*self.rank_ordering)
+
+    @staticmethod
+    def score(term, fields):
+        similarities = [TrigramWordSimilarity(term, field) for field in fields]
+        if len(similarities) == 1:
+            return similarities[0]
+        return Greatest(*similarities, output_field=FloatField())
+
+
+def facet_counts(queryset, fields):
+    """
+    Число строк queryset по каждому значению каждого поля и общий итог одним
+    запросом GROUP BY GROUPING SETS ((поле), ..., ()). На шардах - запрос на
+    каждом шарде, счетчики складываются.
+    """
+    counts = {field: {} for field in fields}
+    total = 0
+    all_grouped = (1 << len(fields)) - 1
+    for shard in getattr(queryset, 'querysets', [queryset]):
+        connection = connections[shard.db]
+        columns = ', '.join(connection.ops.quote_name(field) for field in fields)
+        sets = ', '.join(f'({connection.ops.quote_name(field)})' for field in fields)
+        sql, params = shard.order_by().values(*fields).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT {columns}, GROUPING({columns}), COUNT(*) FROM ({sql}) AS facets '
+                f'GROUP BY GROUPING SETS ({sets}, ())',
+                params,
+            )
+            for *values, grouping, count in cursor.fetchall():
+                if grouping == all_grouped:
+                    total += count
+                    continue
+                # В GROUPING бит поля равен 0, если строка сгруппирована по нему.
+                position = next(i for i in range(len(fields)) if not grouping & (1 << (len(fields) - 1 - i)))
+                field_counts = counts[fields[position]]
+                field_counts[values[position]] = field_counts.get(values[position], 0) + count
+    facets = {
+        field: [
+            {'value': value, 'count': count}
+            for value, count in sorted(values.items(), key=lambda item: (-item[1], item[0]))
+        ]
+        for field, values in counts.items()
+    }
+    return total, facets
@@ -1,31 +1,194 @@
+from decimal import ROUND_HALF_UP
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 from .models import Hotels, Rooms, Room_types, Bookings, Guests
+from .pricing import Pricer
+from .timing import span
 
 
-class HotelsSerializer(serializers.ModelSerializer):
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.field_name)
+        if prefetched is None:
+            return super().to_internal_value(data)
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            pk = self.get_queryset().model._meta.pk.to_python(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in prefetched:
+            self.fail('does_not_exist', pk_value=data)
+        return prefetched[pk]
+
+
+class ExpandableSerializerMixin:
+    expandable_fields = {}
+
+    def __init__(self, *args, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if expand is None:
+            expand = self.context.get('expand', ())
+        self.expanded = {}
+        for name, serializer_class in self.expandable_fields.items():
+            if name in expand:
+                nested = [path.removeprefix(name + '.') for path in expand if path.startswith(name + '.')]
+                self.expanded[name] = serializer_class(expand=nested, context=self.context)
+
+    def to_representation(self, instance):
+        with span('serialize'):
+            data = super().to_representation(instance)
+            for name, serializer in self.expanded.items():
+                related = getattr(instance, name)
+                data[name] = None if related is None else serializer.to_representation(related)
+        return data
+
+    @classmethod
+    def expandable_paths(cls):
+        paths = []
+        for name, serializer_class in cls.expandable_fields.items():
+            paths.append(name)
+            paths.extend(f'{name}.{path}' for path in serializer_class.expandable_paths())
+        return paths
+
+
+class HotelsSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Hotels
         fields = '__all__'
 
-class RoomTypesSerializer(serializers.ModelSerializer):
+class RoomTypesSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'hotel': HotelsSerializer}
+
     class Meta:
         model = Room_types
         fields = '__all__'
         
 
-class RoomsSerializer(serializers.ModelSerializer):
+class RoomsSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+    expandable_fields = {'hotel': HotelsSerializer, 'type': RoomTypesSerializer}
+
     class Meta:
         model = Rooms
         fields ='__all__'
 
 
-class GuestsSerializer(serializers.ModelSerializer):
+class GuestsSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Guests
         fields ='__all__'
 
 
-class BookingsSerializer(serializers.ModelSerializer):
+class BookingsSerializer(ExpandableSerializerMixin, serializers.ModelSerializer):
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+    expandable_fields = {'guest': GuestsSerializer, 'room': RoomsSerializer}
+    priced_fields = ('room', 'check_in_date', 'check_out_date')
+
     class Meta:
         model = Bookings
-        fields ='__all__'
\ No newline at end of file
+        fields ='__all__'
+
+    def validate(self, attrs):
+        if 'total_price' in attrs:
+            return attrs
+        if self.instance is not None and not any(name in attrs for name in self.priced_fields):
+            return attrs
+        room, check_in, check_out = (
+            attrs[name] if name in attrs else getattr(self.instance, name, None) for name in self.priced_fields
+        )
+        if room is not None and check_in and check_out and check_out > check_in:
+            pricer = self.context.setdefault('pricer', Pricer())
+            attrs['total_price'], = pricer.quote([(room.type_id, check_in, check_out)])
+        return attrs
+
+
+class AvailabilitySerializer(serializers.Serializer):
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+    guests = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, attrs):
+        if attrs['check_out'] <= attrs['check_in']:
+            raise serializers.ValidationError({
+                'check_out': 'Дата выезда должна быть позже даты заезда.'
+            })
+        return attrs
+
+
+class QuoteSerializer(serializers.Serializer):
+    room_type = serializers.IntegerField()
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+    nights = serializers.IntegerField(read_only=True)
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+    def validate(self, attrs):
+        nights = (attrs['check_out'] - attrs['check_in']).days
+        if nights <= 0:
+            raise serializers.ValidationError({
+                'check_out': 'Дата выезда должна быть позже даты заезда.'
+            })
+        if nights > 366:
+            raise serializers.ValidationError({
+                'check_out': 'Проживание не может быть длиннее 366 ночей.'
+            })
+        return attrs
+
+
+class SearchSerializer(AvailabilitySerializer):
+    hotel = serializers.IntegerField(required=False)
+    type = serializers.IntegerField(required=False)
+    after = serializers.IntegerField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+
+
+class SuggestSerializer(serializers.Serializer):
+    prefix = serializers.CharField(max_length=100)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class CalendarSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    
+    def validate(self, attrs):
+        if attrs['end'] <= attrs['start']:
+            raise serializers.ValidationError({
+                'end': 'Конец периода должен быть позже начала.'
+            })
+        if (attrs['end'] - attrs['start']).days > 366:
+            raise serializers.ValidationError({
+                'end': 'Период не может быть длиннее 366 ночей.'
+            })
+        return attrs
+
+
+class StatsSerializer(serializers.Serializer):
+    room_type = serializers.IntegerField(required=False)
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['from'] = serializers.DateField()
+        fields['to'] = serializers.DateField()
+        return fields
+    
+    def validate(self, attrs):
+        if attrs['to'] < attrs['from']:
+            raise serializers.ValidationError({
+                'to': 'Конец периода не может быть раньше начала.'
+            })
+        if (attrs['to'] - attrs['from']).days >= 3660:
+            raise serializers.ValidationError({
+                'to': 'Период не может быть длиннее 10 лет.'
+            })
+        return attrs
+
+
+class DayStatsSerializer(serializers.Serializer):
+    date = serializers.DateField(required=False)
+    rooms_sold = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2, rounding=ROUND_HALF_UP)
+    occupancy = serializers.DecimalField(max_digits=7, decimal_places=2, rounding=ROUND_HALF_UP)
+    adr = serializers.DecimalField(max_digits=14, decimal_places=2, rounding=ROUND_HALF_UP)
+    revpar = serializers.DecimalField(max_digits=14, decimal_places=2, rounding=ROUND_HALF_UP)
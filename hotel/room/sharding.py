@@ -0,0 +1,381 @@
+"""
+Шардирование по отелю. Отель и все, что от него зависит (типы комнат, комнаты,
+цены, бронирования, календарь Room_nights, статистика), лежит в одной из баз
+DATABASE_SHARDS. Гости и каталог Hotel_shards (какой отель на каком шарде) -
+в общей базе default.
+"""
+import heapq
+from collections.abc import Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import chain, islice
+from operator import attrgetter, itemgetter
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import Count, Max, Min, QuerySet, Sum
+from django.db.models.query import FlatValuesListIterable, ModelIterable, ValuesIterable
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from .models import Hotel_shards, Hotels
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Каждый шард выдает id из своего диапазона, поэтому id уникальны во всех базах
+# и не меняются при переносе отеля между шардами.
+ID_RANGE = 1 << 40
+# Путь от модели до id отеля; Room_nights и Daily_stats заполняются триггерами.
+HOTEL_PATHS = {
+    'hotels': 'pk',
+    'room_types': 'hotel_id',
+    'rooms': 'hotel_id',
+    'rate_overrides': 'room_type__hotel_id',
+    'stay_discounts': 'room_type__hotel_id',
+    'bookings': 'room__hotel_id',
+    'room_nights': 'hotel_id',
+    'daily_stats': 'hotel_id',
+}
+
+shard = ContextVar('db_shard', default=None)
+
+
+class ShardNotSelected(RuntimeError):
+    pass
+
+
+class HotelMoving(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Отель переносится на другой шард, повторите запрос позже.'
+    default_code = 'hotel_moving'
+
+
+def enabled():
+    return bool(settings.DATABASE_SHARDS)
+
+
+def is_sharded(model):
+    return model._meta.app_label == 'room' and model._meta.model_name in HOTEL_PATHS
+
+
+@contextmanager
+def use_shard(alias):
+    token = shard.set(alias)
+    try:
+        yield alias
+    finally:
+        shard.reset(token)
+
+
+def scatter(queryset):
+    """Запрос к шарду текущего запроса, а если шард не выбран - ко всем шардам сразу."""
+    if not enabled() or not is_sharded(queryset.model):
+        return queryset
+    alias = shard.get()
+    if alias is not None:
+        return queryset.using(alias)
+    return ScatterQuerySet([queryset.using(alias) for alias in settings.DATABASE_SHARDS])
+
+
+def joinable(model, path):
+    """Можно ли пройти путь select_related одним JOIN: все модели по пути в одной базе."""
+    if not enabled():
+        return True
+    for name in path.split('__'):
+        related = model._meta.get_field(name).related_model
+        if is_sharded(related) != is_sharded(model):
+            return False
+        model = related
+    return True
+
+
+def place_hotel():
+    """Шард для нового отеля: тот, где меньше всего отелей."""
+    counts = dict(Hotel_shards.objects.values_list('shard').annotate(hotels=Count('pk')).order_by())
+    return min(settings.DATABASE_SHARDS, key=lambda alias: counts.get(alias, 0))
+
+
+def locate(keys):
+    """
+    По парам (модель, pk) находит шарды и отели: {шард: {id отеля}}.
+    Отели ищутся в каталоге, остальные объекты - запросом к каждому шарду.
+    """
+    pks = {}
+    for model, value in keys:
+        try:
+            pk = model._meta.pk.to_python(value)
+        except (TypeError, ValueError, DjangoValidationError):
+            continue
+        if pk is not None:
+            pks.setdefault(model, set()).add(pk)
+
+    found = {}
+    for model, values in pks.items():
+        if model is Hotels:
+            rows = Hotel_shards.objects.filter(hotel_id__in=values).values_list('shard', 'hotel_id')
+        else:
+            path = HOTEL_PATHS[model._meta.model_name]
+            rows = [
+                (alias, hotel_id) for alias in settings.DATABASE_SHARDS
+                for hotel_id in model._base_manager.using(alias).filter(pk__in=values)
+                .values_list(path, flat=True).distinct()
+            ]
+        for alias, hotel_id in rows:
+            found.setdefault(alias, set()).add(hotel_id)
+    return found
+
+
+def reserve_id_range(using, **kwargs):
+    """post_migrate: переводит последовательности id шарда в его диапазон."""
+    if using not in settings.DATABASE_SHARDS or connections[using].vendor != 'postgresql':
+        return
+    start = settings.DATABASE_SHARDS.index(using) * ID_RANGE
+    if not start:
+        return
+    with connections[using].cursor() as cursor:
+        for model in apps.get_app_config('room').get_models():
+            if not is_sharded(model):
+                continue
+            table = model._meta.db_table
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                f'COALESCE((SELECT max(id) + 1 FROM {table} WHERE id >= %s AND id < %s), %s), false)',
+                [table, start, start + ID_RANGE, start],
+            )
+
+
+class Descending:
+    """Ключ сортировки в обратном порядке для любых сравнимых значений."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class ScatterQuerySet:
+    """
+    Один и тот же запрос на всех шардах. Цепочки (filter, order_by, values, ...)
+    применяются к каждому шарду, строки сливаются по order_by; срез [a:b] берет
+    с каждого шарда первые b строк и режет уже слитый результат.
+    """
+
+    def __init__(self, querysets, window=None):
+        self.querysets = querysets
+        self.window = window
+
+    @property
+    def model(self):
+        return self.querysets[0].model
+
+    @property
+    def query(self):
+        return self.querysets[0].query
+
+    @property
+    def ordered(self):
+        return self.querysets[0].ordered
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        method = getattr(self.querysets[0], name)
+        if not callable(method):
+            raise AttributeError(name)
+
+        def chain(*args, **kwargs):
+            if self.window is not None:
+                raise TypeError('Нельзя продолжить запрос после среза.')
+            querysets = [getattr(queryset, name)(*args, **kwargs) for queryset in self.querysets]
+            if not all(isinstance(queryset, QuerySet) for queryset in querysets):
+                raise TypeError(f'{name}() не поддерживается для запроса по всем шардам.')
+            return ScatterQuerySet(querysets)
+        return chain
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice):
+            rows = list(self[k:k + 1])
+            if not rows:
+                raise IndexError(k)
+            return rows[0]
+        if k.step is not None or (k.start or 0) < 0 or (k.stop is not None and k.stop < 0):
+            raise ValueError('Поддерживаются только срезы вида [a:b] без шага.')
+        return ScatterQuerySet([queryset[:k.stop] for queryset in self.querysets], (k.start or 0, k.stop))
+
+    def __iter__(self):
+        return self.merge([iter(queryset) for queryset in self.querysets])
+
+    def __aiter__(self):
+        async def rows():
+            fetched = [[row async for row in queryset] for queryset in self.querysets]
+            for row in self.merge(fetched):
+                yield row
+        return rows()
+
+    def merge(self, shards):
+        """Слияние k упорядоченных потоков шардов через heapq.merge, без пересортировки."""
+        keys = self.sort_keys()
+        if keys:
+            rows = heapq.merge(*shards, key=self.sort_key(keys))
+        else:
+            rows = chain.from_iterable(shards)
+        if self.window is not None:
+            rows = islice(rows, *self.window)
+        return rows
+
+    def sort_key(self, keys):
+        getters = [(self.getter(name), descending) for name, descending in keys]
+
+        def key(row):
+            parts = []
+            for getter, descending in getters:
+                # Как в PostgreSQL: NULL в конце по возрастанию и в начале по убыванию.
+                value = getter(row)
+                part = (value is None, value)
+                parts.append(Descending(part) if descending else part)
+            return parts
+        return key
+
+    def sort_keys(self):
+        query = self.query
+        ordering = query.order_by or (query.default_ordering and self.model._meta.ordering) or ()
+        keys = []
+        for term in ordering:
+            if not isinstance(term, str) or '__' in term or term == '?':
+                return None
+            name = term.lstrip('-')
+            keys.append((self.model._meta.pk.name if name == 'pk' else name, term.startswith('-')))
+        return keys
+
+    def getter(self, name):
+        queryset = self.querysets[0]
+        try:
+            attname = self.model._meta.get_field(name).attname
+        except FieldDoesNotExist:
+            attname = name
+        iterable = queryset._iterable_class
+        if iterable is ModelIterable:
+            return attrgetter(attname)
+        fields = queryset._fields or [field.attname for field in self.model._meta.concrete_fields]
+        key = next((field_name for field_name in fields if field_name in (name, attname)), None)
+        if key is None:
+            raise TypeError(f'Для слияния по шардам поле сортировки {name} должно быть среди выбранных полей.')
+        if iterable is FlatValuesListIterable:
+            return lambda row: row
+        if iterable is ValuesIterable:
+            return itemgetter(key)
+        return itemgetter(fields.index(key))
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def exists(self):
+        return any(queryset.exists() for queryset in self.querysets)
+
+    async def aexists(self):
+        for queryset in self.querysets:
+            if await queryset.aexists():
+                return True
+        return False
+
+    def get(self, *args, **kwargs):
+        found = [row for queryset in self.querysets for row in queryset.filter(*args, **kwargs)[:2]]
+        if not found:
+            raise self.model.DoesNotExist(f'{self.model._meta.object_name} matching query does not exist.')
+        if len(found) > 1:
+            raise self.model.MultipleObjectsReturned(f'get() returned more than one {self.model._meta.object_name}.')
+        return found[0]
+
+    def first(self):
+        queryset = self if self.ordered else self.order_by('pk')
+        rows = list(queryset[:1])
+        return rows[0] if rows else None
+
+    def in_bulk(self, id_list=None, **kwargs):
+        found = {}
+        for queryset in self.querysets:
+            found.update(queryset.in_bulk(id_list, **kwargs))
+        return found
+
+    def iterator(self, chunk_size=None):
+        """Потоком: курсоры всех шардов открыты сразу и сливаются по order_by."""
+        return self.merge([queryset.iterator(chunk_size=chunk_size) for queryset in self.querysets])
+
+    def aggregate(self, **aggregates):
+        parts = [queryset.aggregate(**aggregates) for queryset in self.querysets]
+        result = {}
+        for name, aggregate in aggregates.items():
+            values = [part[name] for part in parts if part[name] is not None]
+            if isinstance(aggregate, Count):
+                result[name] = sum(values)
+            elif isinstance(aggregate, Sum):
+                result[name] = sum(values) if values else None
+            elif isinstance(aggregate, Max):
+                result[name] = max(values, default=None)
+            elif isinstance(aggregate, Min):
+                result[name] = min(values, default=None)
+            else:
+                raise TypeError(f'{type(aggregate).__name__} не поддерживается для запроса по всем шардам.')
+        return result
+
+
+class ShardedViewSetMixin:
+    """
+    Выбирает шард запроса по отелю: из pk в URL, из полей shard_by в теле или
+    фильтрах (hotel, room). Без отеля чтения идут на все шарды (ScatterQuerySet),
+    новый отель получает наименее загруженный шард. Запись, затрагивающая
+    несколько шардов, отклоняется: атомарно ее не выполнить.
+    """
+
+    shard_by = {}
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if enabled():
+            self.shard_token = shard.set(self.resolve_shard(request, kwargs))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, 'shard_token', None)
+        if token is not None:
+            shard.reset(token)
+            self.shard_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        return scatter(super().filter_queryset(queryset))
+
+    def resolve_shard(self, request, kwargs):
+        model = self.queryset.model
+        writing = request.method not in SAFE_METHODS
+        keys = []
+        lookup = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        if lookup is not None:
+            keys.append((model, lookup))
+        data = request.data if writing else request.query_params
+        rows = data if isinstance(data, list) else [data]
+        for row in rows:
+            if not isinstance(row, Mapping):
+                continue
+            if isinstance(data, list) and 'id' in row:
+                keys.append((model, row['id']))
+            for name, related in self.shard_by.items():
+                if row.get(name) not in (None, ''):
+                    keys.append((related, row[name]))
+
+        located = locate(keys)
+        if len(located) > 1:
+            raise serializers.ValidationError({'non_field_errors': ['Объекты запроса лежат на разных шардах.']})
+        if not located:
+            if not writing:
+                return None
+            return place_hotel() if model is Hotels and lookup is None else settings.DATABASE_SHARDS[0]
+        (alias, hotels), = located.items()
+        if writing and Hotel_shards.objects.filter(hotel_id__in=hotels, moving=True).exists():
+            raise HotelMoving()
+        return alias
@@ -0,0 +1,114 @@
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from . import sharding, suggest
+from .availability import AVAILABILITY_TAG, BOOKINGS_TAG, index
+from .cache import invalidate_on_commit
+from .models import Hotels, Hotel_shards, Room_types, Rooms, Guests, Bookings, CANCELLED_STATUS
+
+
+def update_availability(using, tag, method, *args):
+    if not settings.AVAILABILITY_INDEX:
+        return
+    invalidate_on_commit(tag, using=using)
+    if index.ready or index.pending is not None:
+        transaction.on_commit(partial(index.apply, tag, method, *args), using=using)
+
+
+@receiver(post_init, sender=Room_types)
+@receiver(post_init, sender=Rooms)
+def remember_parents(sender, instance, **kwargs):
+    instance._loaded_hotel_id = instance.__dict__.get('hotel_id')
+    instance._loaded_type_id = instance.__dict__.get('type_id')
+
+
+@receiver(post_save, sender=Hotels)
+@receiver(post_delete, sender=Hotels)
+def invalidate_hotel(sender, instance, using, **kwargs):
+    invalidate_on_commit('hotels', f'hotel:{instance.pk}', using=using)
+
+
+@receiver(post_save, sender=Room_types)
+@receiver(post_delete, sender=Room_types)
+def invalidate_room_type(sender, instance, using, **kwargs):
+    hotels = {instance.hotel_id, instance._loaded_hotel_id} - {None}
+    invalidate_on_commit(f'room_type:{instance.pk}', *[f'hotel:{pk}:room_types' for pk in hotels], using=using)
+    instance._loaded_hotel_id = instance.hotel_id
+
+
+@receiver(post_save, sender=Rooms)
+@receiver(post_delete, sender=Rooms)
+def invalidate_room(sender, instance, using, **kwargs):
+    types = {instance.type_id, instance._loaded_type_id} - {None}
+    invalidate_on_commit(*[f'room_type:{pk}:rooms' for pk in types], using=using)
+    instance._loaded_type_id = instance.type_id
+
+
+@receiver(post_save, sender=Bookings)
+def index_booking(sender, instance, using, **kwargs):
+    update_availability(
+        using, BOOKINGS_TAG, index.save_booking, instance.pk, instance.room_id,
+        instance.check_in_date, instance.check_out_date, instance.status != CANCELLED_STATUS,
+    )
+
+
+@receiver(post_delete, sender=Bookings)
+def unindex_booking(sender, instance, using, **kwargs):
+    update_availability(using, AVAILABILITY_TAG, index.release, instance.pk)
+
+
+@receiver(post_save, sender=Rooms)
+def index_room(sender, instance, using, **kwargs):
+    update_availability(using, AVAILABILITY_TAG, index.save_room, instance.pk, instance.hotel_id, instance.type_id, instance.is_available)
+
+
+@receiver(post_delete, sender=Rooms)
+def unindex_room(sender, instance, using, **kwargs):
+    update_availability(using, AVAILABILITY_TAG, index.delete_room, instance.pk)
+
+
+@receiver(post_save, sender=Room_types)
+def index_room_type(sender, instance, using, **kwargs):
+    update_availability(using, AVAILABILITY_TAG, index.save_room_type, instance.pk, instance.max_guests)
+
+
+@receiver(post_delete, sender=Room_types)
+def unindex_room_type(sender, instance, using, **kwargs):
+    update_availability(using, AVAILABILITY_TAG, index.delete_room_type, instance.pk)
+
+
+@receiver(post_save, sender=Hotels)
+def suggest_hotel(sender, instance, using, **kwargs):
+    if suggest.index.ready:
+        transaction.on_commit(partial(
+            suggest.index.apply, suggest.index.save_hotel,
+            instance.pk, instance.name, instance.city, instance.country, instance.star_rating,
+        ), using=using)
+
+
+@receiver(post_delete, sender=Hotels)
+def unsuggest_hotel(sender, instance, using, **kwargs):
+    if suggest.index.ready:
+        transaction.on_commit(partial(suggest.index.apply, suggest.index.delete_hotel, instance.pk), using=using)
+
+
+@receiver(post_save, sender=Hotels)
+def register_hotel(sender, instance, created, using, **kwargs):
+    if created and sharding.enabled() and using in settings.DATABASE_SHARDS:
+        Hotel_shards.objects.update_or_create(hotel_id=instance.pk, defaults={'shard': using})
+
+
+@receiver(post_delete, sender=Hotels)
+def unregister_hotel(sender, instance, using, **kwargs):
+    if sharding.enabled():
+        Hotel_shards.objects.filter(hotel_id=instance.pk, shard=using).delete()
+
+
+@receiver(pre_delete, sender=Guests)
+def delete_guest_bookings(sender, instance, **kwargs):
+    """Бронирования лежат на шардах, каскад из общей базы до них не доходит."""
+    if sharding.enabled():
+        for alias in settings.DATABASE_SHARDS:
+            Bookings.objects.using(alias).filter(guest_id=instance.pk).delete()
@@ -0,0 +1,164 @@
+"""
+Автодополнение отелей из памяти процесса. Ключи - название целиком, каждое
+слово названия с конца (plaza hotel, hotel), город и страна - лежат одним
+отсортированным списком пар (ключ, id отеля); префикс ищется bisect-ом.
+Отели с большим star_rating идут первыми.
+
+Свои изменения процесс применяет по сигналам. Чужие видны по версии тега
+hotels: тогда дочитываются отели, сохраненные (created_at - auto_now) с
+прошлой сверки, а полная перестройка нужна, только если не сошлись число и
+сумма id отелей, то есть какие-то удалены. Правки мимо created_at
+(QuerySet.update) подхватывает перестройка раз в SUGGEST_INDEX_MAX_AGE.
+"""
+import heapq
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.utils import timezone
+from .cache import adopt_version, tag_versions
+from .models import Hotels
+from .sharding import scatter
+
+
+MAX_LIMIT = 50
+# Выдача префиксов с большим числом совпадений (короткие префиксы, частые слова
+# вроде hotel) запоминается до следующего изменения индекса.
+MEMO_MIN_MATCHES = 256
+MEMO_MAX_SIZE = 10000
+HOTELS_TAG = 'hotels'
+FIELDS = ('id', 'name', 'city', 'country', 'star_rating')
+
+
+def normalize(text):
+    """Без регистра и диакритики: 'Zürich' ищется по 'zur'."""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ' '.join(''.join(char for char in decomposed if not unicodedata.combining(char)).split())
+
+
+def index_keys(name, city, country):
+    words = normalize(name).split()
+    keys = {' '.join(words[start:]) for start in range(len(words))}
+    keys.update(filter(None, (normalize(city), normalize(country))))
+    return keys
+
+
+class SuggestIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.entries = None
+            self.hotels = {}
+            self.memo = {}
+            self.built_at = 0
+            self.checked_at = 0
+            self.synced_at = None
+            self.version = None
+
+    @property
+    def ready(self):
+        return self.entries is not None
+
+    def build(self):
+        version, synced_at = tag_versions([HOTELS_TAG]), timezone.now()
+        hotels = {
+            pk: (name, city, country, stars) for pk, name, city, country, stars in
+            scatter(Hotels.objects.all()).values_list(*FIELDS).iterator()
+        }
+        entries = sorted((key, pk) for pk, hotel in hotels.items() for key in index_keys(*hotel[:3]))
+        with self.lock:
+            self.entries, self.hotels, self.memo = entries, hotels, {}
+            self.built_at = self.checked_at = time.monotonic()
+            self.synced_at, self.version = synced_at, version
+
+    def refresh(self, version):
+        """
+        Дочитывает отели, сохраненные с прошлой сверки. Окно берется с запасом
+        SUGGEST_INDEX_DELTA_WINDOW: транзакция, начатая до сверки, коммитится позже.
+        """
+        synced_at = timezone.now()
+        since = self.synced_at - timedelta(seconds=settings.SUGGEST_INDEX_DELTA_WINDOW)
+        changed = list(scatter(Hotels.objects.filter(created_at__gte=since)).values_list(*FIELDS))
+        totals = scatter(Hotels.objects.all()).aggregate(count=Count('pk'), checksum=Sum('pk'))
+        with self.lock:
+            for row in changed:
+                self.save_hotel(*row)
+            if (len(self.hotels), sum(self.hotels)) != (totals['count'], totals['checksum'] or 0):
+                self.build()
+                return
+            self.synced_at, self.version = synced_at, version
+
+    def ensure(self):
+        """Изменения в других процессах видны по версии тега hotels, проверяемой не чаще интервала."""
+        if not self.ready or time.monotonic() - self.built_at > settings.SUGGEST_INDEX_MAX_AGE:
+            self.build()
+            return
+        if time.monotonic() - self.checked_at < settings.SUGGEST_INDEX_CHECK_INTERVAL:
+            return
+        self.checked_at = time.monotonic()
+        version = tag_versions([HOTELS_TAG])
+        if version != self.version:
+            self.refresh(version)
+
+    def apply(self, method, *args):
+        """Изменение из сигнала этого процесса, после того как оно подняло версию тега hotels."""
+        with self.lock:
+            if not self.ready:
+                return
+            method(*args)
+            self.version = adopt_version(self.version, [HOTELS_TAG], 0)
+
+    def suggest(self, prefix, limit=10):
+        self.ensure()
+        prefix = normalize(prefix)
+        with self.lock:
+            ranked = self.memo.get(prefix)
+            if ranked is None:
+                ranked = self.rank(prefix)
+            hotels = self.hotels
+            return [
+                {'id': pk, 'name': hotels[pk][0], 'city': hotels[pk][1], 'country': hotels[pk][2],
+                 'star_rating': hotels[pk][3]}
+                for pk in ranked[:limit]
+            ]
+
+    def rank(self, prefix):
+        start = bisect_left(self.entries, (prefix,))
+        end = bisect_left(self.entries, (prefix + '\U0010ffff',))
+        hotels = self.hotels
+        found = {pk for _, pk in self.entries[start:end]}
+        ranked = heapq.nsmallest(MAX_LIMIT, found, key=lambda pk: (-hotels[pk][3], hotels[pk][0].casefold(), pk))
+        if end - start >= MEMO_MIN_MATCHES:
+            if len(self.memo) >= MEMO_MAX_SIZE:
+                self.memo = {}
+            self.memo[prefix] = ranked
+        return ranked
+
+    def save_hotel(self, pk, name, city, country, stars):
+        with self.lock:
+            if not self.ready or self.hotels.get(pk) == (name, city, country, stars):
+                return
+            self.delete_hotel(pk)
+            self.hotels[pk] = (name, city, country, stars)
+            for key in index_keys(name, city, country):
+                insort(self.entries, (key, pk))
+            self.memo = {}
+
+    def delete_hotel(self, pk):
+        with self.lock:
+            if not self.ready or pk not in self.hotels:
+                return
+            for key in index_keys(*self.hotels.pop(pk)[:3]):
+                position = bisect_left(self.entries, (key, pk))
+                if position < len(self.entries) and self.entries[position] == (key, pk):
+                    del self.entries[position]
+            self.memo = {}
+
+
+index = SuggestIndex()
@@ -1,10 +1,29 @@
 import pytest
 from datetime import date, timedelta
 from decimal import Decimal
+from django.core.cache import caches
 from rest_framework.test import APIClient
+from room import suggest
+from room.availability import index
 from room.models import Hotels, Room_types, Rooms, Guests, Bookings
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Очистка кэшей между тестами"""
+    for cache in caches.all():
+        cache.clear()
+    index.reset()
+    suggest.index.reset()
+
+
+@pytest.fixture(autouse=True)
+def unsharded(request, settings):
+    """Шардирование включено только в тестах c маркером sharded"""
+    if request.node.get_closest_marker('sharded') is None:
+        settings.DATABASE_SHARDS = []
+
+
 @pytest.fixture
 def api_client():
     """Базовый клиент для тестирования API"""
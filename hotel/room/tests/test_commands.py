@@ -0,0 +1,231 @@
+import csv
+import json
+import pytest
+import time
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import Mock
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from room.management.commands.generate_data import Command as GenerateDataCommand
+from room.models import Hotels, Rooms, Guests, Bookings, Daily_stats, Import_progress, Room_nights
+
+
+def write_csv(path, header, rows):
+    with path.open('w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return path
+
+
+def finish_after(delay):
+    time.sleep(delay)
+    return 'finished', time.monotonic()
+
+
+def start(_):
+    return 'started', time.monotonic()
+
+
+@pytest.mark.django_db
+class TestImportInventoryCommand:
+    """Тесты команды import_inventory"""
+    
+    def test_import_hotels_csv_rejects_invalid_rows(self, tmp_path):
+        """Загрузка отелей: строки c неверным рейтингом отклоняются"""
+        path = write_csv(tmp_path / 'hotels.csv', ['name', 'address', 'city', 'country', 'phone', 'star_rating'], [
+            ['Hotel A', 'Street 1', 'Paris', 'France', '+33123456789', 4],
+            ['Hotel B', 'Street 2', 'Rome', 'Italy', '+39123456789', 9],
+            ['Hotel C', 'Street 3', 'Oslo', 'Norway', '+4712345678', 0],
+            ['', 'Street 4', 'Kyiv', 'Ukraine', '+380123456789', 3],
+        ])
+        rejects = tmp_path / 'rejects.csv'
+        out = StringIO()
+        call_command('import_inventory', 'hotels', str(path), '--rejects', str(rejects), stdout=out)
+        
+        assert list(Hotels.objects.values_list('name', flat=True)) == ['Hotel A']
+        assert 'загружено 1, отклонено 3' in out.getvalue()
+        assert 'строк/с' in out.getvalue()
+        lines = sorted(int(row[0]) for row in csv.reader(rejects.open()))
+        assert lines == [2, 3, 4]
+        assert not Import_progress.objects.exists()
+    
+    def test_import_rooms_ndjson_with_ids(self, tmp_path, hotel, room_type):
+        """Загрузка комнат из NDJSON c явными id и проверкой связей"""
+        path = tmp_path / 'rooms.ndjson'
+        rows = [
+            {'id': 1000, 'hotel': hotel.id, 'type': room_type.id, 'room_number': '1', 'floor': 1},
+            {'id': 1001, 'hotel': hotel.id, 'type': 99999, 'room_number': '2', 'floor': 1},
+        ]
+        path.write_text('\n'.join(json.dumps(r) for r in rows))
+        call_command('import_inventory', 'rooms', str(path), stdout=StringIO())
+        
+        room = Rooms.objects.get()
+        assert room.pk == 1000
+        assert room.is_available is True
+        assert Rooms.objects.create(hotel=hotel, type=room_type, room_number='3', floor=1).pk > 1000
+    
+    def test_import_bookings_validation(self, tmp_path, booking, another_guest, unavailable_room):
+        """Загрузка бронирований: даты и пересечения проверяются на уровне SQL"""
+        start = date.today() + timedelta(days=30)
+        header = ['guest', 'room', 'check_in_date', 'check_out_date', 'status']
+        path = write_csv(tmp_path / 'bookings.csv', header, [
+            [another_guest.id, unavailable_room.id, start, start + timedelta(days=2), 'confirmed'],
+            [another_guest.id, unavailable_room.id, start + timedelta(days=1), start + timedelta(days=3), 'confirmed'],
+            [another_guest.id, unavailable_room.id, start + timedelta(days=5), start + timedelta(days=4), 'confirmed'],
+            [another_guest.id, booking.room_id, booking.check_in_date, booking.check_out_date, 'confirmed'],
+            [another_guest.id, booking.room_id, booking.check_in_date, booking.check_out_date, 'cancelled'],
+        ])
+        call_command('import_inventory', 'bookings', str(path), stdout=StringIO())
+        
+        assert Bookings.objects.filter(guest=another_guest).count() == 2
+        assert Bookings.objects.filter(guest=another_guest, status='cancelled').count() == 1
+    
+    def test_import_resume(self, tmp_path):
+        """Продолжение загрузки c последней зафиксированной партии"""
+        header = ['name', 'address', 'city', 'country', 'phone', 'star_rating']
+        path = write_csv(tmp_path / 'hotels.csv', header, [
+            [f'Hotel {i}', 'Street', 'City', 'Country', '+33123456789', 3] for i in range(5)
+        ])
+        Import_progress.objects.create(source=f'hotels:{path.resolve()}', rows=3)
+        call_command('import_inventory', 'hotels', str(path), '--resume', '--batch-size', '1', stdout=StringIO())
+        
+        assert sorted(Hotels.objects.values_list('name', flat=True)) == ['Hotel 3', 'Hotel 4']
+    
+    def test_import_rejects_constraint_violations(self, tmp_path, hotel):
+        """Нарушение ограничения базы отклоняет строку, а не прерывает загрузку"""
+        header = ['id', 'name', 'address', 'city', 'country', 'phone', 'star_rating']
+        path = write_csv(tmp_path / 'hotels.csv', header, [
+            [hotel.id + 100, 'Hotel A', 'Street', 'City', 'Country', '+33123456789', 3],
+            [hotel.id, 'Duplicate', 'Street', 'City', 'Country', '+33123456789', 3],
+            [hotel.id + 101, 'Hotel B', 'Street', 'City', 'Country', '+33123456789', 3],
+        ])
+        rejects = tmp_path / 'rejects.csv'
+        out = StringIO()
+        call_command('import_inventory', 'hotels', str(path), '--rejects', str(rejects), stdout=out)
+        
+        assert sorted(Hotels.objects.values_list('name', flat=True)) == ['Grand Plaza Hotel', 'Hotel A', 'Hotel B']
+        assert 'загружено 2, отклонено 1' in out.getvalue()
+        assert [row[0] for row in csv.reader(rejects.open())] == ['2']
+        assert not Import_progress.objects.exists()
+    
+    def test_import_progress_in_batch_transaction(self, tmp_path, monkeypatch):
+        """Отметка продолжения фиксируется вместе с партией"""
+        header = ['name', 'address', 'city', 'country', 'phone', 'star_rating']
+        path = write_csv(tmp_path / 'hotels.csv', header, [
+            [f'Hotel {i}', 'Street', 'City', 'Country', '+33123456789', 3] for i in range(3)
+        ])
+        monkeypatch.setattr('room.management.commands.import_inventory.invalidate', Mock(side_effect=RuntimeError))
+        with pytest.raises(RuntimeError):
+            call_command('import_inventory', 'hotels', str(path), '--batch-size', '2', stdout=StringIO())
+        
+        assert Import_progress.objects.get().rows == 3
+        assert Hotels.objects.count() == 3
+    
+    def test_import_missing_columns(self, tmp_path):
+        """Отсутствие обязательных колонок - ошибка команды"""
+        path = write_csv(tmp_path / 'hotels.csv', ['name'], [['Hotel']])
+        with pytest.raises(CommandError):
+            call_command('import_inventory', 'hotels', str(path), stdout=StringIO())
+
+
+@pytest.mark.django_db
+class TestRebuildDailyStatsCommand:
+    """Тесты команды rebuild_daily_stats"""
+    
+    def stats(self):
+        return list(Daily_stats.objects.order_by('date').values_list('date', 'rooms_sold', 'revenue'))
+    
+    def test_rebuild_restores_rollup(self, booking):
+        """Пересчет восстанавливает испорченную статистику"""
+        expected = self.stats()
+        Daily_stats.objects.update(rooms_sold=42)
+        out = StringIO()
+        call_command('rebuild_daily_stats', stdout=out)
+        
+        assert self.stats() == expected
+        assert [row[1] for row in expected] == [1, 1, 1]
+        assert 'записано 3' in out.getvalue()
+    
+    def test_rebuild_period_and_hotel(self, booking, hotel_with_low_rating):
+        """Пересчет только выбранного периода и отеля"""
+        Daily_stats.objects.update(rooms_sold=42)
+        second = booking.check_in_date + timedelta(days=1)
+        call_command('rebuild_daily_stats', '--hotel', str(booking.room.hotel_id),
+                     '--from', second.isoformat(), '--to', second.isoformat(), stdout=StringIO())
+        
+        assert [row[1] for row in self.stats()] == [42, 1, 42]
+        
+        call_command('rebuild_daily_stats', '--hotel', str(hotel_with_low_rating.id), stdout=StringIO())
+        assert [row[1] for row in self.stats()] == [42, 1, 42]
+    
+    def test_rebuild_invalid_period(self):
+        """Конец периода раньше начала"""
+        with pytest.raises(CommandError):
+            call_command('rebuild_daily_stats', '--from', '2031-01-02', '--to', '2031-01-01')
+
+
+@pytest.mark.django_db
+class TestGenerateDataCommand:
+    """Тесты команды generate_data"""
+
+    def generate(self, seed=7, workers=1, **options):
+        call_command(
+            'generate_data', hotels=3, rooms_per_hotel=4, bookings=50, guests=10, seed=seed, workers=workers,
+            hotels_per_task=2, today=date(2026, 1, 15), stdout=StringIO(), **options,
+        )
+        hotels = Hotels.objects.order_by('-id')[:3]
+        first_room = Rooms.objects.filter(hotel__in=hotels).order_by('id').first().id
+        return (
+            [(h.name, h.city, h.star_rating) for h in reversed(hotels)],
+            list(Bookings.objects.filter(room__hotel__in=hotels).order_by('room', 'check_in_date').values_list(
+                'room', 'check_in_date', 'check_out_date', 'status', 'total_price',
+            )),
+            first_room,
+        )
+
+    def relative(self, snapshot):
+        hotels, bookings, first_room = snapshot
+        return hotels, [(room - first_room, *rest) for room, *rest in bookings]
+
+    def test_generates_requested_volume(self):
+        """Создаются отели, комнаты, гости и бронирования; календарь заполняют триггеры"""
+        _, bookings, _ = self.generate()
+
+        assert Hotels.objects.count() == 3
+        assert Rooms.objects.count() == 12
+        assert len(bookings) == 50
+        active = [(check_in, check_out) for _, check_in, check_out, status, _ in bookings if status != 'cancelled']
+        assert Room_nights.objects.count() == sum((out - in_).days for in_, out in active)
+        assert {status for *_, status, _ in bookings} <= {'completed', 'confirmed', 'pending', 'cancelled'}
+
+    def test_same_seed_reproduces_data(self):
+        """Тот же seed дает те же данные (с другими id), другой seed - другие"""
+        first = self.relative(self.generate())
+        second = self.relative(self.generate())
+        other = self.relative(self.generate(seed=8))
+
+        assert first == second
+        assert first != other
+
+    @pytest.mark.django_db(transaction=True)
+    def test_parallel_workers(self):
+        """Несколько воркеров: отели пишутся после всех гостей и дают те же данные"""
+        sequential = self.relative(self.generate())
+        parallel = self.relative(self.generate(workers=2, batch_size=2))
+
+        assert parallel == sequential
+        assert Guests.objects.count() == 20
+        assert not Bookings.objects.exclude(guest__in=Guests.objects.all()).exists()
+
+    def test_phases_run_in_order(self):
+        """Задачи следующей фазы не стартуют, пока не закончены задачи предыдущей"""
+        times = dict(GenerateDataCommand().run([[(finish_after, 0.3)], [(start, None)]], workers=2))
+
+        assert times['started'] >= times['finished']
+
+    def test_requires_rooms_for_bookings(self):
+        """Бронирования без комнат сгенерировать нельзя"""
+        with pytest.raises(CommandError):
+            call_command('generate_data', hotels=0, bookings=10, stdout=StringIO())
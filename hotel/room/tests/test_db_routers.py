@@ -0,0 +1,341 @@
+import json
+import pytest
+from collections import Counter
+from datetime import date, timedelta
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, connections
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from room import sharding
+from room.db_routers import PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware, ShardRouter, health
+from room.models import Bookings, Guests, Hotel_shards, Hotels, Room_nights, Rooms
+
+
+@pytest.fixture
+def replicas(settings, monkeypatch):
+    """Две фиктивные реплики c управляемым отставанием"""
+    settings.DATABASE_REPLICAS = ['replica_1', 'replica_2']
+    lags = {'replica_1': 0, 'replica_2': 0}
+
+    def lag(alias):
+        if lags[alias] is None:
+            raise OperationalError('connection refused')
+        return lags[alias]
+
+    monkeypatch.setattr(health, 'lag', lag)
+    health.reset()
+    yield lags
+    health.reset()
+
+
+def routed(request, view=None):
+    """Прогоняет запрос через middleware и возвращает базу, выбранную для чтения"""
+    def read(request):
+        return HttpResponse(ReplicaRouter().db_for_read(Hotels))
+    response = ReplicaRoutingMiddleware(view or read)(request)
+    return response.content.decode(), response
+
+
+class TestReplicaRouter:
+    """Тесты маршрутизации чтений на реплики"""
+
+    def test_safe_methods_use_replicas(self, replicas):
+        """GET читает c реплик по очереди, POST и код вне запроса - c основной"""
+        factory = RequestFactory()
+
+        assert {routed(factory.get('/'))[0] for _ in range(4)} == {'replica_1', 'replica_2'}
+        assert routed(factory.post('/'))[0] == 'default'
+        assert ReplicaRouter().db_for_read(Hotels) == 'default'
+
+    def test_read_your_writes_in_request(self, replicas):
+        """После записи в том же запросе чтения идут на основную базу"""
+        def view(request):
+            router = ReplicaRouter()
+            before = router.db_for_read(Hotels)
+            router.db_for_write(Hotels)
+            return HttpResponse(f'{before},{router.db_for_read(Hotels)}')
+
+        content, response = routed(RequestFactory().get('/'), view)
+
+        assert content.startswith('replica_') and content.endswith(',default')
+        assert PIN_COOKIE in response.cookies
+
+    def test_pin_cookie_after_write(self, replicas, settings):
+        """После POST клиент закреплен за основной базой"""
+        factory = RequestFactory()
+        _, response = routed(factory.post('/'))
+        cookie = response.cookies[PIN_COOKIE]
+
+        assert cookie['max-age'] == settings.REPLICA_PIN_SECONDS
+        request = factory.get('/')
+        request.COOKIES[PIN_COOKIE] = cookie.value
+        assert routed(request)[0] == 'default'
+
+    def test_lagging_or_down_replica_skipped(self, replicas):
+        """Отстающая или упавшая реплика пропускается"""
+        replicas['replica_1'] = 60
+        replicas['replica_2'] = None
+
+        assert routed(RequestFactory().get('/'))[0] == 'default'
+
+        health.reset()
+        replicas['replica_2'] = 0
+        assert {routed(RequestFactory().get('/'))[0] for _ in range(4)} == {'replica_2'}
+
+    def test_retry_on_primary_when_replica_fails(self, replicas):
+        """Ошибка реплики посреди запроса - запрос повторяется на основной базе"""
+        calls = []
+        middleware = None
+
+        def view(request):
+            alias = ReplicaRouter().db_for_read(Hotels)
+            calls.append(alias)
+            if alias != 'default':
+                middleware.process_exception(request, OperationalError('server closed the connection'))
+                return HttpResponse(status=500)
+            return HttpResponse(alias)
+
+        middleware = ReplicaRoutingMiddleware(view)
+        response = middleware(RequestFactory().get('/'))
+
+        assert response.content == b'default'
+        assert calls[0].startswith('replica_') and calls[1] == 'default'
+        assert calls[0] in health.down
+
+
+@pytest.mark.skipif(not settings.DATABASE_REPLICAS, reason='DB_REPLICA_HOSTS не задан')
+@pytest.mark.django_db(transaction=True, databases='__all__')
+class TestReplicaDatabases:
+    """Сквозной тест c настоящей репликой (DB_REPLICA_HOSTS)"""
+
+    def test_reads_from_replica_until_write(self, api_client, hotel, hotel_data):
+        """Чтения идут на реплику, после записи клиент читает c основной базы"""
+        health.reset()
+        replica = CaptureQueriesContext(connections[settings.DATABASE_REPLICAS[0]])
+        primary = CaptureQueriesContext(connections['default'])
+        with replica, primary:
+            response = api_client.get(reverse('hotel-list'), {'ordering': '-created_at'})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(replica) > 0 and len(primary) == 0
+
+        assert api_client.post(reverse('hotel-list'), hotel_data, format='json').status_code == 201
+        with replica, primary:
+            response = api_client.get(reverse('hotel-list'), {'ordering': '-created_at'})
+        assert response.data['results'][0]['name'] == hotel_data['name']
+        assert len(replica) == 0 and len(primary) > 0
+
+
+@pytest.fixture
+def shards(settings):
+    settings.DATABASE_SHARDS = ['shard_1', 'shard_2']
+    return settings.DATABASE_SHARDS
+
+
+class TestShardRouter:
+    """Тесты выбора шарда по отелю"""
+
+    def test_disabled_without_shards(self):
+        """Без DATABASE_SHARDS роутер ничего не решает"""
+        assert ShardRouter().db_for_read(Hotels) is None
+        assert sharding.scatter(Hotels.objects.all()).db == 'default'
+
+    def test_routes_by_context_and_instance(self, shards):
+        """Шард берется из объекта, затем из запроса; гости остаются в общей базе"""
+        router = ShardRouter()
+        room = Rooms(id=1)
+        room._state.db = 'shard_2'
+
+        with sharding.use_shard('shard_1'):
+            assert router.db_for_read(Hotels) == 'shard_1'
+            assert router.db_for_write(Bookings, instance=room) == 'shard_2'
+            assert router.db_for_read(Guests) is None
+        with pytest.raises(sharding.ShardNotSelected):
+            router.db_for_read(Rooms)
+
+    def test_relations_only_within_shard(self, shards):
+        """Связь между объектами разных шардов запрещена, c гостем - разрешена"""
+        hotel, room, guest = Hotels(id=1), Rooms(id=1), Guests(id=1)
+        hotel._state.db, room._state.db, guest._state.db = 'shard_1', 'shard_2', 'default'
+        router = ShardRouter()
+
+        assert router.allow_relation(hotel, room) is False
+        assert router.allow_relation(room, guest) is None
+        room._state.db = 'shard_1'
+        assert router.allow_relation(hotel, room) is True
+
+    def test_expand_guest_without_join(self, shards):
+        """select_related не пересекает границу шарда и общей базы"""
+        assert sharding.joinable(Bookings, 'room__hotel')
+        assert not sharding.joinable(Bookings, 'guest')
+
+
+@pytest.mark.django_db
+class TestScatterQuerySet:
+    """Слияние результатов по шардам (оба "шарда" - одна база)"""
+
+    def test_merge_slice_and_aggregate(self, hotel, hotel_with_low_rating):
+        queryset = Hotels.objects.using('default')
+        scattered = sharding.ScatterQuerySet([queryset, queryset])
+        ids = sorted([hotel.id, hotel_with_low_rating.id] * 2, reverse=True)
+
+        assert [row.id for row in scattered.order_by('-id')] == ids
+        assert list(scattered.order_by('-id').values_list('id', flat=True)[1:3]) == ids[1:3]
+        assert [row['id'] for row in scattered.values('id', 'star_rating').order_by('star_rating', 'id')] == [
+            hotel_with_low_rating.id, hotel_with_low_rating.id, hotel.id, hotel.id,
+        ]
+        with pytest.raises(TypeError):
+            list(scattered.values('id').order_by('star_rating'))
+        assert scattered.count() == 4
+        assert scattered.aggregate(count=Count('pk'), top=Max('star_rating')) == {'count': 4, 'top': 5}
+        assert scattered.first().id == min(ids)
+        with pytest.raises(Hotels.MultipleObjectsReturned):
+            scattered.get(pk=hotel.id)
+
+    def test_iterator_merges_order(self, hotel, hotel_with_low_rating):
+        """Потоковое чтение сливает шарды по order_by, в том числе по убыванию строк"""
+        queryset = Hotels.objects.using('default')
+        scattered = sharding.ScatterQuerySet([queryset, queryset])
+        names = sorted([hotel.name, hotel_with_low_rating.name] * 2, reverse=True)
+
+        rows = scattered.order_by('-name', 'id').values_list('name', 'id').iterator(chunk_size=1)
+        assert [name for name, _ in rows] == names
+        assert list(scattered.order_by('id').values_list('id', flat=True)[1:3].iterator()) == sorted(
+            [hotel.id, hotel_with_low_rating.id] * 2
+        )[1:3]
+
+
+def on_shard(alias, model, **filters):
+    return model._base_manager.using(alias).filter(**filters)
+
+
+@pytest.mark.sharded
+@pytest.mark.skipif(len(settings.DATABASE_SHARDS) < 2, reason='DB_SHARDS не задан')
+@pytest.mark.django_db(transaction=True, databases='__all__')
+class TestShardedDatabases:
+    """Сквозные тесты на настоящих шардах (DB_SHARDS, минимум два)"""
+
+    def create_hotels(self, api_client, hotel_data):
+        ids = []
+        for name in ('Север', 'Юг'):
+            response = api_client.post(reverse('hotel-list'), {**hotel_data, 'name': name}, format='json')
+            assert response.status_code == status.HTTP_201_CREATED
+            ids.append(response.data['id'])
+        return ids
+
+    def create_booking(self, api_client, hotel_id, guest_data):
+        room_type = api_client.post(reverse('room_types-list'), {
+            'hotel': hotel_id, 'name': 'Стандарт', 'description': '-', 'base_price': '100.00', 'max_guests': 2,
+        }, format='json').data['id']
+        room = api_client.post(reverse('rooms-list'), {
+            'hotel': hotel_id, 'type': room_type, 'room_number': '101', 'floor': 1,
+        }, format='json').data['id']
+        guest = api_client.post(reverse('guests-list'), guest_data, format='json').data['id']
+        check_in = date.today() + timedelta(days=3)
+        response = api_client.post(reverse('bookings-list'), {
+            'guest': guest, 'room': room, 'check_in_date': check_in.isoformat(),
+            'check_out_date': (check_in + timedelta(days=2)).isoformat(), 'status': 'confirmed',
+        }, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        return room, response.data['id']
+
+    def test_hotels_spread_and_scatter_reads(self, api_client, hotel_data):
+        """Отели раскладываются по шардам c непересекающимися id, список собирается со всех шардов"""
+        first, second = self.create_hotels(api_client, hotel_data)
+
+        assert dict(Hotel_shards.objects.values_list('hotel_id', 'shard')) == {first: 'shard_1', second: 'shard_2'}
+        assert second >= sharding.ID_RANGE
+        response = api_client.get(reverse('hotel-list'), {'ordering': '-id'})
+        assert [row['id'] for row in response.data['results']] == [second, first]
+        assert api_client.get(reverse('hotel-detail', kwargs={'pk': second})).data['name'] == 'Юг'
+        response = api_client.get(reverse('async-hotel-list'), {'page_size': 1})
+        assert [row['id'] for row in response.json()['results']] == [first]
+        assert api_client.get(response.json()['next']).json()['results'][0]['id'] == second
+        facets = api_client.get(reverse('hotel-search')).json()
+        assert facets['count'] == 2
+        assert facets['facets']['city'] == [{'value': hotel_data['city'], 'count': 2}]
+
+    def test_export_keeps_ordering(self, api_client, hotel_data, guest_data):
+        """Выгрузка по всем шардам идет в порядке ?ordering="""
+        bookings = []
+        for n, hotel_id in enumerate(self.create_hotels(api_client, hotel_data)):
+            guest = {**guest_data, 'email': f'guest{n}@example.com', 'passport': f'EF000000{n}'}
+            bookings.append(self.create_booking(api_client, hotel_id, guest)[1])
+
+        for ordering in ('id', '-id'):
+            response = api_client.get(reverse('bookings-export'), {'format': 'ndjson', 'ordering': ordering})
+            rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+            assert [row['id'] for row in rows] == sorted(bookings, reverse=ordering == '-id')
+
+    def test_dependent_rows_follow_hotel(self, api_client, hotel_data, guest_data):
+        """Комнаты и бронирования пишутся на шард отеля, гости - в общую базу"""
+        _, hotel_id = self.create_hotels(api_client, hotel_data)
+        room, booking = self.create_booking(api_client, hotel_id, guest_data)
+
+        assert on_shard('shard_2', Bookings, pk=booking).exists()
+        assert not on_shard('shard_1', Bookings).exists()
+        assert on_shard('shard_2', Room_nights, booking=booking).count() == 2
+        assert Guests.objects.count() == 1 and not on_shard('shard_2', Guests).exists()
+
+        response = api_client.get(reverse('bookings-list'), {'expand': 'guest,room'})
+        assert response.data['results'][0]['guest']['first_name'] == guest_data['first_name']
+        response = api_client.patch(reverse('bookings-detail', kwargs={'pk': booking}), {'status': 'cancelled'},
+                                    format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert not on_shard('shard_2', Room_nights, booking=booking).exists()
+        response = api_client.get(reverse('rooms-search'), {
+            'check_in': date.today().isoformat(), 'check_out': (date.today() + timedelta(days=1)).isoformat(),
+        })
+        assert [row['id'] for row in response.data['results']] == [room]
+
+    def test_guest_constraint_only_off_shards(self):
+        """Внешний ключ на гостя снят только на шардах"""
+        def has_guest_constraint(alias):
+            connection = connections[alias]
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, Bookings._meta.db_table)
+            return any(c['foreign_key'] and c['columns'] == ['guest_id'] for c in constraints.values())
+
+        assert has_guest_constraint('default')
+        assert not any(has_guest_constraint(alias) for alias in settings.DATABASE_SHARDS)
+
+    def test_cross_shard_bulk_rejected(self, api_client, hotel_data):
+        """Пакет c комнатами отелей разных шардов не принимается"""
+        hotels = self.create_hotels(api_client, hotel_data)
+        rows = [{'hotel': pk, 'type': 1, 'room_number': '1', 'floor': 1} for pk in hotels]
+
+        response = api_client.post(reverse('rooms-list'), rows, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_rebalance_moves_hotel(self, api_client, hotel_data, guest_data):
+        """Перенос отеля копирует его строки, пересобирает календарь и переключает каталог"""
+        _, hotel_id = self.create_hotels(api_client, hotel_data)
+        room, booking = self.create_booking(api_client, hotel_id, guest_data)
+
+        call_command('rebalance_shards', hotel=[hotel_id], to='shard_1', stdout=StringIO())
+
+        assert Hotel_shards.objects.get(hotel_id=hotel_id).shard == 'shard_1'
+        assert not on_shard('shard_2', Hotels, pk=hotel_id).exists()
+        assert on_shard('shard_1', Room_nights, booking=booking).count() == 2
+        assert api_client.get(reverse('bookings-detail', kwargs={'pk': booking})).data['room'] == room
+
+        Hotel_shards.objects.filter(hotel_id=hotel_id).update(moving=True)
+        response = api_client.patch(reverse('hotel-detail', kwargs={'pk': hotel_id}), {'name': 'Х'}, format='json')
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+    def test_rebalance_evens_out_shards(self, api_client, hotel_data):
+        """Без --hotel команда выравнивает число отелей на шардах"""
+        self.create_hotels(api_client, hotel_data)
+        first, _ = self.create_hotels(api_client, hotel_data)
+        call_command('rebalance_shards', hotel=[first], to='shard_2', stdout=StringIO())
+
+        call_command('rebalance_shards', stdout=StringIO())
+
+        counts = Counter(Hotel_shards.objects.values_list('shard', flat=True))
+        assert counts == {'shard_1': 2, 'shard_2': 2}
@@ -1,8 +1,9 @@
 import pytest
 from datetime import date, timedelta
 from decimal import Decimal
+from django.db import connections
 from django.db.utils import IntegrityError
-from room.models import Hotels, Room_types, Rooms, Guests, Bookings
+from room.models import Hotels, Room_types, Rooms, Guests, Bookings, Room_nights, Daily_stats
 
 
 @pytest.mark.django_db
@@ -220,6 +221,110 @@ class TestBookingsModel:
         
         assert booking in booking.guest.bookings_set.all()
         assert booking in booking.room.bookings_set.all()
+    
+    def test_overlapping_booking_rejected_by_database(self, booking, another_guest):
+        """Пересекающееся бронирование той же комнаты отклоняется базой"""
+        with pytest.raises(IntegrityError):
+            Bookings.objects.create(
+                guest=another_guest,
+                room=booking.room,
+                check_in_date=booking.check_in_date + timedelta(days=1),
+                check_out_date=booking.check_out_date + timedelta(days=1),
+                status='confirmed'
+            )
+    
+    def test_cancelled_booking_does_not_block(self, booking, another_guest):
+        """Отмененное бронирование не мешает новому"""
+        Bookings.objects.filter(pk=booking.pk).update(status='cancelled')
+        new_booking = Bookings.objects.create(
+            guest=another_guest,
+            room=booking.room,
+            check_in_date=booking.check_in_date,
+            check_out_date=booking.check_out_date,
+            status='confirmed'
+        )
+        assert new_booking.pk is not None
+
+
+@pytest.mark.django_db
+class TestRoomNightsModel:
+    """Тесты календаря занятости по ночам"""
+    
+    def nights(self, room):
+        return list(Room_nights.objects.filter(room=room).order_by('date').values_list('date', flat=True))
+    
+    def test_booking_fills_nights(self, booking):
+        """Бронирование занимает по одной строке на каждую ночь"""
+        assert self.nights(booking.room) == [booking.check_in_date + timedelta(days=n) for n in range(3)]
+        assert Room_nights.objects.filter(booking=booking, hotel=booking.room.hotel).count() == 3
+    
+    def test_change_dates_moves_nights(self, booking):
+        """Изменение дат переносит ночи"""
+        booking.check_in_date += timedelta(days=10)
+        booking.check_out_date = booking.check_in_date + timedelta(days=1)
+        booking.save()
+        
+        assert self.nights(booking.room) == [booking.check_in_date]
+    
+    def test_cancel_and_delete_free_nights(self, booking):
+        """Отмена и удаление освобождают ночи"""
+        Bookings.objects.filter(pk=booking.pk).update(status='cancelled')
+        assert self.nights(booking.room) == []
+        
+        Bookings.objects.filter(pk=booking.pk).update(status='confirmed')
+        assert len(self.nights(booking.room)) == 3
+        booking.delete()
+        assert self.nights(booking.room) == []
+    
+    def test_night_cannot_be_sold_twice(self, booking):
+        """Уникальность комнаты и ночи запрещает двойную продажу"""
+        with pytest.raises(IntegrityError):
+            Room_nights.objects.create(
+                room=booking.room, hotel=booking.room.hotel, booking=booking, date=booking.check_in_date
+            )
+    
+    def test_room_moved_to_another_hotel(self, booking, hotel_with_low_rating):
+        """Перенос комнаты в другой отель переносит ее ночи"""
+        Rooms.objects.filter(pk=booking.room_id).update(hotel=hotel_with_low_rating)
+        
+        assert Room_nights.objects.filter(hotel=hotel_with_low_rating).count() == 3
+
+
+@pytest.mark.django_db
+class TestDailyStatsModel:
+    """Тесты дневной статистики, которую ведут триггеры"""
+    
+    def stats(self, **filters):
+        return list(Daily_stats.objects.filter(**filters).order_by('date').values_list('room_type', 'rooms_sold'))
+    
+    def test_cancel_removes_rows(self, booking):
+        """Отмена бронирования удаляет обнулившиеся строки"""
+        assert self.stats() == [(booking.room.type_id, 1)] * 3
+        
+        Bookings.objects.filter(pk=booking.pk).update(status='cancelled')
+        assert self.stats() == []
+    
+    def test_room_moved_to_another_type(self, booking, economy_room_type):
+        """Перенос комнаты в другой тип переносит ее ночи, отмена после переноса их снимает"""
+        Rooms.objects.filter(pk=booking.room_id).update(type=economy_room_type)
+        assert self.stats() == [(economy_room_type.id, 1)] * 3
+        
+        Bookings.objects.filter(pk=booking.pk).update(status='cancelled')
+        assert self.stats() == []
+    
+    def test_room_moved_to_another_hotel(self, booking, hotel_with_low_rating):
+        """Перенос комнаты в другой отель переносит ее ночи"""
+        Rooms.objects.filter(pk=booking.room_id).update(hotel=hotel_with_low_rating)
+        
+        assert self.stats(hotel=hotel_with_low_rating) == [(booking.room.type_id, 1)] * 3
+        assert self.stats(hotel=booking.room.hotel) == []
+    
+    def test_delete_hotel_with_bookings(self, booking):
+        """Каскадное удаление отеля не оставляет строк статистики"""
+        booking.room.hotel.delete()
+        connections[booking._state.db].check_constraints()
+        
+        assert self.stats() == []
 
 
 @pytest.mark.django_db
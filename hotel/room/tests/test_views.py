@@ -1,10 +1,23 @@
 from django.forms import ValidationError
+import csv
+import json
 import pytest
-from datetime import date, timedelta
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
 from decimal import Decimal
+from django.core.cache import caches
+from django.db import connections
+from django.db.models import TextField
+from django.db.models.functions import Cast
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
-from room.models import Hotels, Room_types, Rooms, Guests, Bookings
+from prometheus_client import REGISTRY
+from room import availability, metrics, pricing, timing
+from room.cache import invalidate, local_cache
+from room.converter import fast_reader
+from room.views import HotelsViewSet
+from room.models import Hotels, Room_types, Rooms, Guests, Bookings, Rate_overrides, Stay_discounts
 
 
 @pytest.mark.django_db
@@ -17,9 +30,9 @@ class TestHotelsViewSet:
         response = api_client.get(url)
         
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) >= 2
+        assert len(response.data['results']) >= 2
         
-        hotel_data = next((h for h in response.data if h['id'] == hotel.id), None)
+        hotel_data = next((h for h in response.data['results'] if h['id'] == hotel.id), None)
         assert hotel_data is not None
         assert hotel_data['name'] == hotel.name
         assert hotel_data['star_rating'] == hotel.star_rating
@@ -63,6 +76,15 @@ class TestHotelsViewSet:
         assert response.status_code == status.HTTP_204_NO_CONTENT
         assert not Hotels.objects.filter(pk=hotel.pk).exists()
     
+    @pytest.mark.django_db(transaction=True)
+    def test_delete_hotel_with_bookings(self, api_client, booking):
+        """DELETE отеля c бронированиями: каскад не оставляет статистику удаленного отеля"""
+        url = reverse('hotel-detail', kwargs={'pk': booking.room.hotel_id})
+        response = api_client.delete(url)
+        
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert not Hotels.objects.filter(pk=booking.room.hotel_id).exists()
+    
     def test_hotel_room_types_action(self, api_client, hotel, room_type, economy_room_type):
         """GET /api/v1/hotels/{id}/room_types/"""
         url = reverse('hotel-room-types', kwargs={'pk': hotel.pk})
@@ -91,7 +113,7 @@ class TestHotelsViewSet:
         
         response = api_client.get(url, {'country': hotel.country})
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) >= 1
+        assert len(response.data['results']) >= 1
     
     def test_hotel_filter_by_star_rating(self, api_client, hotel, hotel_with_low_rating):
         """Фильтрация отелей по звездному рейтингу"""
@@ -101,7 +123,7 @@ class TestHotelsViewSet:
         assert response.status_code == status.HTTP_200_OK
 
 
-        hotel_ids = [h['id'] for h in response.data]
+        hotel_ids = [h['id'] for h in response.data['results']]
         assert hotel.id in hotel_ids
         assert hotel_with_low_rating.id not in hotel_ids
     
@@ -121,6 +143,79 @@ class TestHotelsViewSet:
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert 'name' in response.data or 'phone' in response.data or 'star_rating' in response.data
 
+    def test_calendar(self, api_client, booking, unavailable_room):
+        """Календарь отеля считает занятые и свободные комнаты по ночам"""
+        start = booking.check_in_date - timedelta(days=1)
+        url = reverse('hotel-calendar', kwargs={'pk': booking.room.hotel_id})
+        response = api_client.get(url, {'start': start, 'end': start + timedelta(days=5)})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['rooms'] == 1
+        assert [night['booked'] for night in response.data['nights']] == [0, 1, 1, 1, 0]
+        assert [night['free'] for night in response.data['nights']] == [1, 0, 0, 0, 1]
+        assert response.data['nights'][1]['date'] == booking.check_in_date
+    
+    def test_calendar_skips_unavailable_rooms(self, api_client, booking, room_type, django_assert_num_queries):
+        """Ночи снятой с продажи комнаты не считаются, календарь читается без соединения с комнатами"""
+        Rooms.objects.create(hotel=booking.room.hotel, type=room_type, room_number='302', floor=3)
+        Rooms.objects.filter(pk=booking.room_id).update(is_available=False)
+        url = reverse('hotel-calendar', kwargs={'pk': booking.room.hotel_id})
+        
+        with django_assert_num_queries(3) as captured:
+            response = api_client.get(url, {'start': booking.check_in_date, 'end': booking.check_out_date})
+        
+        assert response.data['rooms'] == 1
+        assert [night['booked'] for night in response.data['nights']] == [0, 0, 0]
+        assert 'room_rooms' not in captured.captured_queries[-1]['sql']
+    
+    def test_calendar_invalid_period(self, api_client, hotel):
+        """Календарь не принимает пустой и слишком длинный период"""
+        url = reverse('hotel-calendar', kwargs={'pk': hotel.id})
+        
+        assert api_client.get(url, {'start': '2031-01-02', 'end': '2031-01-01'}).status_code == status.HTTP_400_BAD_REQUEST
+        assert api_client.get(url, {'start': '2031-01-01', 'end': '2032-06-01'}).status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_stats(self, api_client, booking, unavailable_room):
+        """Загрузка, ADR и RevPAR по дням из дневной статистики"""
+        start = booking.check_in_date - timedelta(days=1)
+        url = reverse('hotel-stats', kwargs={'pk': booking.room.hotel_id})
+        response = api_client.get(url, {'from': start, 'to': start + timedelta(days=4)})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['rooms'] == 1
+        assert [day['rooms_sold'] for day in response.data['days']] == [0, 1, 1, 1, 0]
+        assert response.data['days'][1] == {
+            'date': booking.check_in_date.isoformat(), 'rooms_sold': 1, 'revenue': '250.00',
+            'occupancy': '100.00', 'adr': '250.00', 'revpar': '250.00',
+        }
+        assert response.data['days'][0]['adr'] is None
+        assert response.data['total'] == {
+            'rooms_sold': 3, 'revenue': '750.00', 'occupancy': '60.00', 'adr': '250.00', 'revpar': '150.00',
+        }
+    
+    def test_stats_follow_booking_writes(self, api_client, booking):
+        """Статистика пересчитывается при изменении и отмене брони"""
+        url = reverse('hotel-stats', kwargs={'pk': booking.room.hotel_id})
+        params = {'from': booking.check_in_date, 'to': booking.check_in_date + timedelta(days=10)}
+        
+        Bookings.objects.filter(pk=booking.pk).update(total_price=Decimal('1500.00'))
+        assert api_client.get(url, params).data['total']['revenue'] == '1500.00'
+        
+        booking.check_out_date += timedelta(days=2)
+        booking.save()
+        assert api_client.get(url, params).data['total']['rooms_sold'] == 5
+        
+        Bookings.objects.filter(pk=booking.pk).update(status='cancelled')
+        assert api_client.get(url, params).data['total']['rooms_sold'] == 0
+        assert api_client.get(url, params).data['total']['revenue'] == '0.00'
+    
+    def test_stats_invalid_period(self, api_client, hotel):
+        """Период c концом раньше начала отклоняется"""
+        url = reverse('hotel-stats', kwargs={'pk': hotel.id})
+        
+        assert api_client.get(url, {'from': '2031-01-02', 'to': '2031-01-01'}).status_code == status.HTTP_400_BAD_REQUEST
+        assert api_client.get(url, {'from': '2031-01-02'}).status_code == status.HTTP_400_BAD_REQUEST
+
 
 @pytest.mark.django_db
 class TestRoomTypesViewSet:
@@ -132,7 +227,7 @@ class TestRoomTypesViewSet:
         response = api_client.get(url)
         
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) >= 2
+        assert len(response.data['results']) >= 2
     
     def test_retrieve_room_type(self, api_client, room_type):
         """GET /api/v1/room_types/{id}/ - получение конкретного типа"""
@@ -201,9 +296,9 @@ class TestRoomTypesViewSet:
         
         response = api_client.get(url, {'hotel': hotel.id})
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) >= 2
+        assert len(response.data['results']) >= 2
         
-        type_ids = [rt['id'] for rt in response.data]
+        type_ids = [rt['id'] for rt in response.data['results']]
         assert room_type.id in type_ids
         assert economy_room_type.id in type_ids
 
@@ -218,7 +313,7 @@ class TestRoomsViewSet:
         response = api_client.get(url)
         
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) >= 2
+        assert len(response.data['results']) >= 2
     
     def test_retrieve_room(self, api_client, room):
         """GET /api/v1/rooms/{id}/ - получение конкретной комнаты"""
@@ -267,7 +362,7 @@ class TestRoomsViewSet:
         response = api_client.get(url, {'is_available': 'true'})
         assert response.status_code == status.HTTP_200_OK
         
-        available_rooms = [r for r in response.data if r['is_available']]
+        available_rooms = [r for r in response.data['results'] if r['is_available']]
         assert len(available_rooms) >= 1
         assert any(r['id'] == room.id for r in available_rooms)
         assert not any(r['id'] == unavailable_room.id for r in available_rooms)
@@ -278,11 +373,68 @@ class TestRoomsViewSet:
         
         response = api_client.get(url, {'hotel': hotel.id})
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) >= 2
+        assert len(response.data['results']) >= 2
         
-        room_ids = [r['id'] for r in response.data]
+        room_ids = [r['id'] for r in response.data['results']]
         assert room.id in room_ids
         assert unavailable_room.id in room_ids
+    
+    def test_available_rooms_excludes_overlapping(self, api_client, hotel, room_type, booking, unavailable_room):
+        """GET /api/v1/rooms/available/ - занятые и недоступные комнаты исключаются"""
+        free_room = Rooms.objects.create(hotel=hotel, type=room_type, room_number='303', floor=3)
+        url = reverse('rooms-available')
+        response = api_client.get(url, {
+            'hotel': hotel.id,
+            'check_in': (booking.check_in_date + timedelta(days=1)).isoformat(),
+            'check_out': (booking.check_out_date + timedelta(days=2)).isoformat(),
+        })
+        
+        assert response.status_code == status.HTTP_200_OK
+        room_ids = [r['id'] for r in response.data['results']]
+        assert room_ids == [free_room.id]
+    
+    def test_available_rooms_back_to_back(self, api_client, booking):
+        """Заезд в день выезда предыдущего гостя не считается пересечением"""
+        url = reverse('rooms-available')
+        response = api_client.get(url, {
+            'check_in': booking.check_out_date.isoformat(),
+            'check_out': (booking.check_out_date + timedelta(days=2)).isoformat(),
+        })
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert any(r['id'] == booking.room_id for r in response.data['results'])
+    
+    def test_available_rooms_ignores_cancelled(self, api_client, booking):
+        """Отмененные бронирования не блокируют комнату"""
+        Bookings.objects.filter(pk=booking.pk).update(status='cancelled')
+        url = reverse('rooms-available')
+        response = api_client.get(url, {
+            'check_in': booking.check_in_date.isoformat(),
+            'check_out': booking.check_out_date.isoformat(),
+        })
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert any(r['id'] == booking.room_id for r in response.data['results'])
+    
+    def test_available_rooms_by_guests(self, api_client, room):
+        """Фильтрация по вместимости типа комнаты"""
+        url = reverse('rooms-available')
+        check_in = date.today() + timedelta(days=30)
+        params = {'check_in': check_in.isoformat(), 'check_out': (check_in + timedelta(days=2)).isoformat()}
+        
+        response = api_client.get(url, {**params, 'guests': room.type.max_guests})
+        assert [r['id'] for r in response.data['results']] == [room.id]
+        
+        response = api_client.get(url, {**params, 'guests': room.type.max_guests + 1})
+        assert response.data['results'] == []
+    
+    def test_available_rooms_invalid_dates(self, api_client):
+        """Некорректный диапазон дат"""
+        url = reverse('rooms-available')
+        response = api_client.get(url, {'check_in': '2030-01-05', 'check_out': '2030-01-01'})
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'check_out' in response.data
 
 
 @pytest.mark.django_db
@@ -295,7 +447,7 @@ class TestGuestsViewSet:
         response = api_client.get(url)
         
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) >= 2
+        assert len(response.data['results']) >= 2
     
     def test_retrieve_guest(self, api_client, guest):
         """GET /api/v1/guests/{id}/ - получение конкретного гостя"""
@@ -344,11 +496,11 @@ class TestGuestsViewSet:
         
         response = api_client.get(url, {'first_name': guest.first_name})
         assert response.status_code == status.HTTP_200_OK
-        assert any(g['id'] == guest.id for g in response.data)
+        assert any(g['id'] == guest.id for g in response.data['results'])
         
         response = api_client.get(url, {'last_name': guest.last_name})
         assert response.status_code == status.HTTP_200_OK
-        assert any(g['id'] == guest.id for g in response.data)
+        assert any(g['id'] == guest.id for g in response.data['results'])
     
 
 
@@ -363,7 +515,7 @@ class TestBookingsViewSet:
         response = api_client.get(url)
         
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) >= 1
+        assert len(response.data['results']) >= 1
     
     def test_retrieve_booking(self, api_client, booking):
         """GET /api/v1/bookings/{id}/ - получение конкретного бронирования"""
@@ -393,6 +545,98 @@ class TestBookingsViewSet:
         ).first()
         assert new_booking is not None
     
+    def test_list_bookings_cursor_pagination(self, api_client, guest, room):
+        """Курсорная пагинация списка бронирований"""
+        check_in = date.today() + timedelta(days=1)
+        for i in range(5):
+            Bookings.objects.create(
+                guest=guest,
+                room=room,
+                check_in_date=check_in + timedelta(days=2 * i),
+                check_out_date=check_in + timedelta(days=2 * i + 1),
+                status='confirmed'
+            )
+        url = reverse('bookings-list')
+        
+        seen = []
+        response = api_client.get(url, {'page_size': 2, 'ordering': '-check_in_date'})
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            assert len(response.data['results']) <= 2
+            seen.extend(b['check_in_date'] for b in response.data['results'])
+            if response.data['next'] is None:
+                break
+            response = api_client.get(response.data['next'])
+        
+        assert len(seen) == 5
+        assert seen == sorted(seen, reverse=True)
+    
+    def test_list_bookings_estimated_count(self, api_client, booking):
+        """Оценка общего количества по статистике планировщика"""
+        url = reverse('bookings-list')
+        
+        response = api_client.get(url)
+        assert 'estimated_count' not in response.data
+        
+        response = api_client.get(url, {'estimate': 'true'})
+        assert response.status_code == status.HTTP_200_OK
+        assert isinstance(response.data['estimated_count'], int)
+    
+    def test_list_bookings_estimated_count_not_postgresql(self, api_client, booking, monkeypatch):
+        """На СУБД без EXPLAIN (FORMAT JSON) оценка не отдается"""
+        for alias in connections:
+            monkeypatch.setattr(connections[alias], 'vendor', 'sqlite')
+        url = reverse('bookings-list')
+        
+        response = api_client.get(url, {'estimate': 'true'})
+        assert response.status_code == status.HTTP_200_OK
+        assert 'estimated_count' not in response.data
+    
+    def test_create_overlapping_booking_conflict(self, api_client, booking, another_guest):
+        """POST пересекающегося бронирования той же комнаты - 409"""
+        url = reverse('bookings-list')
+        response = api_client.post(url, {
+            'guest': another_guest.id,
+            'room': booking.room_id,
+            'check_in_date': (booking.check_in_date + timedelta(days=1)).isoformat(),
+            'check_out_date': (booking.check_out_date + timedelta(days=1)).isoformat(),
+            'total_price': '500.00',
+            'status': 'pending'
+        }, format='json')
+        
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert Bookings.objects.filter(room=booking.room).count() == 1
+    
+    def test_create_booking_other_room_same_dates(self, api_client, booking, another_guest, unavailable_room):
+        """Те же даты в другой комнате не конфликтуют"""
+        url = reverse('bookings-list')
+        response = api_client.post(url, {
+            'guest': another_guest.id,
+            'room': unavailable_room.id,
+            'check_in_date': booking.check_in_date.isoformat(),
+            'check_out_date': booking.check_out_date.isoformat(),
+            'total_price': '500.00',
+            'status': 'pending'
+        }, format='json')
+        
+        assert response.status_code == status.HTTP_201_CREATED
+    
+    def test_update_booking_into_overlap_conflict(self, api_client, booking, another_guest):
+        """PATCH, создающий пересечение, - 409"""
+        later = Bookings.objects.create(
+            guest=another_guest,
+            room=booking.room,
+            check_in_date=booking.check_out_date,
+            check_out_date=booking.check_out_date + timedelta(days=2),
+            status='confirmed'
+        )
+        url = reverse('bookings-detail', kwargs={'pk': later.pk})
+        response = api_client.patch(url, {'check_in_date': booking.check_in_date.isoformat()}, format='json')
+        
+        assert response.status_code == status.HTTP_409_CONFLICT
+        later.refresh_from_db()
+        assert later.check_in_date == booking.check_out_date
+    
     def test_update_booking(self, api_client, booking):
         """PATCH /api/v1/bookings/{id}/ - обновление бронирования"""
         url = reverse('bookings-detail', kwargs={'pk': booking.pk})
@@ -419,7 +663,7 @@ class TestBookingsViewSet:
         response = api_client.get(url, {'status': 'confirmed'})
         assert response.status_code == status.HTTP_200_OK
         
-        confirmed_bookings = [b for b in response.data]
+        confirmed_bookings = [b for b in response.data['results']]
         assert len(confirmed_bookings) >= 1
         assert any(b['id'] == booking.id for b in confirmed_bookings)
     
@@ -445,4 +689,1120 @@ class TestBookingsViewSet:
         with pytest.raises(ValidationError):
             api_client.post(url, past_date_data, format='json')
         
-            
\ No newline at end of file
+            
+
+@pytest.mark.django_db
+class TestBulkEndpoints:
+    """Тесты массового создания и обновления"""
+    
+    def test_bulk_create_rooms(self, api_client, hotel, room_type, django_assert_max_num_queries):
+        """POST /api/v1/rooms/ со списком - одна вставка на весь пакет"""
+        url = reverse('rooms-list')
+        payload = [
+            {'hotel': hotel.id, 'type': room_type.id, 'room_number': str(500 + i), 'floor': 5}
+            for i in range(50)
+        ]
+        with django_assert_max_num_queries(6):
+            response = api_client.post(url, payload, format='json')
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        assert len(response.data['results']) == 50
+        assert response.data['errors'] == []
+        assert Rooms.objects.filter(floor=5).count() == 50
+    
+    def test_bulk_create_guests_partial_errors(self, api_client, guest_data):
+        """Ошибочные строки возвращаются с индексом, корректные сохраняются"""
+        url = reverse('guests-list')
+        payload = [guest_data, {**guest_data, 'email': 'not-an-email'}, {**guest_data, 'passport': 'ZZ0000001'}]
+        response = api_client.post(url, payload, format='json')
+        
+        assert response.status_code == status.HTTP_207_MULTI_STATUS
+        assert len(response.data['results']) == 2
+        assert [e['index'] for e in response.data['errors']] == [1]
+        assert 'email' in response.data['errors'][0]['errors']
+        assert Guests.objects.filter(email=guest_data['email']).count() == 2
+    
+    def test_bulk_create_bookings_overlap_and_dates(self, api_client, booking, another_guest, unavailable_room):
+        """Пересечения и некорректные даты отклоняются построчно"""
+        url = reverse('bookings-list')
+        start = booking.check_out_date
+        row = {
+            'guest': another_guest.id,
+            'room': unavailable_room.id,
+            'total_price': '100.00',
+            'status': 'confirmed'
+        }
+        payload = [
+            {**row, 'check_in_date': start.isoformat(), 'check_out_date': (start + timedelta(days=2)).isoformat()},
+            {**row, 'check_in_date': (start + timedelta(days=1)).isoformat(), 'check_out_date': (start + timedelta(days=3)).isoformat()},
+            {**row, 'room': booking.room_id, 'check_in_date': booking.check_in_date.isoformat(), 'check_out_date': start.isoformat()},
+            {**row, 'check_in_date': (start + timedelta(days=5)).isoformat(), 'check_out_date': (start + timedelta(days=4)).isoformat()},
+        ]
+        response = api_client.post(url, payload, format='json')
+        
+        assert response.status_code == status.HTTP_207_MULTI_STATUS
+        assert len(response.data['results']) == 1
+        assert [e['index'] for e in response.data['errors']] == [1, 2, 3]
+        assert 'check_out_date' in response.data['errors'][2]['errors']
+    
+    def test_bulk_create_bookings_unknown_room(self, api_client, another_guest):
+        """Несуществующая комната - ошибка строки, ничего не сохраняется"""
+        url = reverse('bookings-list')
+        check_in = date.today() + timedelta(days=3)
+        payload = [{
+            'guest': another_guest.id,
+            'room': 99999,
+            'check_in_date': check_in.isoformat(),
+            'check_out_date': (check_in + timedelta(days=1)).isoformat(),
+            'status': 'confirmed'
+        }]
+        response = api_client.post(url, payload, format='json')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'room' in response.data['errors'][0]['errors']
+        assert not Bookings.objects.exists()
+    
+    def test_bulk_partial_update_rooms(self, api_client, room, unavailable_room):
+        """PATCH /api/v1/rooms/ со списком - массовое обновление"""
+        url = reverse('rooms-list')
+        payload = [
+            {'id': room.id, 'floor': 7},
+            {'id': unavailable_room.id, 'is_available': True},
+            {'id': 99999, 'floor': 1},
+        ]
+        response = api_client.patch(url, payload, format='json')
+        
+        assert response.status_code == status.HTTP_207_MULTI_STATUS
+        assert [e['index'] for e in response.data['errors']] == [2]
+        room.refresh_from_db()
+        unavailable_room.refresh_from_db()
+        assert room.floor == 7
+        assert unavailable_room.is_available is True
+    
+    def test_bulk_partial_update_bookings_overlap(self, api_client, booking, another_guest):
+        """Массовое обновление бронирований проверяет пересечения"""
+        later = Bookings.objects.create(
+            guest=another_guest,
+            room=booking.room,
+            check_in_date=booking.check_out_date,
+            check_out_date=booking.check_out_date + timedelta(days=2),
+            status='confirmed'
+        )
+        url = reverse('bookings-list')
+        payload = [
+            {'id': later.id, 'status': 'cancelled'},
+            {'id': booking.id, 'check_out_date': later.check_out_date.isoformat()},
+        ]
+        response = api_client.patch(url, payload, format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        booking.refresh_from_db()
+        assert booking.check_out_date == later.check_out_date
+        
+        payload = [{'id': later.id, 'status': 'confirmed'}]
+        response = api_client.patch(url, payload, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestExportEndpoints:
+    """Тесты потоковой выгрузки"""
+    
+    def test_export_bookings_ndjson(self, api_client, booking):
+        """GET /api/v1/bookings/export/?format=ndjson"""
+        url = reverse('bookings-export')
+        response = api_client.get(url, {'format': 'ndjson'})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        assert response['Content-Type'].startswith('application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        assert len(lines) == 1
+        
+        detail = api_client.get(reverse('bookings-detail', kwargs={'pk': booking.pk}))
+        assert json.loads(lines[0]) == json.loads(detail.content)
+    
+    def test_export_guests_csv_with_filters(self, api_client, guest, another_guest):
+        """GET /api/v1/guests/export/?format=csv учитывает фильтры"""
+        url = reverse('guests-export')
+        response = api_client.get(url, {'format': 'csv', 'last_name': guest.last_name})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'].startswith('text/csv')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        assert rows[0] == ['id', 'first_name', 'last_name', 'email', 'phone', 'passport', 'registration_date']
+        assert len(rows) == 2
+        assert rows[1][0] == str(guest.id)
+        assert rows[1][4] == str(guest.phone)
+    
+    def test_export_unknown_format(self, api_client):
+        """Неизвестный формат выгрузки - 404"""
+        url = reverse('bookings-export')
+        response = api_client.get(url, {'format': 'xml'})
+        
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestCatalogCache:
+    """Тесты кэша каталога отелей"""
+    
+    def test_hotel_list_cache_hit(self, api_client, hotel, django_assert_num_queries):
+        """Повторный запрос списка отелей не обращается к базе"""
+        url = reverse('hotel-list')
+        first = api_client.get(url, {'country': 'USA', 'star_rating': 5})
+        with django_assert_num_queries(0):
+            second = api_client.get(url, {'star_rating': 5, 'country': 'USA'})
+        
+        assert second.status_code == status.HTTP_200_OK
+        assert second.data == first.data
+    
+    def test_hotel_update_invalidates(self, api_client, hotel, django_capture_on_commit_callbacks):
+        """Изменение отеля сбрасывает список и карточку"""
+        list_url = reverse('hotel-list')
+        detail_url = reverse('hotel-detail', kwargs={'pk': hotel.pk})
+        api_client.get(list_url)
+        api_client.get(detail_url)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.patch(detail_url, {'name': 'Renamed Hotel'}, format='json')
+        
+        assert api_client.get(detail_url).data['name'] == 'Renamed Hotel'
+        assert api_client.get(list_url).data['results'][0]['name'] == 'Renamed Hotel'
+    
+    def test_room_types_invalidation_is_precise(self, api_client, hotel, hotel_with_low_rating, room_type,
+                                                django_capture_on_commit_callbacks, django_assert_num_queries):
+        """Новый тип комнаты в другом отеле не сбрасывает кэш этого отеля"""
+        url = reverse('hotel-room-types', kwargs={'pk': hotel.pk})
+        api_client.get(url)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            Room_types.objects.create(hotel=hotel_with_low_rating, name='Other', description='', max_guests=1)
+        with django_assert_num_queries(0):
+            assert len(api_client.get(url).data['types']) == 1
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            Room_types.objects.create(hotel=hotel, name='Twin', description='', max_guests=2)
+        assert len(api_client.get(url).data['types']) == 2
+    
+    def test_room_type_rooms_invalidated_on_move(self, api_client, room, economy_room_type,
+                                                 django_capture_on_commit_callbacks):
+        """Перенос комнаты в другой тип сбрасывает кэш обоих типов"""
+        old_url = reverse('room_types-rooms', kwargs={'pk': room.type_id})
+        new_url = reverse('room_types-rooms', kwargs={'pk': economy_room_type.pk})
+        assert len(api_client.get(old_url).data['rooms']) == 1
+        assert len(api_client.get(new_url).data['rooms']) == 0
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client.patch(reverse('rooms-list'), [{'id': room.id, 'type': economy_room_type.id}], format='json')
+        
+        assert len(api_client.get(old_url).data['rooms']) == 0
+        assert len(api_client.get(new_url).data['rooms']) == 1
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    """Тесты условных GET-запросов (ETag / Last-Modified)"""
+    
+    def test_booking_detail_not_modified(self, api_client, booking, django_assert_num_queries):
+        """If-None-Match c актуальным ETag - 304 без тела и сериализации"""
+        url = reverse('bookings-detail', kwargs={'pk': booking.pk})
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.has_header('Last-Modified')
+        
+        with django_assert_num_queries(1):
+            response = api_client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b''
+    
+    def test_booking_detail_changed_after_update(self, api_client, booking):
+        """После изменения бронирования ETag меняется"""
+        url = reverse('bookings-detail', kwargs={'pk': booking.pk})
+        etag = api_client.get(url)['ETag']
+        
+        api_client.patch(url, {'status': 'cancelled'}, format='json')
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+    
+    def test_guest_list_fingerprint(self, api_client, guest, another_guest, guest_data):
+        """ETag списка зависит от состава и фильтров"""
+        url = reverse('guests-list')
+        etag = api_client.get(url)['ETag']
+        
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_304_NOT_MODIFIED
+        assert api_client.get(url, {'last_name': 'Doe'}, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_200_OK
+        
+        Guests.objects.filter(pk=another_guest.pk).delete()
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_200_OK
+    
+    def test_hotel_list_if_modified_since(self, api_client, hotel):
+        """If-Modified-Since c датой последнего изменения - 304"""
+        url = reverse('hotel-list')
+        last_modified = api_client.get(url)['Last-Modified']
+        
+        response = api_client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    
+    def test_rooms_etag_from_content(self, api_client, room):
+        """Для моделей без отметки времени ETag считается по содержимому"""
+        url = reverse('rooms-detail', kwargs={'pk': room.pk})
+        etag = api_client.get(url)['ETag']
+        
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_304_NOT_MODIFIED
+
+
+@pytest.mark.django_db
+class TestExpand:
+    """Тесты параметра expand"""
+    
+    def create_bookings(self, hotel, room_type, guest, count):
+        check_in = date.today() + timedelta(days=1)
+        for i in range(count):
+            room = Rooms.objects.create(hotel=hotel, type=room_type, room_number=f'E{i}', floor=1)
+            Bookings.objects.create(
+                guest=guest, room=room, check_in_date=check_in,
+                check_out_date=check_in + timedelta(days=1), status='confirmed'
+            )
+    
+    def test_expand_booking_detail(self, api_client, booking):
+        """Вложенные гость, комната, тип и отель"""
+        url = reverse('bookings-detail', kwargs={'pk': booking.pk})
+        response = api_client.get(url, {'expand': 'guest,room.type,room.hotel'})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['guest']['email'] == booking.guest.email
+        assert response.data['room']['room_number'] == booking.room.room_number
+        assert response.data['room']['type']['name'] == booking.room.type.name
+        assert response.data['room']['hotel']['name'] == booking.room.hotel.name
+        assert response.data['room']['type']['hotel'] == booking.room.hotel.id
+    
+    def test_expand_constant_queries(self, api_client, hotel, room_type, guest, django_assert_num_queries):
+        """Количество запросов не зависит от размера страницы"""
+        url = reverse('bookings-list')
+        params = {'expand': 'guest,room,room.type,room.hotel'}
+        self.create_bookings(hotel, room_type, guest, 3)
+        with django_assert_num_queries(1):
+            api_client.get(url, params)
+        
+        self.create_bookings(hotel, room_type, guest, 30)
+        with django_assert_num_queries(1):
+            response = api_client.get(url, params)
+        assert len(response.data['results']) == 33
+        assert all(isinstance(b['room']['hotel'], dict) for b in response.data['results'])
+    
+    def test_expand_unknown_path(self, api_client, booking):
+        """Недопустимый путь expand - 400"""
+        url = reverse('bookings-list')
+        response = api_client.get(url, {'expand': 'room.owner'})
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'expand' in response.data
+    
+    def test_expand_write_accepts_ids(self, api_client, booking_data):
+        """Запись по-прежнему принимает id, ответ разворачивается"""
+        url = reverse('bookings-list')
+        response = api_client.post(url + '?expand=guest', booking_data, format='json')
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['guest']['id'] == booking_data['guest']
+
+
+@pytest.mark.django_db
+class TestFastRead:
+    """Тесты быстрого режима чтения списков"""
+    
+    @pytest.mark.parametrize('url_name, params', [
+        ('hotel-list', {}),
+        ('room_types-list', {}),
+        ('rooms-list', {}),
+        ('guests-list', {'ordering': '-registration_date'}),
+        ('bookings-list', {'page_size': 1}),
+        ('rooms-available', {'check_in': '2031-01-01', 'check_out': '2031-01-03'}),
+    ])
+    def test_fast_read_identical_output(self, api_client, settings, booking, another_guest,
+                                        economy_room_type, unavailable_room, url_name, params):
+        """Быстрый режим отдает байт-в-байт тот же JSON"""
+        url = reverse(url_name)
+        settings.FAST_READ_SERIALIZERS = False
+        slow = api_client.get(url, params)
+        for cache in caches.all():
+            cache.clear()
+        settings.FAST_READ_SERIALIZERS = True
+        fast = api_client.get(url, params)
+        
+        assert fast.status_code == status.HTTP_200_OK
+        assert fast.content == slow.content
+    
+    def test_phone_format_differs_from_storage(self, api_client, settings, guest):
+        """Формат хранения телефона не как формат вывода - телефон разбирается, а не отдается строкой из базы"""
+        settings.PHONENUMBER_DB_FORMAT = 'INTERNATIONAL'
+        guest.save()
+        fast_reader.cache_clear()
+        try:
+            settings.FAST_READ_SERIALIZERS = False
+            slow = api_client.get(reverse('guests-list'))
+            local_cache().clear()
+            settings.FAST_READ_SERIALIZERS = True
+            fast = api_client.get(reverse('guests-list'))
+        finally:
+            fast_reader.cache_clear()
+        
+        assert Guests.objects.values_list(Cast('phone', TextField()), flat=True).get() == guest.phone.as_international
+        assert fast.json()['results'][0]['phone'] == guest.phone.as_e164
+        assert fast.content == slow.content
+
+
+@pytest.mark.django_db
+class TestORJSON:
+    """Тесты рендерера и парсера на orjson"""
+    
+    def test_renderer_matches_drf(self, guest):
+        """ORJSONRenderer отдает те же байты, что и стандартный JSONRenderer"""
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+        from room.renderers import ORJSONRenderer
+        
+        data = {
+            'price': Decimal('150.50'),
+            'created_at': datetime(2031, 1, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            'check_in_date': date(2031, 1, 1),
+            'label': gettext_lazy('Отель'),
+            'name': 'Гостиница «Север» ',
+            'ids': (1, 2, 3),
+        }
+        
+        assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+        assert ORJSONRenderer().render({'phone': guest.phone}) == b'{"phone":"+12345678902"}'
+    
+    def test_invalid_json_returns_400(self, api_client):
+        """Некорректный JSON в теле запроса дает 400"""
+        response = api_client.post(reverse('hotel-list'), '{"name": ', content_type='application/json')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'JSON parse error' in response.data['detail']
+    
+    def test_create_with_orjson(self, api_client):
+        """Создание объекта через JSON тело запроса"""
+        payload = {'first_name': 'Иван', 'last_name': 'Петров', 'email': 'ivan@example.com',
+                   'phone': '+12345678905', 'passport': 'CD7654321'}
+        response = api_client.post(reverse('guests-list'), json.dumps(payload), content_type='application/json')
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response['Content-Type'] == 'application/json'
+        assert json.loads(response.content)['first_name'] == 'Иван'
+
+
+@pytest.mark.django_db
+class TestAvailabilityIndex:
+    """Тесты битового индекса доступности"""
+    
+    @pytest.fixture(autouse=True)
+    def enable_index(self, settings):
+        settings.AVAILABILITY_INDEX = True
+    
+    def search(self, api_client, check_in, nights=1, **params):
+        params.update(check_in=check_in, check_out=check_in + timedelta(days=nights))
+        return api_client.get(reverse('rooms-search'), params)
+    
+    def test_search_without_database(self, api_client, booking, unavailable_room, django_assert_num_queries):
+        """Повторный поиск отвечает из памяти без запросов к базе"""
+        room = booking.room
+        self.search(api_client, booking.check_in_date)
+        
+        with django_assert_num_queries(0):
+            busy = self.search(api_client, booking.check_in_date, nights=2)
+            free = self.search(api_client, booking.check_out_date, hotel=room.hotel_id)
+        
+        assert busy.data == {'next': None, 'results': []}
+        assert free.data['results'] == [{'id': room.id, 'hotel': room.hotel_id, 'type': room.type_id}]
+    
+    def test_search_filters(self, api_client, booking, economy_room_type):
+        """Фильтры по типу комнаты и числу гостей"""
+        day = booking.check_out_date
+        
+        assert len(self.search(api_client, day, type=economy_room_type.id).data['results']) == 0
+        assert len(self.search(api_client, day, type=booking.room.type_id).data['results']) == 1
+        assert len(self.search(api_client, day, guests=4).data['results']) == 0
+    
+    def test_index_follows_bookings(self, api_client, booking, another_guest, django_capture_on_commit_callbacks):
+        """Индекс обновляется по сигналам бронирований и совпадает с базой"""
+        day = booking.check_out_date
+        assert len(self.search(api_client, day).data['results']) == 1
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            Bookings.objects.create(guest=another_guest, room=booking.room, check_in_date=day,
+                                    check_out_date=day + timedelta(days=2), status='confirmed')
+        assert len(self.search(api_client, day).data['results']) == 0
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            booking.status = 'cancelled'
+            booking.save()
+        assert len(self.search(api_client, booking.check_in_date).data['results']) == 1
+        assert availability.index.verify()
+    
+    def test_bulk_swap_keeps_index_consistent(self, api_client, booking, another_guest,
+                                              django_capture_on_commit_callbacks):
+        """Перенос дат между бронями одним bulk-запросом не портит индекс"""
+        later = Bookings.objects.create(guest=another_guest, room=booking.room, check_in_date=booking.check_out_date,
+                                        check_out_date=booking.check_out_date + timedelta(days=1), status='confirmed')
+        self.search(api_client, booking.check_in_date)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.patch(reverse('bookings-list'), [
+                {'id': later.id, 'check_in_date': booking.check_in_date, 'check_out_date': booking.check_out_date},
+                {'id': booking.id, 'status': 'cancelled'},
+            ], format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert len(self.search(api_client, booking.check_in_date).data['results']) == 0
+        assert len(self.search(api_client, booking.check_out_date).data['results']) == 1
+        assert availability.index.verify()
+    
+    def test_sees_other_process_bookings(self, api_client, booking, another_guest):
+        """Бронирование из другого процесса видно по версии тега availability"""
+        day = booking.check_out_date
+        assert len(self.search(api_client, day).data['results']) == 1
+        
+        Bookings.objects.bulk_create([Bookings(guest=another_guest, room=booking.room, check_in_date=day,
+                                               check_out_date=day + timedelta(days=1), status='confirmed')])
+        assert len(self.search(api_client, day).data['results']) == 1
+        
+        invalidate(availability.AVAILABILITY_TAG)
+        assert len(self.search(api_client, day).data['results']) == 0
+    
+    def test_own_writes_keep_index(self, api_client, booking, another_guest, django_capture_on_commit_callbacks,
+                                   django_assert_num_queries):
+        """Свои записи применяются к индексу без перестройки"""
+        day = booking.check_out_date
+        self.search(api_client, day)
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            Bookings.objects.create(guest=another_guest, room=booking.room, check_in_date=day,
+                                    check_out_date=day + timedelta(days=1), status='confirmed')
+        
+        with django_assert_num_queries(0):
+            assert len(self.search(api_client, day).data['results']) == 0
+    
+    def test_matches_database(self, api_client, settings, booking, unavailable_room):
+        """Индекс и запрос к базе отдают одинаковый ответ"""
+        fast = self.search(api_client, booking.check_out_date)
+        settings.AVAILABILITY_INDEX = False
+        slow = self.search(api_client, booking.check_out_date)
+        
+        assert fast.data == slow.data
+    
+    def test_reads_other_process_bookings_without_rebuild(self, api_client, booking, another_guest,
+                                                          django_assert_num_queries):
+        """По тегу бронирований дочитываются только сохраненные бронирования"""
+        day = booking.check_out_date
+        self.search(api_client, day)
+        Bookings.objects.bulk_create([Bookings(guest=another_guest, room=booking.room, check_in_date=day,
+                                               check_out_date=day + timedelta(days=1), status='confirmed')])
+        booking.status = 'cancelled'
+        Bookings.objects.bulk_update([booking], ['status'])
+        invalidate(availability.BOOKINGS_TAG)
+        
+        with django_assert_num_queries(1):
+            assert len(self.search(api_client, day).data['results']) == 0
+        assert len(self.search(api_client, booking.check_in_date).data['results']) == 1
+        assert availability.index.verify()
+    
+    def test_build_skips_rooms_created_meanwhile(self, monkeypatch, booking, another_guest):
+        """Бронирование комнаты, созданной во время перестройки, не ломает ее"""
+        scatter = availability.scatter
+        
+        def create_room(queryset):
+            if queryset.model is Bookings:
+                room = Rooms.objects.create(hotel=booking.room.hotel, type=booking.room.type, room_number='303', floor=3)
+                Bookings.objects.create(guest=another_guest, room=room, check_in_date=booking.check_in_date,
+                                        check_out_date=booking.check_out_date, status='confirmed')
+            return scatter(queryset)
+        
+        monkeypatch.setattr(availability, 'scatter', create_room)
+        availability.index.build()
+        
+        assert booking.id in availability.index.bookings
+        assert len(availability.index.bookings) == 1
+    
+    def test_build_replays_own_writes(self, api_client, monkeypatch, booking, another_guest,
+                                      django_capture_on_commit_callbacks, django_assert_num_queries):
+        """Запись, примененная сигналом во время перестройки, не теряется"""
+        day = booking.check_out_date
+        self.search(api_client, day)
+        read = availability.index.read
+        
+        def write_meanwhile():
+            state = read()
+            with django_capture_on_commit_callbacks(execute=True):
+                Bookings.objects.create(guest=another_guest, room=booking.room, check_in_date=day,
+                                        check_out_date=day + timedelta(days=1), status='confirmed')
+            return state
+        
+        monkeypatch.setattr(availability.index, 'read', write_meanwhile)
+        availability.index.build()
+        
+        with django_assert_num_queries(0):
+            assert len(self.search(api_client, day).data['results']) == 0
+    
+    def test_search_pages(self, api_client, settings, booking, room_type):
+        """Выдача идет страницами по id комнаты"""
+        rooms = [booking.room] + [
+            Rooms.objects.create(hotel=booking.room.hotel, type=room_type, room_number=f'40{n}', floor=4)
+            for n in range(2)
+        ]
+        day = booking.check_out_date
+        for enabled in (True, False):
+            settings.AVAILABILITY_INDEX = enabled
+            first = self.search(api_client, day, limit=2).data
+            assert [row['id'] for row in first['results']] == [room.id for room in rooms[:2]]
+            second = api_client.get(first['next']).data
+            assert [row['id'] for row in second['results']] == [rooms[2].id]
+            assert second['next'] is None
+        assert self.search(api_client, day, limit=1001).status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestQuotes:
+    """Тесты расчета стоимости проживания"""
+    
+    @pytest.fixture
+    def rates(self, room_type):
+        Rate_overrides.objects.create(room_type=room_type, start_date=date(2031, 1, 1), end_date=date(2031, 12, 31),
+                                      weekdays=0b1100000, price=Decimal('300.00'))
+        Rate_overrides.objects.create(room_type=room_type, start_date=date(2031, 1, 5), end_date=date(2031, 1, 5),
+                                      price=Decimal('400.00'))
+        Stay_discounts.objects.create(room_type=room_type, min_nights=4, percent=Decimal('10'))
+    
+    def test_batch_quotes(self, api_client, rates, room_type, economy_room_type, django_assert_num_queries):
+        """Пачка котировок с сезонами, выходными и скидкой за длительность"""
+        payload = [
+            {'room_type': room_type.id, 'check_in': '2031-01-03', 'check_out': '2031-01-07'},
+            {'room_type': room_type.id, 'check_in': '2031-01-03', 'check_out': '2031-01-05'},
+            {'room_type': economy_room_type.id, 'check_in': '2031-01-03', 'check_out': '2031-01-05'},
+        ] * 100
+        with django_assert_num_queries(3):
+            response = api_client.post(reverse('quotes-list'), payload, format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 300
+        assert response.data['results'][0] == {
+            'room_type': room_type.id, 'check_in': '2031-01-03', 'check_out': '2031-01-07',
+            'nights': 4, 'total_price': '1080.00',
+        }
+        assert [row['total_price'] for row in response.data['results'][1:3]] == ['550.00', '199.98']
+    
+    def test_distant_stays_priced_on_short_spans(self, rates, room_type):
+        """Далекие друг от друга даты в пачке не растягивают строку цен за ночь"""
+        stays = [
+            (room_type.id, date(1, 1, 2), date(1, 1, 4)),
+            (room_type.id, date(2031, 1, 3), date(2031, 1, 7)),
+            (room_type.id, date(9999, 12, 1), date(9999, 12, 3)),
+            (room_type.id, date(2031, 1, 3), date(2031, 1, 5)),
+        ]
+        pricer = pricing.Pricer()
+        
+        assert pricer.quote(stays) == [Decimal('500.00'), Decimal('1080.00'), Decimal('500.00'), Decimal('550.00')]
+        spans = list(pricer.spans(stays))
+        assert [group for _, _, _, group in spans] == [[0], [1, 3], [2]]
+        assert all(end - start <= pricing.MAX_SPAN for _, start, end, _ in spans)
+    
+    def test_invalid_quotes(self, api_client, room_type):
+        """Неизвестный тип комнаты и неверные даты дают 400"""
+        url = reverse('quotes-list')
+        bad_dates = api_client.post(url, [{'room_type': room_type.id, 'check_in': '2031-01-05',
+                                           'check_out': '2031-01-05'}], format='json')
+        unknown = api_client.post(url, [
+            {'room_type': room_type.id, 'check_in': '2031-01-03', 'check_out': '2031-01-05'},
+            {'room_type': 999999, 'check_in': '2031-01-03', 'check_out': '2031-01-05'},
+        ], format='json')
+        
+        assert bad_dates.status_code == status.HTTP_400_BAD_REQUEST
+        assert unknown.status_code == status.HTTP_400_BAD_REQUEST
+        assert unknown.data[0] == {} and 'room_type' in unknown.data[1]
+    
+    def test_booking_priced_when_total_omitted(self, api_client, booking_data):
+        """Бронирование без total_price получает цену из движка"""
+        del booking_data['total_price']
+        response = api_client.post(reverse('bookings-list'), booking_data, format='json')
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['total_price'] == '1250.00'
+        
+        url = reverse('bookings-detail', kwargs={'pk': response.data['id']})
+        check_out = date.fromisoformat(booking_data['check_in_date']) + timedelta(days=2)
+        response = api_client.patch(url, {'check_out_date': check_out.isoformat()}, format='json')
+        assert response.data['total_price'] == '500.00'
+    
+    def test_explicit_total_price_kept(self, api_client, booking_data):
+        """Явно переданная цена не пересчитывается"""
+        booking_data['total_price'] = '999.00'
+        response = api_client.post(reverse('bookings-list'), booking_data, format='json')
+        
+        assert response.data['total_price'] == '999.00'
+        response = api_client.patch(reverse('bookings-detail', kwargs={'pk': response.data['id']}),
+                                    {'status': 'confirmed'}, format='json')
+        assert response.data['total_price'] == '999.00'
+
+
+@pytest.mark.django_db
+class TestAsyncEndpoints:
+    """Тесты async версий read-эндпоинтов"""
+    
+    @pytest.mark.parametrize('sync_name, async_name, target', [
+        ('hotel-detail', 'async-hotel-detail', 'hotel'),
+        ('hotel-room-types', 'async-hotel-room-types', 'hotel'),
+        ('room_types-rooms', 'async-room-types-rooms', 'type'),
+    ])
+    def test_same_payload_as_sync(self, client, room, economy_room_type, sync_name, async_name, target):
+        """Async эндпоинты отдают тот же JSON, что и sync"""
+        pk = getattr(room, target).pk
+        sync = client.get(reverse(sync_name, kwargs={'pk': pk}))
+        response = client.get(reverse(async_name, kwargs={'pk': pk}))
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/json'
+        assert response.content == sync.content
+    
+    def test_hotel_list_pages(self, client, hotel, hotel_with_low_rating):
+        """Список отелей c фильтром и постраничной навигацией"""
+        url = reverse('async-hotel-list')
+        first = client.get(url, {'page_size': 1}).json()
+        
+        assert [row['id'] for row in first['results']] == [hotel.id]
+        second = client.get(first['next']).json()
+        assert [row['id'] for row in second['results']] == [hotel_with_low_rating.id]
+        assert second['next'] is None
+        assert client.get(url, {'country': 'Russia'}).json()['results'][0]['name'] == 'Budget Hotel'
+        assert client.get(url, {'star_rating': 'x'}).status_code == status.HTTP_400_BAD_REQUEST
+    
+    @pytest.mark.parametrize('page_size', [0, -5])
+    def test_hotel_list_non_positive_page_size(self, client, hotel, hotel_with_low_rating, page_size):
+        """Неположительный page_size отдает одну запись на страницу"""
+        response = client.get(reverse('async-hotel-list'), {'page_size': page_size})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert [row['id'] for row in response.json()['results']] == [hotel.id]
+    
+    def test_missing_hotel(self, client):
+        """Несуществующий отель дает 404"""
+        assert client.get(reverse('async-hotel-detail', kwargs={'pk': 999999})).status_code == status.HTTP_404_NOT_FOUND
+    
+    def test_search(self, client, booking, unavailable_room):
+        """Поиск свободных комнат совпадает c sync версией"""
+        params = {'check_in': booking.check_out_date, 'check_out': booking.check_out_date + timedelta(days=1)}
+        sync = client.get(reverse('rooms-search'), params)
+        response = client.get(reverse('async-rooms-search'), params)
+        
+        assert response.json() == sync.json()
+        assert len(response.json()['results']) == 1
+        assert client.get(reverse('async-rooms-search'), {'check_in': 'x'}).status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_post_not_allowed(self, client):
+        """Async эндпоинты только для чтения"""
+        assert client.post(reverse('async-hotel-list')).status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+
+@pytest.mark.django_db
+class TestServerTiming:
+    """Тесты заголовка Server-Timing и лога room.timing"""
+    
+    def timing(self, response):
+        return {
+            part.split(';')[0].strip(): part for part in response['Server-Timing'].split(',')
+        }
+    
+    def test_header_and_log(self, api_client, settings, caplog, booking):
+        """Замеренный запрос получает разбивку времени в заголовке и в логе"""
+        settings.SERVER_TIMING_SAMPLE_RATE = 1.0
+        with caplog.at_level('INFO', logger='room.timing'):
+            response = api_client.get(reverse('bookings-list'), {'expand': 'guest', 'status': 'confirmed'})
+        
+        assert response.status_code == status.HTTP_200_OK
+        metrics = self.timing(response)
+        assert set(metrics) == {'db', 'filter', 'serialize', 'render', 'total'}
+        assert 'queries"' in metrics['db']
+        entry, = [record.timing for record in caplog.records if record.name == 'room.timing']
+        assert json.loads(caplog.records[-1].getMessage()) == entry
+        assert entry['path'] == reverse('bookings-list')
+        assert entry['status'] == 200
+        assert entry['queries'] >= 1
+        assert metrics['db'].startswith('db;dur=')
+        assert entry['total_ms'] >= entry['db_ms']
+    
+    def test_not_sampled(self, api_client, settings, hotel):
+        """При нулевой доле запросы не замеряются"""
+        settings.SERVER_TIMING_SAMPLE_RATE = 0.0
+        response = api_client.get(reverse('hotel-list'))
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert 'Server-Timing' not in response
+    
+    def test_header_disabled(self, api_client, settings, caplog, hotel):
+        """Без заголовка разбивка остается в логе"""
+        settings.SERVER_TIMING_SAMPLE_RATE = 1.0
+        settings.SERVER_TIMING_HEADER = False
+        with caplog.at_level('INFO', logger='room.timing'):
+            response = api_client.get(reverse('hotel-list'))
+        
+        assert 'Server-Timing' not in response
+        assert [record.timing['status'] for record in caplog.records if record.name == 'room.timing'] == [200]
+    
+    def test_async_view(self, client, settings, hotel):
+        """SQL async эндпоинта попадает в разбивку"""
+        settings.SERVER_TIMING_SAMPLE_RATE = 1.0
+        response = client.get(reverse('async-hotel-detail', kwargs={'pk': hotel.pk}))
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert 'desc="0 queries"' not in self.timing(response)['db']
+    
+    def test_span_excludes_sql(self):
+        """Время SQL внутри блока не входит в блок, вложенный блок не считается дважды"""
+        current = timing.Timings()
+        token = timing.timings.set(current)
+        try:
+            with timing.span('serialize'):
+                with timing.span('serialize'):
+                    time.sleep(0.05)
+                    current.db += 0.04
+        finally:
+            timing.timings.reset(token)
+        
+        assert 0.005 < current.spans['serialize'] < 0.04
+        assert not current.open
+
+
+@pytest.mark.django_db
+class TestMetrics:
+    """Тесты метрик Prometheus по эндпоинтам"""
+    
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+    
+    def test_counts_by_route(self, api_client, hotel):
+        """Запросы, время и SQL учитываются по имени маршрута, а не по пути"""
+        before = self.sample('http_requests_total', view='hotel-room-types', method='GET', status='200')
+        queries = self.sample('http_request_db_queries_count', view='hotel-room-types', method='GET')
+        
+        api_client.get(reverse('hotel-room-types', kwargs={'pk': hotel.pk}))
+        api_client.get(reverse('hotel-room-types', kwargs={'pk': hotel.pk}), {'x': 1})
+        
+        assert self.sample('http_requests_total', view='hotel-room-types', method='GET', status='200') == before + 2
+        assert self.sample('http_request_db_queries_count', view='hotel-room-types', method='GET') == queries + 2
+        assert self.sample('http_request_duration_seconds_count', view='hotel-room-types', method='GET') >= 2
+    
+    def test_errors(self, api_client, monkeypatch):
+        """Ответы 5xx считаются ошибками"""
+        def fail(*args, **kwargs):
+            raise RuntimeError('boom')
+        monkeypatch.setattr('room.views.HotelsViewSet.list', fail)
+        api_client.raise_request_exception = False
+        before = self.sample('http_request_errors_total', view='hotel-list', method='GET')
+        
+        assert api_client.get(reverse('hotel-list')).status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+        assert self.sample('http_request_errors_total', view='hotel-list', method='GET') == before + 1
+    
+    def test_unmatched_path(self, api_client):
+        """Неизвестные пути не плодят метки"""
+        before = self.sample('http_requests_total', view='unmatched', method='GET', status='404')
+        api_client.get('/no-such-page/1/')
+        api_client.get('/no-such-page/2/')
+        
+        assert self.sample('http_requests_total', view='unmatched', method='GET', status='404') == before + 2
+    
+    def test_metrics_endpoint(self, api_client, hotel):
+        """/metrics отдает метрики в текстовом формате Prometheus"""
+        api_client.get(reverse('hotel-detail', kwargs={'pk': hotel.pk}))
+        response = api_client.get('/metrics')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'].startswith('text/plain')
+        assert 'http_request_duration_seconds_bucket{' in response.content.decode()
+        assert 'view="hotel-detail"' in response.content.decode()
+    
+    def test_multiprocess_directory(self, api_client, monkeypatch, tmp_path):
+        """C PROMETHEUS_MULTIPROC_DIR метрики собираются из файлов процессов"""
+        monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+        collected = metrics.registry()
+        
+        assert collected is not REGISTRY
+        assert api_client.get('/metrics').status_code == status.HTTP_200_OK
+    
+    def test_disabled(self, api_client, settings, hotel):
+        """Без METRICS_ENABLED запросы не учитываются"""
+        settings.METRICS_ENABLED = False
+        settings.SERVER_TIMING_SAMPLE_RATE = 0.0
+        before = self.sample('http_requests_total', view='hotel-list', method='GET', status='200')
+        api_client.get(reverse('hotel-list'))
+        
+        assert self.sample('http_requests_total', view='hotel-list', method='GET', status='200') == before
+
+
+@pytest.mark.django_db
+class TestTrigramSearch:
+    """Тесты поиска ?q= по похожести (pg_trgm)"""
+    
+    def names(self, response):
+        return [row['last_name'] for row in response.json()['results']]
+    
+    @pytest.fixture
+    def guests(self, guest, another_guest):
+        Guests.objects.create(
+            first_name='Johnny', last_name='Dorian', email='jd@hospital.org', phone='+12345678903', passport='XY0000001'
+        )
+        return guest, another_guest
+    
+    def test_partial_name(self, api_client, guests):
+        """Часть имени находит гостей, лучшее совпадение первым"""
+        response = api_client.get(reverse('guests-list'), {'q': 'joh'})
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert self.names(response) == ['Doe', 'Dorian']
+    
+    def test_several_words(self, api_client, guests):
+        """Каждое слово запроса должно совпасть c каким-либо полем"""
+        response = api_client.get(reverse('guests-list'), {'q': 'john doe'})
+        
+        assert self.names(response) == ['Doe']
+    
+    def test_email_and_passport(self, api_client, guests):
+        """Поиск по email и паспорту"""
+        assert self.names(api_client.get(reverse('guests-list'), {'q': 'smith'})) == ['Smith']
+        assert self.names(api_client.get(reverse('guests-list'), {'q': 'CD9876543'})) == ['Smith']
+    
+    def test_ranked_pages(self, api_client, guests):
+        """Постраничная выдача идет по рангу без пропусков и повторов"""
+        url = reverse('guests-list')
+        first = api_client.get(url, {'q': 'joh', 'page_size': 1}).json()
+        second = api_client.get(first['next']).json()
+        
+        assert [row['last_name'] for row in first['results'] + second['results']] == ['Doe', 'Dorian']
+        assert second['next'] is None
+    
+    def test_serializer_path(self, api_client, settings, guests):
+        """Без быстрого чтения результат тот же"""
+        settings.FAST_READ_SERIALIZERS = False
+        assert self.names(api_client.get(reverse('guests-list'), {'q': 'joh'})) == ['Doe', 'Dorian']
+    
+    def test_short_query(self, api_client, guests):
+        """Слишком короткий запрос отклоняется"""
+        response = api_client.get(reverse('guests-list'), {'q': 'j'})
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'q' in response.json()
+    
+    def test_hotels(self, api_client, hotel, hotel_with_low_rating):
+        """Отели ищутся по названию и городу вместе c фильтрами"""
+        url = reverse('hotel-list')
+        
+        assert [row['name'] for row in api_client.get(url, {'q': 'plaza'}).json()['results']] == ['Grand Plaza Hotel']
+        assert [row['name'] for row in api_client.get(url, {'q': 'chicag'}).json()['results']] == ['Budget Hotel']
+        assert api_client.get(url, {'q': 'hotel', 'country': 'Russia'}).json()['results'][0]['name'] == 'Budget Hotel'
+    
+    def test_ordering_without_query(self, api_client, hotel, hotel_with_low_rating):
+        """Без q работает обычная сортировка ?ordering="""
+        response = api_client.get(reverse('hotel-list'), {'ordering': '-id'})
+        
+        assert [row['id'] for row in response.json()['results']] == [hotel_with_low_rating.id, hotel.id]
+    
+    def test_uses_trigram_index(self, guests):
+        """Запрос по полю идет через GIN индекс gin_trgm_ops"""
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = Guests.objects.filter(last_name__trigram_word_similar='doe').explain()
+        
+        assert 'guests_last_name_trgm' in plan
+
+
+@pytest.mark.django_db
+class TestSuggest:
+    """Тесты автодополнения отелей из индекса в памяти"""
+    
+    def suggest(self, api_client, prefix, **params):
+        response = api_client.get(reverse('hotel-suggest'), {'prefix': prefix, **params})
+        assert response.status_code == status.HTTP_200_OK
+        return [row['name'] for row in response.json()['results']]
+    
+    @pytest.fixture
+    def hotels(self, hotel, hotel_with_low_rating):
+        zurich = Hotels.objects.create(name='Baur au Lac', address='Talstrasse 1', city='Zürich', country='Switzerland',
+                                       phone='+41441234567', star_rating=5)
+        return hotel, hotel_with_low_rating, zurich
+    
+    def test_prefixes(self, api_client, hotels):
+        """Префикс названия, слова в названии, города и страны, без регистра и диакритики"""
+        assert self.suggest(api_client, 'gra') == ['Grand Plaza Hotel']
+        assert self.suggest(api_client, 'PLA') == ['Grand Plaza Hotel']
+        assert self.suggest(api_client, 'chi') == ['Budget Hotel']
+        assert self.suggest(api_client, 'zur') == ['Baur au Lac']
+        assert self.suggest(api_client, 'switz') == ['Baur au Lac']
+        assert self.suggest(api_client, 'xyz') == []
+    
+    def test_ranked_by_stars(self, api_client, hotels):
+        """Больше звезд - выше в подсказках, лимит обрезает список"""
+        assert self.suggest(api_client, 'hotel') == ['Grand Plaza Hotel', 'Budget Hotel']
+        assert self.suggest(api_client, 'b') == ['Baur au Lac', 'Budget Hotel']
+        assert self.suggest(api_client, 'b', limit=1) == ['Baur au Lac']
+    
+    def test_lookup_without_database(self, api_client, hotels, django_assert_num_queries):
+        """Повторные подсказки отвечают из памяти без запросов к базе"""
+        self.suggest(api_client, 'g')
+        with django_assert_num_queries(0):
+            assert self.suggest(api_client, 'grand p') == ['Grand Plaza Hotel']
+    
+    def test_follows_signals(self, api_client, hotels, django_capture_on_commit_callbacks):
+        """Индекс обновляется по сигналам сохранения и удаления отелей"""
+        plaza, budget, _ = hotels
+        self.suggest(api_client, 'g')
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            budget.name = 'Garden Inn'
+            budget.save()
+        assert self.suggest(api_client, 'g') == ['Grand Plaza Hotel', 'Garden Inn']
+        assert self.suggest(api_client, 'budget') == []
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            plaza.delete()
+        assert self.suggest(api_client, 'g') == ['Garden Inn']
+    
+    def test_own_writes_keep_index(self, api_client, settings, hotels, django_capture_on_commit_callbacks,
+                                   django_assert_num_queries):
+        """Свои изменения не заставляют дочитывать индекс из базы"""
+        settings.SUGGEST_INDEX_CHECK_INTERVAL = 0
+        plaza, _, _ = hotels
+        self.suggest(api_client, 'g')
+        
+        with django_capture_on_commit_callbacks(execute=True):
+            plaza.name = 'Grand Hyatt'
+            plaza.save()
+        with django_assert_num_queries(0):
+            assert self.suggest(api_client, 'grand') == ['Grand Hyatt']
+    
+    def test_picks_up_other_processes(self, api_client, settings, hotels, django_assert_num_queries):
+        """Изменения без сигналов (другой процесс) дочитываются после смены тега hotels"""
+        settings.SUGGEST_INDEX_CHECK_INTERVAL = 0
+        self.suggest(api_client, 'g')
+        Hotels.objects.filter(name='Budget Hotel').update(name='Golden Gate', created_at=timezone.now())
+        assert self.suggest(api_client, 'gol') == []
+        
+        invalidate('hotels')
+        with django_assert_num_queries(2):
+            assert self.suggest(api_client, 'gol') == ['Golden Gate']
+    
+    def test_rebuilds_after_other_process_delete(self, api_client, settings, hotels):
+        """Удаление в другом процессе видно по числу отелей"""
+        settings.SUGGEST_INDEX_CHECK_INTERVAL = 0
+        _, budget, _ = hotels
+        self.suggest(api_client, 'b')
+        with connections[budget._state.db].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {Hotels._meta.db_table} WHERE id = %s', [budget.pk])
+        
+        invalidate('hotels')
+        assert self.suggest(api_client, 'b') == ['Baur au Lac']
+    
+    def test_rebuilds_after_delete_and_create(self, api_client, settings, hotels):
+        """Удаление и создание между сверками видно по сумме id, хотя число отелей то же"""
+        settings.SUGGEST_INDEX_CHECK_INTERVAL = 0
+        _, budget, _ = hotels
+        self.suggest(api_client, 'b')
+        with connections[budget._state.db].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {Hotels._meta.db_table} WHERE id = %s', [budget.pk])
+        beach, = Hotels.objects.bulk_create([Hotels(name='Beach Club', address='1 Shore', city='Nice',
+                                                    country='France', phone='+12345678909', star_rating=3)])
+        Hotels.objects.filter(pk=beach.pk).update(created_at=timezone.now() - timedelta(days=1))
+        
+        invalidate('hotels')
+        assert self.suggest(api_client, 'b') == ['Baur au Lac', 'Beach Club']
+    
+    def test_rebuilds_after_max_age(self, api_client, settings, hotels):
+        """Правка без created_at подхватывается перестройкой по возрасту индекса"""
+        self.suggest(api_client, 'g')
+        Hotels.objects.filter(name='Budget Hotel').update(name='Golden Gate')
+        assert self.suggest(api_client, 'gol') == []
+        
+        settings.SUGGEST_INDEX_MAX_AGE = 0
+        assert self.suggest(api_client, 'gol') == ['Golden Gate']
+    
+    def test_validation(self, api_client):
+        """Префикс обязателен, лимит ограничен"""
+        assert api_client.get(reverse('hotel-suggest')).status_code == status.HTTP_400_BAD_REQUEST
+        response = api_client.get(reverse('hotel-suggest'), {'prefix': 'a', 'limit': 100})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestFacetedSearch:
+    """Тесты поиска отелей со счетчиками по фильтрам"""
+    
+    @pytest.fixture
+    def hotels(self, hotel, hotel_with_low_rating):
+        Hotels.objects.create(name='Lakeside Inn', address='1 Lake Road', city='Chicago', country='USA',
+                              phone='+13125550101', star_rating=2)
+        return Hotels.objects.order_by('id')
+    
+    def facets(self, response):
+        return {
+            field: {row['value']: row['count'] for row in rows}
+            for field, rows in response.json()['facets'].items()
+        }
+    
+    def test_results_and_facets(self, api_client, hotels):
+        """Результаты как у списка, счетчики по каждому полю filterset_fields"""
+        response = api_client.get(reverse('hotel-search'))
+        
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        assert body['count'] == 3
+        assert body['results'] == api_client.get(reverse('hotel-list')).json()['results']
+        assert self.facets(response) == {
+            'star_rating': {5: 1, 2: 2},
+            'country': {'USA': 2, 'Russia': 1},
+            'city': {'Chicago': 2, 'New York': 1},
+        }
+        assert [row['value'] for row in body['facets']['city']] == ['Chicago', 'New York']
+    
+    def test_filters_match_list(self, api_client, hotels):
+        """Фильтры и поиск q работают так же, как в списке"""
+        params = {'city': 'Chicago', 'star_rating': 2}
+        response = api_client.get(reverse('hotel-search'), params)
+        
+        assert response.json()['results'] == api_client.get(reverse('hotel-list'), params).json()['results']
+        assert response.json()['count'] == 2
+        assert self.facets(response)['country'] == {'USA': 1, 'Russia': 1}
+        assert self.facets(api_client.get(reverse('hotel-search'), {'q': 'lakeside'}))['city'] == {'Chicago': 1}
+        assert api_client.get(reverse('hotel-search'), {'star_rating': 'x'}).status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_payload_without_pagination(self, api_client, hotels, monkeypatch):
+        """Без пагинации и с estimate ответ той же формы, без estimated_count"""
+        body = api_client.get(reverse('hotel-search'), {'estimate': 'true'}).json()
+        assert list(body) == ['count', 'facets', 'next', 'previous', 'results']
+        
+        monkeypatch.setattr(HotelsViewSet, 'pagination_class', None)
+        response = api_client.get(reverse('hotel-search'), {'city': 'Chicago'})
+        
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        assert body['count'] == 2 and body['next'] is None and body['previous'] is None
+        assert len(body['results']) == 2
+    
+    def test_single_grouped_query(self, api_client, hotels, django_assert_num_queries):
+        """Все счетчики считаются одним запросом, повтор отдается из кэша"""
+        with django_assert_num_queries(2) as captured:
+            api_client.get(reverse('hotel-search'), {'country': 'USA'})
+        assert 'GROUPING SETS' in captured.captured_queries[-1]['sql']
+        
+        with django_assert_num_queries(0):
+            api_client.get(reverse('hotel-search'), {'country': 'USA'})
+    
+    def test_cache_invalidated(self, api_client, hotels, django_capture_on_commit_callbacks):
+        """Новый отель сбрасывает закэшированные счетчики"""
+        api_client.get(reverse('hotel-search'))
+        with django_capture_on_commit_callbacks(execute=True):
+            Hotels.objects.create(name='Nevsky', address='Nevsky 1', city='Saint Petersburg', country='Russia',
+                                  phone='+78125550101', star_rating=4)
+        
+        response = api_client.get(reverse('hotel-search'))
+        assert response.json()['count'] == 4
+        assert self.facets(response)['country'] == {'USA': 2, 'Russia': 2}
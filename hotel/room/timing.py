@@ -0,0 +1,159 @@
+"""
+Разбивка времени запроса: SQL (число запросов и время), фильтрация, сериализация
+и рендеринг. Замеряется доля SERVER_TIMING_SAMPLE_RATE запросов; результат уходит
+в заголовок Server-Timing и одной JSON-строкой в лог room.timing. С METRICS_ENABLED
+замеряется каждый запрос, и итог идет в метрики Prometheus (room.metrics). В
+незамеренных запросах хуки стоят одно чтение ContextVar.
+"""
+import logging
+import random
+import time
+from contextvars import ContextVar
+import orjson
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+SPANS = ('filter', 'serialize', 'render')
+
+timings = ContextVar('request_timings', default=None)
+
+
+class Timings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.spans = dict.fromkeys(SPANS, 0.0)
+        self.open = set()
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def breakdown(self):
+        """(имя, секунды, описание) для Server-Timing и лога."""
+        return [
+            ('db', self.db, f'{self.queries} queries'),
+            *((name, self.spans[name], None) for name in SPANS),
+            ('total', self.total(), None),
+        ]
+
+
+class span:
+    """
+    Время блока без SQL внутри него: SQL уже учтен в db. Вложенный блок с тем
+    же именем (сериализатор внутри сериализатора) не считается второй раз.
+    """
+
+    __slots__ = ('name', 'current', 'started', 'db')
+
+    def __init__(self, name):
+        self.name = name
+        self.current = None
+
+    def __enter__(self):
+        current = timings.get()
+        if current is not None and self.name not in current.open:
+            current.open.add(self.name)
+            self.current, self.started, self.db = current, time.perf_counter(), current.db
+        return self
+
+    def __exit__(self, *exc_info):
+        current = self.current
+        if current is not None:
+            elapsed = time.perf_counter() - self.started - (current.db - self.db)
+            current.spans[self.name] += elapsed
+            current.open.discard(self.name)
+            self.current = None
+
+
+def record_query(execute, sql, params, many, context):
+    current = timings.get()
+    if current is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        current.db += time.perf_counter() - started
+        current.queries += 1
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created: счетчик SQL на каждом соединении, включая шарды и реплики."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimingMixin:
+    """Время фильтрации (DjangoFilterBackend, OrderingFilter) в разбивке запроса."""
+
+    def filter_queryset(self, queryset):
+        with span('filter'):
+            return super().filter_queryset(queryset)
+
+
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def start(self):
+        """Замер нужен, если запрос попал в выборку или включены метрики."""
+        rate = settings.SERVER_TIMING_SAMPLE_RATE
+        sampled = rate > 0 and (rate >= 1 or random.random() < rate)
+        if not sampled and not settings.METRICS_ENABLED:
+            return None, None, False
+        current = Timings()
+        return current, timings.set(current), sampled
+
+    def finish(self, request, response, current, sampled):
+        if settings.METRICS_ENABLED:
+            metrics.observe(request, response, current)
+        if not sampled:
+            return response
+        breakdown = current.breakdown()
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = ', '.join(
+                f'{name};dur={seconds * 1000:.2f}' + (f';desc="{desc}"' if desc else '')
+                for name, seconds, desc in breakdown
+            )
+        entry = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': current.queries,
+            **{f'{name}_ms': round(seconds * 1000, 2) for name, seconds, _ in breakdown},
+        }
+        logger.info(orjson.dumps(entry).decode(), extra={'timing': entry})
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        current, token, sampled = self.start()
+        if current is None:
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            timings.reset(token)
+        return self.finish(request, response, current, sampled)
+
+    async def __acall__(self, request):
+        current, token, sampled = self.start()
+        if current is None:
+            return await self.get_response(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            timings.reset(token)
+        return self.finish(request, response, current, sampled)
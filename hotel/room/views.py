@@ -1,60 +1,286 @@
 # from django.shortcuts import render
-from rest_framework import viewsets
+from rest_framework import serializers, viewsets
+from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from .models import Hotels, Room_types, Rooms, Guests, Bookings
-from .serializers import HotelsSerializer, RoomTypesSerializer, RoomsSerializer, BookingsSerializer, GuestsSerializer
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import Count, Exists, OuterRef, Q, Sum
+from django.forms import ValidationError
+from .models import Hotels, Room_types, Rooms, Guests, Bookings, Room_nights, Daily_stats, CANCELLED_STATUS
+from . import availability, pricing, suggest
+from .bulk import BulkModelMixin
+from .cache import cache_response
+from .conditional import ConditionalGetMixin
+from .converter import FastReadMixin
+from .expand import ExpandMixin
+from .export import ExportMixin
+from .exceptions import BookingConflict, booking_conflict
+from .pagination import keyset_page
+from .search import TrigramSearchFilter, facet_counts
+from .sharding import ShardedViewSetMixin
+from .timing import TimingMixin
+from .serializers import HotelsSerializer, RoomTypesSerializer, RoomsSerializer, BookingsSerializer, GuestsSerializer, AvailabilitySerializer, CalendarSerializer, SearchSerializer, SuggestSerializer, QuoteSerializer, StatsSerializer, DayStatsSerializer
 from django_filters.rest_framework import DjangoFilterBackend
 
-class HotelsViewSet(viewsets.ModelViewSet):
+class HotelsViewSet(TimingMixin, ShardedViewSetMixin, ExpandMixin, ConditionalGetMixin, FastReadMixin, viewsets.ModelViewSet):
     queryset = Hotels.objects.all()
     serializer_class = HotelsSerializer
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
     filterset_fields = ['star_rating', 'country', 'city']
+    trigram_fields = ['name', 'city']
+    ordering_fields = ['id', 'created_at']
+    ordering = 'id'
+    last_modified_field = 'created_at'
+
+    @cache_response('hotels')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response('hotel:{pk}')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     @action(methods=['get'], detail=True)
+    @cache_response('hotel:{pk}', 'hotel:{pk}:room_types')
     def room_types(self, request, pk=None):
         try:
             pk = Hotels.objects.get(pk=pk).id
         except Exception:
             return Response({'ОШИБКА': 'Такого отеля не существует!'})
         room_type = Room_types.objects.all().filter(hotel_id=pk)
-        return Response({'types': room_type.values()} )
+        return Response({'types': list(room_type.values())} )
+
+    @action(methods=['get'], detail=False)
+    @cache_response('hotels')
+    def search(self, request):
+        """Страница списка с теми же фильтрами и счетчики по каждому полю filterset_fields."""
+        queryset = self.filter_queryset(self.get_queryset())
+        response = self.list_response(queryset)
+        count, facets = facet_counts(queryset, self.filterset_fields)
+        page = response.data
+        if isinstance(page, list):
+            # Без пагинации list_response отдает просто список.
+            page = {'next': None, 'previous': None, 'results': page}
+        response.data = {
+            'count': count,
+            'facets': facets,
+            'next': page['next'],
+            'previous': page['previous'],
+            'results': page['results'],
+        }
+        return response
+
+    @action(methods=['get'], detail=False)
+    def suggest(self, request):
+        params = SuggestSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response({'results': suggest.index.suggest(params.validated_data['prefix'], params.validated_data['limit'])})
+
+    @action(methods=['get'], detail=True)
+    def calendar(self, request, pk=None):
+        hotel = self.get_object()
+        params = CalendarSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        start, end = params.validated_data['start'], params.validated_data['end']
+
+        # Ночи снятых с продажи комнат вычитаются по их id: календарь читается
+        # только из индекса Room_nights, без соединения с комнатами.
+        rooms = Rooms.objects.filter(hotel=hotel).aggregate(
+            total=Count('pk', filter=Q(is_available=True)),
+            unavailable=ArrayAgg('pk', filter=Q(is_available=False), default=[]),
+        )
+        total = rooms['total']
+        nights_booked = Room_nights.objects.filter(hotel=hotel, date__gte=start, date__lt=end)
+        if rooms['unavailable']:
+            nights_booked = nights_booked.exclude(room_id__in=rooms['unavailable'])
+        booked = dict(nights_booked.values_list('date').annotate(booked=Count('room')).order_by())
+        nights = []
+        for offset in range((end - start).days):
+            night = start + timedelta(days=offset)
+            count = booked.get(night, 0)
+            nights.append({'date': night, 'booked': count, 'free': total - count})
+        return Response({'hotel': hotel.id, 'rooms': total, 'nights': nights})
+
+    @action(methods=['get'], detail=True)
+    def stats(self, request, pk=None):
+        hotel = self.get_object()
+        params = StatsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        start, end = params.validated_data['from'], params.validated_data['to']
+        room_type = params.validated_data.get('room_type')
+
+        rooms = Rooms.objects.filter(hotel=hotel, is_available=True)
+        stats = Daily_stats.objects.filter(hotel=hotel, date__gte=start, date__lte=end)
+        if room_type is not None:
+            rooms = rooms.filter(type=room_type)
+            stats = stats.filter(room_type=room_type)
+        total = rooms.count()
+        rollup = {
+            day: (sold, revenue) for day, sold, revenue in stats.values_list('date').annotate(
+                sold=Sum('rooms_sold'), revenue=Sum('revenue')
+            ).order_by()
+        }
+
+        days = []
+        for offset in range((end - start).days + 1):
+            day = start + timedelta(days=offset)
+            days.append({'date': day, **self.day_stats(*rollup.get(day, (0, 0)), total)})
+        summary = self.day_stats(
+            sum(day['rooms_sold'] for day in days), sum(day['revenue'] for day in days), total * len(days),
+        )
+        return Response({
+            'hotel': hotel.id,
+            'rooms': total,
+            'days': DayStatsSerializer(days, many=True).data,
+            'total': DayStatsSerializer(summary).data,
+        })
+
+    @staticmethod
+    def day_stats(sold, revenue, room_nights):
+        return {
+            'rooms_sold': sold,
+            'revenue': revenue,
+            'occupancy': Decimal(100 * sold) / room_nights if room_nights else None,
+            'adr': revenue / sold if sold else None,
+            'revpar': revenue / room_nights if room_nights else None,
+        }
     
 
-class RoomTypesViewSet(viewsets.ModelViewSet):
+class RoomTypesViewSet(TimingMixin, ShardedViewSetMixin, ExpandMixin, FastReadMixin, viewsets.ModelViewSet):
     queryset = Room_types.objects.all()
     serializer_class = RoomTypesSerializer
-    filter_backends = [DjangoFilterBackend]
+    shard_by = {'hotel': Hotels}
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['hotel', 'max_guests']
+    ordering_fields = ['id']
+    ordering = 'id'
     
     
     @action(methods=['get'], detail=True)
+    @cache_response('room_type:{pk}', 'room_type:{pk}:rooms')
     def rooms(self, request, pk=None):
         try:
             pk = Room_types.objects.get(pk=pk).id
         except Exception:
             return Response({'ОШИБКА': 'Такой комнаты не существует!'})
         room = Rooms.objects.all().filter(type_id=pk)
-        return Response({'rooms': room.values()} )
+        return Response({'rooms': list(room.values())} )
 
 
-class RoomsViewSet(viewsets.ModelViewSet):
+class RoomsViewSet(TimingMixin, ShardedViewSetMixin, ExpandMixin, FastReadMixin, BulkModelMixin, viewsets.ModelViewSet):
     queryset = Rooms.objects.all()
     serializer_class = RoomsSerializer
-    filter_backends = [DjangoFilterBackend]
+    shard_by = {'hotel': Hotels, 'type': Room_types}
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['hotel', 'type', 'is_available', 'floor']
+    ordering_fields = ['id']
+    ordering = 'id'
+
+    @action(methods=['get'], detail=False)
+    def available(self, request):
+        params = AvailabilitySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        check_in = params.validated_data['check_in']
+        check_out = params.validated_data['check_out']
+        guests = params.validated_data.get('guests')
 
+        busy = Room_nights.objects.filter(room=OuterRef('pk'), date__gte=check_in, date__lt=check_out)
+        rooms = self.filter_queryset(self.get_queryset()).filter(is_available=True).exclude(Exists(busy))
+        if guests is not None:
+            rooms = rooms.filter(type__max_guests__gte=guests)
+        return self.list_response(rooms)
 
-class GuestsViewSet(viewsets.ModelViewSet):
+    @action(methods=['get'], detail=False)
+    def search(self, request):
+        params = SearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = dict(params.validated_data)
+        query['room_type'] = query.pop('type', None)
+        limit = query.pop('limit')
+        if settings.AVAILABILITY_INDEX:
+            rooms = availability.index.search(**query, limit=limit + 1)
+        else:
+            rooms = list(availability.search_queryset(**query)[:limit + 1])
+        return Response(keyset_page(request, rooms, limit))
+
+
+class GuestsViewSet(TimingMixin, ExpandMixin, ConditionalGetMixin, FastReadMixin, BulkModelMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Guests.objects.all()
     serializer_class = GuestsSerializer
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [DjangoFilterBackend, TrigramSearchFilter]
     filterset_fields = ['first_name', 'last_name', 'email']
+    trigram_fields = ['first_name', 'last_name', 'email', 'passport']
+    ordering_fields = ['id', 'registration_date']
+    ordering = 'id'
+    last_modified_field = 'registration_date'
     
 
-class BookingsViewSet(viewsets.ModelViewSet):
+class BookingsViewSet(TimingMixin, ShardedViewSetMixin, ExpandMixin, ConditionalGetMixin, FastReadMixin, BulkModelMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Bookings.objects.all()
     serializer_class = BookingsSerializer
-    filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['guest', 'room', 'status']
\ No newline at end of file
+    shard_by = {'room': Rooms}
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_fields = ['guest', 'room', 'status']
+    ordering_fields = ['id', 'created_at', 'check_in_date']
+    ordering = 'id'
+    last_modified_field = 'created_at'
+
+    def perform_create(self, serializer):
+        with booking_conflict():
+            serializer.save()
+
+    def perform_update(self, serializer):
+        with booking_conflict():
+            serializer.save()
+
+    def validate_bulk(self, valid, errors):
+        for index, booking in list(valid.items()):
+            try:
+                booking.clean()
+            except ValidationError as exc:
+                errors[index] = exc.message_dict
+                del valid[index]
+
+        candidates = {index: b for index, b in valid.items() if b.status != CANCELLED_STATUS}
+        if not candidates:
+            return
+        taken = {}
+        existing = Bookings.objects.active().filter(
+            room__in={b.room_id for b in candidates.values()},
+            check_in_date__lt=max(b.check_out_date for b in candidates.values()),
+            check_out_date__gt=min(b.check_in_date for b in candidates.values()),
+        ).exclude(pk__in=[b.pk for b in valid.values() if b.pk])
+        for room_id, check_in, check_out in existing.values_list('room', 'check_in_date', 'check_out_date'):
+            taken.setdefault(room_id, []).append((check_in, check_out))
+
+        for index, booking in candidates.items():
+            stays = taken.setdefault(booking.room_id, [])
+            if any(booking.check_in_date < out and in_ < booking.check_out_date for in_, out in stays):
+                errors[index] = {'non_field_errors': [BookingConflict.default_detail]}
+                del valid[index]
+            else:
+                stays.append((booking.check_in_date, booking.check_out_date))
+
+    def bulk_write(self):
+        return booking_conflict()
+
+
+class QuotesViewSet(viewsets.ViewSet):
+    max_quotes = 1000
+
+    def create(self, request):
+        stays = QuoteSerializer(data=request.data, many=True, max_length=self.max_quotes)
+        stays.is_valid(raise_exception=True)
+        rows = stays.validated_data
+        prices = pricing.quote((row['room_type'], row['check_in'], row['check_out']) for row in rows)
+
+        errors = [{} if price is not None else {'room_type': ['Такого типа комнаты не существует.']} for price in prices]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        for row, price in zip(rows, prices):
+            row['nights'] = (row['check_out'] - row['check_in']).days
+            row['total_price'] = price
+        return Response({'results': QuoteSerializer(rows, many=True).data})